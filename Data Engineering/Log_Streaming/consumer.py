@@ -1,11 +1,24 @@
 import json
 import logging
+import os
+import time
 from kafka import KafkaConsumer
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# "batch" (default) polls up to BATCH_SIZE records at a time and commits once per batch;
+# "message" handles one record at a time with auto-commit
+CONSUMER_MODE = os.environ.get('CONSUMER_MODE', 'batch')
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', '500'))
+# Longest to wait for a batch to fill before processing what has arrived
+BATCH_MAX_WAIT_MS = int(os.environ.get('BATCH_MAX_WAIT_MS', '1000'))
+# Throughput is logged this often
+REPORT_INTERVAL_S = float(os.environ.get('REPORT_INTERVAL_S', '10'))
+# Fields is_suspicious and the alert read; records without them are skipped
+REQUIRED_FIELDS = {'ip', 'endpoint', 'status_code'}
+
 def is_suspicious(log):
     """Simple logic to identify suspicious activity."""
     # Example: High latency or Server Errors
@@ -15,25 +28,106 @@ def is_suspicious(log):
         return True
     return False
 
+def alert(log):
+    logger.warning(f"ALERT: Suspicious detected! IP={log['ip']} Status={log['status_code']} Path={log['endpoint']}")
+
+def decode_batch(values):
+    """Decode a batch of raw JSON record values, each on its own so a bad record
+    cannot spill into or fail its neighbours. Returns (logs, bad values); a value
+    is bad if it is not a JSON object with the fields the checks read."""
+    logs = []
+    bad = []
+    for value in values:
+        try:
+            log = json.loads(value)
+        except ValueError:
+            bad.append(value)
+            continue
+        if isinstance(log, dict) and REQUIRED_FIELDS <= log.keys():
+            logs.append(log)
+        else:
+            bad.append(value)
+    return logs, bad
+
+def poll_batch(consumer):
+    """Poll until BATCH_SIZE records have arrived or BATCH_MAX_WAIT_MS has passed."""
+    records = []
+    deadline = time.monotonic() + BATCH_MAX_WAIT_MS / 1000
+    while len(records) < BATCH_SIZE:
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            break
+        polled = consumer.poll(timeout_ms=remaining_ms, max_records=BATCH_SIZE - len(records))
+        for partition_records in polled.values():
+            records.extend(partition_records)
+    return records
+
+def process_batch(logs):
+    """Evaluate a whole batch; returns the number of alerts."""
+    suspicious = [log for log in logs if is_suspicious(log)]
+    for log in suspicious:
+        alert(log)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Processed {len(logs)} logs up to {logs[-1].get('timestamp', '-') if logs else '-'}")
+    return len(suspicious)
+
+def consume_batches(consumer):
+    logger.info(f"Consuming in batches of up to {BATCH_SIZE} records, waiting at most {BATCH_MAX_WAIT_MS} ms per batch")
+    batches = records = alerts = skipped = 0
+    started = report_start = time.monotonic()
+    while True:
+        batch = poll_batch(consumer)
+        if batch:
+            logs, bad = decode_batch([record.value for record in batch])
+            for value in bad:
+                logger.error(f"Skipping malformed record: {value[:100]!r}")
+            skipped += len(bad)
+            alerts += process_batch(logs)
+            # Only after the whole batch is processed, so a crash re-delivers it instead of losing it
+            consumer.commit()
+            batches += 1
+            records += len(batch)
+        now = time.monotonic()
+        if now - report_start >= REPORT_INTERVAL_S:
+            elapsed = now - report_start
+            logger.info(f"Throughput: {records / elapsed:.1f} records/sec, {batches} batches "
+                        f"(avg {records / batches if batches else 0:.1f} records, max {BATCH_SIZE}), "
+                        f"{alerts} alerts, {skipped} malformed in the last {elapsed:.1f}s; up {now - started:.0f}s")
+            batches = records = alerts = skipped = 0
+            report_start = now
+
+def consume_messages(consumer):
+    for message in consumer:
+        log = json.loads(message.value)
+        if is_suspicious(log):
+            alert(log)
+        else:
+            logger.debug(f"Processed: {log['timestamp']}")
+
 def main():
-    logger.info("Starting Consumer...")
-    
-    # Auto-commit offset, start from latest
+    logger.info(f"Starting Consumer ({CONSUMER_MODE} mode)...")
+    batched = CONSUMER_MODE == 'batch'
+
+    # Start from latest; in batch mode offsets are committed after each batch instead of automatically.
+    # Values are decoded by the consume loop, so a malformed record can be skipped instead of raising
     consumer = KafkaConsumer(
         'web-server-logs',
         bootstrap_servers=['kafka:9092'],
         auto_offset_reset='latest',
-        enable_auto_commit=True,
+        enable_auto_commit=not batched,
         group_id='monitor-service',
-        value_deserializer=lambda x: json.loads(x.decode('utf-8'))
+        max_poll_records=BATCH_SIZE
     )
 
-    for message in consumer:
-        log = message.value
-        if is_suspicious(log):
-            logger.warning(f"ALERT: Suspicious detected! IP={log['ip']} Status={log['status_code']} Path={log['endpoint']}")
+    try:
+        if batched:
+            consume_batches(consumer)
         else:
-            logger.debug(f"Processed: {log['timestamp']}")
+            consume_messages(consumer)
+    except KeyboardInterrupt:
+        logger.info("Stopping...")
+    finally:
+        consumer.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,344 @@
+"""Parse whole COBOL source trees in parallel.
+
+Usage:
+    python batch.py SRC [SRC ...] (--out-dir DIR [--binary] | --ndjson FILE)
+                    [--workers N] [--timeout SECONDS] [--include PATTERN ...]
+                    [-I COPYBOOK_DIR ...] [--encoding CODEPAGE] [--source-format FIXED|FREE]
+
+SRC may be a file, a directory (searched recursively) or a glob pattern.
+"""
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from binary_result import SUFFIX as BINARY_SUFFIX, BinaryWriter
+from cobolparser import CobolParser
+from copybook import get_library, search_paths_from_env
+from json_stream import StreamingJsonWriter, dumps
+from parse_cache import get_cache
+
+DEFAULT_INCLUDE = ["*.cbl", "*.cob", "*.cobol"]
+# Records the content key each output in --out-dir was produced from.
+MANIFEST_NAME = ".batch-manifest.json"
+
+
+class ParseTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise ParseTimeout()
+
+
+def collect_sources(sources: List[str], include: List[str]) -> List[str]:
+    """Expand files, directories and glob patterns into a sorted file list."""
+    patterns = [p.lower() for p in include]
+    found = set()
+    for src in sources:
+        if glob.has_magic(src):
+            found.update(p for p in glob.glob(src, recursive=True) if os.path.isfile(p))
+        elif os.path.isdir(src):
+            for root, _, files in os.walk(src):
+                for name in files:
+                    if any(fnmatch.fnmatch(name.lower(), p) for p in patterns):
+                        found.add(os.path.join(root, name))
+        else:
+            found.add(src)
+    return sorted(found)
+
+
+def skip_reason(parser: CobolParser, source_format: Optional[str] = None) -> Optional[str]:
+    """Why a member is not parsed, judged from the sniffed first block of
+    it; None to parse it. Only a source too long-lined for the sniffed block
+    to show its format is decoded in full to check `source_format`."""
+    sniffed = parser.sniff()
+    if not sniffed.is_text:
+        return "not text"
+    if source_format:
+        found = sniffed.source_format
+        if found is None:
+            parser.load_file()
+            parser.detect_format()
+            found = parser.source_format.value
+        if found != source_format:
+            return f"{found or 'no code'} format"
+    return None
+
+
+def _parse_member(parser: CobolParser, report: Dict, out_path: Optional[str], cache_dir: Optional[str],
+                  known_key: Optional[str], copybook_paths: Optional[List[str]]):
+    if cache_dir:
+        report["key"] = parser.cache_key()
+    # The key does not cover copybook contents, so with COPY expansion
+    # the output is always refreshed (still from the cache when valid).
+    if (known_key and not copybook_paths and report.get("key") == known_key
+            and out_path and os.path.exists(out_path)):
+        report["cache"] = "hit"
+    elif out_path:
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        if out_path.endswith(BINARY_SUFFIX):
+            with open(out_path, "wb") as f, BinaryWriter(f) as writer:
+                parser.parse(sink=writer)
+        else:
+            with open(out_path, "w") as f, StreamingJsonWriter(f) as writer:
+                parser.parse(sink=writer)
+    else:
+        parser.parse()
+        report["result"] = dumps(parser.parsed_data, separators=(",", ":"))
+    if cache_dir and "cache" not in report:
+        report["cache"] = "hit" if parser.cache_hit else "miss"
+
+
+def parse_one(path: str, out_path: Optional[str], timeout: Optional[float], cache_dir: Optional[str] = None,
+              known_key: Optional[str] = None, copybook_paths: Optional[List[str]] = None,
+              encoding: Optional[str] = None, source_format: Optional[str] = None) -> Dict:
+    """Parse one member in a worker process.
+
+    Never raises: failures and timeouts are reported in the returned dict so
+    one bad member cannot take down the run. When `out_path` is set the
+    result is written there (in the binary format if it ends in .cbr);
+    otherwise it comes back as a compact JSON string.
+    With a cache, an existing `out_path` produced from `known_key` is left
+    alone if the source still hashes to that key. Copybooks are loaded
+    through a per-process library, so each worker reads a shared copybook
+    once for all the members it parses. Members that are not text, or not
+    in `source_format`, are reported as skipped after reading only their
+    first block.
+    """
+    use_alarm = bool(timeout) and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    start = time.perf_counter()
+    report = {"path": path, "status": "ok"}
+    try:
+        parser = CobolParser(path, cache=get_cache(cache_dir) if cache_dir else None,
+                             copybooks=get_library(copybook_paths) if copybook_paths else None, encoding=encoding)
+        reason = skip_reason(parser, source_format)
+        if reason:
+            report["status"] = "skipped"
+            report["reason"] = reason
+        else:
+            _parse_member(parser, report, out_path, cache_dir, known_key, copybook_paths)
+    except ParseTimeout:
+        report["status"] = "timeout"
+        report["error"] = f"exceeded {timeout}s"
+    except (Exception, SystemExit) as e:
+        report["status"] = "error"
+        report["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    if report["status"] != "ok" and out_path and os.path.exists(out_path):
+        os.remove(out_path)
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+class BatchRunner:
+    def __init__(self, paths: List[str], out_dir: Optional[str] = None, ndjson_path: Optional[str] = None,
+                 workers: Optional[int] = None, timeout: Optional[float] = None, cache_dir: Optional[str] = None,
+                 copybook_paths: Optional[List[str]] = None, binary: bool = False,
+                 encoding: Optional[str] = None, source_format: Optional[str] = None):
+        self.paths = paths
+        self.out_dir = out_dir
+        self.binary = binary
+        self.encoding = encoding
+        self.source_format = source_format
+        self.ndjson_path = ndjson_path
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.copybook_paths = copybook_paths
+        self.manifest: Dict[str, str] = {}
+        self.reports: List[Dict] = []
+        self.elapsed = 0.0
+        self._root = os.path.commonpath([os.path.abspath(os.path.dirname(p)) for p in paths]) if paths else ""
+
+    def output_path(self, path: str) -> Optional[str]:
+        if not self.out_dir:
+            return None
+        rel = os.path.relpath(os.path.abspath(path), self._root)
+        return os.path.join(self.out_dir, rel + (BINARY_SUFFIX if self.binary else ".json"))
+
+    def _record(self, report: Dict, ndjson):
+        result = report.pop("result", None)
+        key = report.pop("key", None)
+        if key and report["status"] == "ok":
+            self.manifest[os.path.abspath(report["path"])] = key
+        if ndjson is not None:
+            if result is not None:
+                ndjson.write(f'{{"path":{json.dumps(report["path"])},"status":"ok","result":{result}}}\n')
+            else:
+                ndjson.write(json.dumps({k: report[k] for k in ("path", "status", "error", "reason") if k in report},
+                                        separators=(",", ":")) + "\n")
+        self.reports.append(report)
+
+    def _manifest_path(self) -> Optional[str]:
+        if self.out_dir and self.cache_dir:
+            return os.path.join(self.out_dir, MANIFEST_NAME)
+        return None
+
+    def run(self) -> List[Dict]:
+        start = time.perf_counter()
+        manifest_path = self._manifest_path()
+        if manifest_path and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        ndjson = open(self.ndjson_path, "w") if self.ndjson_path else None
+        try:
+            queue = deque(self.paths)
+            while queue:
+                # A worker that dies outright breaks the whole pool. Retry the
+                # members that were in flight one at a time, so only the one
+                # that crashes again is reported, then go on with a new pool.
+                queue, suspects = self._run_pool(queue, ndjson)
+                for path in suspects:
+                    self._run_isolated(path, ndjson)
+        finally:
+            if ndjson is not None:
+                ndjson.close()
+            if manifest_path:
+                os.makedirs(self.out_dir, exist_ok=True)
+                with open(manifest_path, "w") as f:
+                    json.dump(self.manifest, f)
+        self.elapsed = time.perf_counter() - start
+        return self.reports
+
+    def _job(self, path: str) -> tuple:
+        known_key = self.manifest.get(os.path.abspath(path))
+        return (path, self.output_path(path), self.timeout, self.cache_dir, known_key, self.copybook_paths,
+                self.encoding, self.source_format)
+
+    def _run_pool(self, queue: deque, ndjson) -> Tuple[deque, List[str]]:
+        """Parse `queue` until it is done or the pool breaks; returns what is
+        left of the queue and the members in flight when it broke."""
+        window = self.workers * 4
+        in_flight = {}
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            while queue or in_flight:
+                while queue and len(in_flight) < window:
+                    path = queue.popleft()
+                    in_flight[pool.submit(parse_one, *self._job(path))] = path
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    try:
+                        report = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        continue
+                    del in_flight[future]
+                    self._record(report, ndjson)
+                if broken:
+                    # Members that finished before the break keep their result
+                    suspects = []
+                    for future, path in in_flight.items():
+                        if future.done() and future.exception() is None:
+                            self._record(future.result(), ndjson)
+                        else:
+                            suspects.append(path)
+                    return queue, suspects
+        return deque(), []
+
+    def _run_isolated(self, path: str, ndjson):
+        """Parse one member in a pool of its own, so a crash is its own."""
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            try:
+                report = pool.submit(parse_one, *self._job(path)).result()
+            except BrokenProcessPool:
+                report = {"path": path, "status": "error", "error": "worker process crashed", "seconds": 0.0}
+        self._record(report, ndjson)
+
+    def summary(self, slowest: int = 10) -> Dict:
+        counts: Dict[str, int] = {}
+        for r in self.reports:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+            if "cache" in r:
+                counts["cache_" + r["cache"]] = counts.get("cache_" + r["cache"], 0) + 1
+        ranked = sorted(self.reports, key=lambda r: r["seconds"], reverse=True)[:slowest]
+        return {
+            "files": len(self.reports),
+            "ok": counts.get("ok", 0),
+            "errors": counts.get("error", 0),
+            "timeouts": counts.get("timeout", 0),
+            "skipped": counts.get("skipped", 0),
+            "cache_hits": counts.get("cache_hit", 0),
+            "cache_misses": counts.get("cache_miss", 0),
+            "seconds": round(self.elapsed, 3),
+            "files_per_sec": round(len(self.reports) / self.elapsed, 2) if self.elapsed else 0.0,
+            "slowest": [(r["path"], round(r["seconds"], 3)) for r in ranked],
+            "failures": [(r["path"], r["error"]) for r in self.reports if r["status"] not in ("ok", "skipped")],
+        }
+
+
+def print_summary(summary: Dict):
+    print(f"Parsed {summary['files']} files in {summary['seconds']:.2f}s "
+          f"({summary['files_per_sec']:.1f} files/sec): "
+          f"{summary['ok']} ok, {summary['errors']} errors, {summary['timeouts']} timeouts, "
+          f"{summary['skipped']} skipped")
+    if summary["cache_hits"] or summary["cache_misses"]:
+        print(f"Cache: {summary['cache_hits']} hits, {summary['cache_misses']} misses")
+    if summary["slowest"]:
+        print("Slowest files:")
+        for path, seconds in summary["slowest"]:
+            print(f"  {seconds:8.3f}s  {path}")
+    for path, error in summary["failures"]:
+        print(f"FAILED {path}: {error}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Parse COBOL source trees in parallel.")
+    ap.add_argument("sources", nargs="+", help="files, directories or glob patterns")
+    out = ap.add_mutually_exclusive_group(required=True)
+    out.add_argument("--out-dir", help="write one JSON file per input under this directory")
+    out.add_argument("--ndjson", help="write all results to one NDJSON file, one line per input")
+    ap.add_argument("--binary", action="store_true",
+                    help="with --out-dir, write .cbr files in the compact binary format instead of JSON")
+    ap.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--timeout", type=float, default=None, help="per-file timeout in seconds")
+    ap.add_argument("--include", action="append", default=None,
+                    help=f"filename pattern for directory inputs (default: {' '.join(DEFAULT_INCLUDE)})")
+    ap.add_argument("--cache-dir", default=os.environ.get("COBOL_PARSE_CACHE"),
+                    help="reuse results for unchanged members from this directory (default: $COBOL_PARSE_CACHE)")
+    ap.add_argument("-I", "--copybook-path", action="append", default=None,
+                    help="expand COPY statements from copybooks in this directory; repeatable (default: $COBCPY)")
+    ap.add_argument("--encoding", help="codepage of every member, e.g. cp037 (default: sniffed per member)")
+    ap.add_argument("--source-format", choices=("FIXED", "FREE"),
+                    help="only parse members in this format; others are skipped after reading their first block")
+    ap.add_argument("--slowest", type=int, default=10, help="number of slowest files to report")
+    ap.add_argument("--summary-json", help="also write the summary to this file")
+    args = ap.parse_args(argv)
+    if args.binary and not args.out_dir:
+        ap.error("--binary requires --out-dir")
+
+    paths = collect_sources(args.sources, args.include or DEFAULT_INCLUDE)
+    if not paths:
+        print("No input files found.", file=sys.stderr)
+        sys.exit(1)
+
+    runner = BatchRunner(paths, out_dir=args.out_dir, ndjson_path=args.ndjson,
+                         workers=args.workers, timeout=args.timeout, cache_dir=args.cache_dir,
+                         copybook_paths=args.copybook_path or search_paths_from_env(), binary=args.binary,
+                         encoding=args.encoding, source_format=args.source_format)
+    runner.run()
+    summary = runner.summary(args.slowest)
+    print_summary(summary)
+    if args.summary_json:
+        with open(args.summary_json, "w") as f:
+            json.dump(summary, f, indent=4)
+    if summary["ok"] + summary["skipped"] != summary["files"]:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
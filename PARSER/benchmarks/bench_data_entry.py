@@ -0,0 +1,106 @@
+"""Data entry recognizer throughput on a generated 100k-field copybook.
+
+Usage: python benchmarks/bench_data_entry.py [--fields 100000]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cobolparser import CobolParser, scan_data_entry  # noqa: E402
+
+
+def legacy_parse_data_entry(line):
+    """The original CobolParser._parse_data_entry, kept here as the baseline."""
+    clean = line.rstrip('.')
+    parts = clean.split()
+    if not parts: return None
+    level = parts[0]
+    if not level.isdigit(): return None
+    entry = {"level": level, "name": "", "picture": None, "usage": None, "value": None}
+    if len(parts) > 1:
+        entry["name"] = parts[1]
+    rest_of_line = " ".join(parts[2:])
+    pic_match = re.search(r'\b(PIC|PICTURE)\s+(IS\s+)?([A-Z0-9\(\)V9S]+)', rest_of_line, re.IGNORECASE)
+    if pic_match:
+        entry["picture"] = pic_match.group(3)
+    val_match = re.search(r'\bVALUE\s+(IS\s+)?(.+)', rest_of_line, re.IGNORECASE)
+    if val_match:
+        entry["value"] = val_match.group(2).strip()
+    usage_match = re.search(r'\b(COMP|COMP-3|BINARY|DISPLAY|PACKED-DECIMAL)\b', rest_of_line, re.IGNORECASE)
+    if usage_match:
+        entry["usage"] = usage_match.group(1)
+    return entry
+
+
+def generate_copybook_lines(fields, seed=42):
+    """Deterministic copybook text with `fields` data description entries."""
+    rnd = random.Random(seed)
+    lines = []
+    n = 0
+    while n < fields:
+        lines.append(f"01  REC-{n:06d}.")
+        n += 1
+        for _ in range(rnd.randint(20, 200)):
+            name = f"FLD-{n:06d}"
+            kind = rnd.random()
+            if kind < 0.35:
+                lines.append(f"    05  {name}  PIC X({rnd.randint(1, 60)}) VALUE SPACES.")
+            elif kind < 0.55:
+                lines.append(f"    05  {name}  PIC S9({rnd.randint(1, 15)})V99 COMP-3.")
+            elif kind < 0.65:
+                lines.append(f"    05  {name}  PIC 9(4) USAGE IS BINARY VALUE ZERO.")
+            elif kind < 0.75:
+                lines.append(f"    05  {name}  OCCURS {rnd.randint(2, 20)} TIMES INDEXED BY {name}-IX.")
+                lines.append(f"        10  {name}-A  PIC X(8).")
+                n += 1
+            elif kind < 0.85:
+                lines.append(f"    05  {name}  PIC X(2) VALUE 'N'.")
+                lines.append(f"        88  {name}-YES  VALUE 'Y' 'T'.")
+                n += 1
+            elif kind < 0.92:
+                lines.append(f"    05  {name}  PIC S9(7) SIGN IS LEADING SEPARATE.")
+            else:
+                lines.append(f"    05  {name}  REDEFINES FLD-{n - 1:06d}  PIC X(4) JUSTIFIED RIGHT.")
+            n += 1
+    return lines
+
+
+def timed(fn, lines):
+    start = time.perf_counter()
+    for line in lines:
+        fn(line)
+    return time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--fields", type=int, default=100_000)
+    args = ap.parse_args()
+
+    lines = generate_copybook_lines(args.fields)
+    n = len(lines)
+    print(f"Generated {n:,} data description lines")
+
+    t_legacy = timed(legacy_parse_data_entry, lines)
+    print(f"legacy recognizer : {t_legacy:6.2f}s  {n / t_legacy:>12,.0f} lines/sec")
+    t_scan = timed(scan_data_entry, lines)
+    print(f"clause scanner    : {t_scan:6.2f}s  {n / t_scan:>12,.0f} lines/sec")
+    print(f"speedup           : {t_legacy / t_scan:.2f}x")
+
+    source = ("       DATA DIVISION.\n       WORKING-STORAGE SECTION.\n"
+              + "".join(f"       {line}\n" for line in lines)).encode("ascii")
+    parser = CobolParser("BENCH.cbl", source=source)
+    start = time.perf_counter()
+    parser.parse()
+    t_parse = time.perf_counter() - start
+    print(f"full parse        : {t_parse:6.2f}s  {n / t_parse:>12,.0f} lines/sec "
+          f"({len(parser.parsed_data['data_division']):,} entries)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Parser benchmark: per-phase time and peak memory on a generated corpus,
+compared against a stored baseline.
+
+Usage: python benchmarks/bench_parser.py [--sizes 10000,100000] [--depth 6] [--repeat 3]
+                                         [--baseline benchmarks/baseline.json] [--threshold 0.25]
+                                         [--save-baseline PATH] [--output results.json]
+                                         [--corpus-dir DIR] [--no-memory]
+
+Each size is parsed in FIXED and FREE format, with and without copybook
+expansion. Times are the best of --repeat runs; memory is the tracemalloc
+peak of one extra run. With a baseline, a case whose total time or peak
+memory grew by more than --threshold (default 25%) fails the run (exit 1).
+Baselines are only comparable on the machine that recorded them, and a
+baseline from another PARSER_VERSION is refused.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from cobolparser import PARSER_VERSION, CobolParser  # noqa: E402
+from copybook import CopybookLibrary  # noqa: E402
+from corpus import FORMATS, write_corpus  # noqa: E402
+from profiling import PHASES, ParseProfile  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+# Cases faster than this are too noisy to fail a run on time
+MIN_COMPARED_SECONDS = 0.05
+
+
+def case_name(source_format: str, lines: int, copybooks: bool) -> str:
+    size = f"{lines // 1000}k" if lines % 1000 == 0 else str(lines)
+    return f"{source_format.lower()}-{size}{'-copy' if copybooks else ''}"
+
+
+def profile_parse(path: str, copybook_dir: Optional[str], memory: bool = False) -> Dict[str, Any]:
+    # A fresh library each run, so copybooks are read and cleaned every time
+    copybooks = CopybookLibrary([copybook_dir]) if copybook_dir else None
+    profile = ParseProfile(memory=memory)
+    CobolParser(path, copybooks=copybooks, profile=profile).parse()
+    return profile.to_dict()
+
+
+def run_case(path: str, copybook_dir: Optional[str], repeat: int, memory: bool) -> Dict[str, Any]:
+    runs = [profile_parse(path, copybook_dir) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run["total_seconds"])
+    result = {
+        "total_seconds": best["total_seconds"],
+        # Per phase, the best over all runs
+        "phases": {name: min(run["phases"][name] for run in runs) for name in best["phases"]},
+        "lines": best["lines"],
+        "tokens": best["tokens"],
+        "statements": best["statements"],
+        "max_depth": best["max_depth"],
+        "lines_per_second": best["lines"] / best["total_seconds"] if best["total_seconds"] else 0.0,
+    }
+    if memory:
+        result["peak_bytes"] = profile_parse(path, copybook_dir, memory=True)["peak_traced_bytes"]
+    return result
+
+
+def run_suite(sizes: List[int], depth: int, repeat: int, memory: bool, corpus_dir: str,
+              copybook_fields: int) -> Dict[str, Any]:
+    cases = {}
+    for lines in sizes:
+        size_dir = os.path.join(corpus_dir, str(lines))
+        programs = write_corpus(size_dir, lines, FORMATS, depth, copybook_fields=copybook_fields)
+        for source_format in FORMATS:
+            for copybooks in (False, True):
+                name = case_name(source_format, lines, copybooks)
+                copybook_dir = os.path.join(size_dir, "copybooks", source_format) if copybooks else None
+                print(f"  {name} ...", end="", flush=True)
+                cases[name] = run_case(programs[source_format], copybook_dir, repeat, memory)
+                print(f" {cases[name]['total_seconds']:.3f}s")
+    return {
+        "parser_version": PARSER_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {"sizes": sizes, "depth": depth, "repeat": repeat, "copybook_fields": copybook_fields},
+        "cases": cases,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print current vs baseline per case; return the regressions."""
+    failures = []
+    print(f"\n{'case':<18}{'seconds':>9}{'base':>9}{'change':>9}{'peak MB':>10}{'base':>9}{'change':>9}")
+    for name, case in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            print(f"{name:<18}{case['total_seconds']:>9.3f}{'-':>9}")
+            continue
+        row = f"{name:<18}{case['total_seconds']:>9.3f}{base['total_seconds']:>9.3f}"
+        change = case["total_seconds"] / base["total_seconds"] - 1 if base["total_seconds"] else 0.0
+        row += f"{change:>+9.0%}"
+        if change > threshold and base["total_seconds"] >= MIN_COMPARED_SECONDS:
+            failures.append(f"{name}: {change:+.0%} time")
+        if "peak_bytes" in case and "peak_bytes" in base:
+            mem_change = case["peak_bytes"] / base["peak_bytes"] - 1 if base["peak_bytes"] else 0.0
+            row += f"{case['peak_bytes'] / 1e6:>10.1f}{base['peak_bytes'] / 1e6:>9.1f}{mem_change:>+9.0%}"
+            if mem_change > threshold:
+                failures.append(f"{name}: {mem_change:+.0%} peak memory")
+        print(row)
+    return failures
+
+
+def print_phases(results: Dict[str, Any]):
+    print(f"\n{'case':<18}" + "".join(f"{name:>17}" for name in PHASES[1:]))
+    for name, case in results["cases"].items():
+        print(f"{name:<18}" + "".join(f"{case['phases'].get(phase, 0.0):>17.4f}" for phase in PHASES[1:]))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="10000,100000", help="comma-separated program sizes in lines")
+    ap.add_argument("--depth", type=int, default=6, help="deepest statement nesting")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--copybook-fields", type=int, default=20000, help="data entries per copybook")
+    ap.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc run")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE, help="compare against this file if it exists")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown/growth (0.25 = 25%%)")
+    ap.add_argument("--save-baseline", metavar="PATH", help="write the results as a new baseline")
+    ap.add_argument("-o", "--output", help="write the results as JSON")
+    ap.add_argument("--corpus-dir", help="generate the corpus here and keep it (default: a temp dir)")
+    args = ap.parse_args()
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("parser_version") != PARSER_VERSION:
+            print(f"{args.baseline} was recorded with parser version {baseline.get('parser_version')}, "
+                  f"not {PARSER_VERSION}; refresh it with --save-baseline {args.baseline}")
+            sys.exit(1)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="cobol-bench-")
+    try:
+        results = run_suite(sizes, args.depth, args.repeat, args.memory, corpus_dir, args.copybook_fields)
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    print_phases(results)
+    failures = []
+    if baseline is not None:
+        if baseline.get("settings") != results["settings"]:
+            print(f"\nNote: {args.baseline} was recorded with {baseline.get('settings')}")
+        failures = compare(results, baseline, args.threshold)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=4)
+            print(f"\nWrote {path}")
+    if failures:
+        print(f"\nRegressions beyond {args.threshold:.0%}:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Tokenizer throughput: legacy regex+Token objects vs the single-pass Lexer.
+
+Usage: python benchmarks/bench_tokenize.py [--lines 500000] [--memory]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cobolparser import Lexer, ProcedureParser  # noqa: E402
+
+
+class LegacyToken:
+    def __init__(self, type_, value, line_num):
+        self.type = type_
+        self.value = value
+        self.line_num = line_num
+
+
+def legacy_tokenize(lines):
+    """The original ProcedureParser.tokenize, kept here as the baseline."""
+    token_pattern = re.compile(r"""('[^']*'|"[^"]*"|[\w-]+|.)""")
+    tokens = []
+    for line_num, text in lines:
+        for m in token_pattern.findall(text):
+            val = m.strip()
+            if not val: continue
+            tokens.append(LegacyToken("WORD", val, line_num))
+    return tokens
+
+
+def generate_procedure_lines(count, seed=42):
+    """Deterministic PROCEDURE DIVISION body of roughly `count` lines."""
+    rnd = random.Random(seed)
+    names = [f"WS-FIELD-{i:04d}" for i in range(400)]
+    lines = []
+    para = 0
+    while len(lines) < count:
+        lines.append(f"{para:04d}-PARA-{para}.")
+        para += 1
+        for _ in range(rnd.randint(10, 40)):
+            a, b = rnd.choice(names), rnd.choice(names)
+            kind = rnd.random()
+            if kind < 0.3:
+                lines.append(f"    MOVE {a} TO {b}")
+            elif kind < 0.5:
+                lines.append(f"    IF {a} > {rnd.randint(0, 999)}")
+                lines.append(f"        DISPLAY 'VALUE OF {a} IS ' {a}")
+                lines.append(f"        ADD 1 TO {b}")
+                lines.append("    ELSE")
+                lines.append(f"        MOVE SPACES TO {b}")
+                lines.append("    END-IF")
+            elif kind < 0.65:
+                lines.append(f"    PERFORM {rnd.randint(0, 9999):04d}-PARA-X UNTIL {a} = 'Y'")
+            elif kind < 0.8:
+                lines.append(f"    EVALUATE {a}")
+                lines.append(f"        WHEN 1 MOVE 'A' TO {b}")
+                lines.append(f"        WHEN OTHER CONTINUE")
+                lines.append("    END-EVALUATE")
+            else:
+                lines.append(f"    COMPUTE {a} = {b} * 2 + {rnd.randint(1, 99)}")
+        lines[-1] += "."
+    return list(enumerate(lines[:count], 1))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def traced(fn, *args):
+    tracemalloc.start()
+    result = fn(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def report_memory(lines):
+    legacy, size = traced(legacy_tokenize, lines)
+    print(f"legacy memory   : {size / len(legacy):8.1f} bytes/token")
+    del legacy
+    store, size = traced(Lexer().tokenize, lines)
+    print(f"store memory    : {size / len(store):8.1f} bytes/token "
+          f"({store.nbytes() / len(store):.1f} in token arrays, rest is the shared source text)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--lines", type=int, default=500_000)
+    ap.add_argument("--memory", action="store_true", help="also report bytes per token (slow)")
+    args = ap.parse_args()
+
+    lines = generate_procedure_lines(args.lines)
+    print(f"Generated {len(lines):,} procedure lines")
+
+    legacy, t_legacy = timed(legacy_tokenize, lines)
+    n = len(legacy)
+    del legacy
+    print(f"legacy tokenize : {n:>10,} tokens  {t_legacy:6.2f}s  {n / t_legacy:>12,.0f} tokens/sec")
+
+    tokens, t_lexer = timed(Lexer().tokenize, lines)
+    n = len(tokens)
+    del tokens
+    print(f"lexer tokenize  : {n:>10,} tokens  {t_lexer:6.2f}s  {n / t_lexer:>12,.0f} tokens/sec")
+    print(f"speedup         : {t_legacy / t_lexer:.2f}x")
+
+    parser = ProcedureParser(lines)
+    _, t_parse = timed(parser.parse)
+    print(f"tokenize+parse  : {parser.length:>10,} tokens  {t_parse:6.2f}s  {parser.length / t_parse:>12,.0f} tokens/sec")
+
+    if args.memory:
+        report_memory(lines)
+
+
+if __name__ == "__main__":
+    main()
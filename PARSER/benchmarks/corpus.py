@@ -0,0 +1,274 @@
+"""Deterministic synthetic COBOL corpus for the parser benchmarks.
+
+Usage: python benchmarks/corpus.py OUT_DIR [--lines 100000] [--format FIXED|FREE|both]
+                                   [--depth 6] [--copybooks 3] [--copybook-fields 20000] [--seed 42]
+
+Writes BENCH-FIXED.cbl and/or BENCH-FREE.cbl to OUT_DIR and the copybooks
+they COPY to OUT_DIR/copybooks. The same arguments always produce the same
+bytes.
+"""
+import argparse
+import os
+import random
+import sys
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_data_entry import generate_copybook_lines  # noqa: E402
+
+FORMATS = ("FIXED", "FREE")
+# Text columns per line: 8-72 in FIXED format, leaving room for a period
+FIXED_WIDTH = 64
+FREE_WIDTH = 100
+PROCEDURE_COPYBOOK = "PROCCPY"
+
+
+class SourceWriter:
+    """Lays out lines for one source format, wrapping long statements at
+    word boundaries."""
+
+    def __init__(self, source_format: str):
+        self.fixed = source_format == "FIXED"
+        self.width = FIXED_WIDTH if self.fixed else FREE_WIDTH
+        self.lines: List[str] = []
+
+    def _emit(self, indicator: str, text: str):
+        if self.fixed:
+            self.lines.append(f"{len(self.lines) + 1:06d}"[-6:] + indicator + text)
+        elif indicator == "*":
+            self.lines.append("*> " + text)
+        else:
+            self.lines.append(text)
+
+    def area_a(self, text: str):
+        self._emit(" ", text)
+
+    def area_b(self, text: str, indent: int = 0):
+        prefix = "    " + "  " * min(indent, 10)
+        line = prefix
+        for word in text.split(" "):
+            if len(line) > len(prefix) and len(line) + 1 + len(word) > self.width:
+                self._emit(" ", line)
+                line = prefix + "    "
+            line += word if line.endswith(" ") else " " + word
+        self._emit(" ", line)
+
+    def comment(self, text: str):
+        self._emit("*", text)
+
+    def end_sentence(self):
+        self.lines[-1] += "."
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+class ProgramGenerator:
+    """Builds one program of about `lines` lines whose statements nest up to
+    `depth` levels (IF, EVALUATE and inline PERFORM bodies)."""
+
+    def __init__(self, source_format: str, lines: int, depth: int, copybooks: List[str], seed: int):
+        self.rnd = random.Random(f"{seed}-{source_format}")
+        self.out = SourceWriter(source_format)
+        self.target = lines
+        self.depth = max(depth, 1)
+        self.copybooks = copybooks
+        self.fields = [f"WS-FLD-{i:04d}" for i in range(max(50, lines // 200))]
+        self.flags = [f"WS-SW-{i:03d}" for i in range(20)]
+        self.paragraphs = max(10, lines // 25)
+
+    def field(self) -> str:
+        return self.rnd.choice(self.fields)
+
+    def paragraph_name(self) -> str:
+        return f"P{self.rnd.randrange(self.paragraphs):06d}-PROC"
+
+    def generate(self) -> str:
+        out = self.out
+        out.area_a("IDENTIFICATION DIVISION.")
+        out.area_a("PROGRAM-ID. BENCHPGM.")
+        out.area_a("AUTHOR. CORPUS-GENERATOR.")
+        out.area_a("ENVIRONMENT DIVISION.")
+        out.area_a("INPUT-OUTPUT SECTION.")
+        out.area_a("FILE-CONTROL.")
+        for i in range(5):
+            out.area_b(f"SELECT FILE-{i} ASSIGN TO 'FILE{i}.DAT' ORGANIZATION IS SEQUENTIAL"
+                       f" FILE STATUS IS WS-FS-{i}.")
+        self.data_division()
+        self.procedure_division()
+        return out.text()
+
+    def data_division(self):
+        out, rnd = self.out, self.rnd
+        out.area_a("DATA DIVISION.")
+        out.area_a("WORKING-STORAGE SECTION.")
+        for i in range(5):
+            out.area_a(f"01  WS-FS-{i} PIC XX.")
+        for name in self.copybooks:
+            out.area_a(f"COPY {name}.")
+        out.area_a("01  WS-FIELDS.")
+        for name in self.fields:
+            kind = rnd.random()
+            if kind < 0.5:
+                out.area_b(f"05  {name} PIC S9({rnd.randint(1, 9)})V99 COMP-3 VALUE ZERO.")
+            elif kind < 0.8:
+                out.area_b(f"05  {name} PIC X({rnd.randint(1, 40)}) VALUE SPACES.")
+            else:
+                out.area_b(f"05  {name} PIC 9(4) COMP.")
+        out.area_a("01  WS-SWITCHES.")
+        for name in self.flags:
+            out.area_b(f"05  {name} PIC X VALUE 'N'.")
+            out.area_b(f"88  {name}-ON VALUE 'Y'.", 1)
+            out.area_b(f"88  {name}-OFF VALUE 'N'.", 1)
+
+    def procedure_division(self):
+        out, rnd = self.out, self.rnd
+        out.area_a("PROCEDURE DIVISION.")
+        para = 0
+        while len(out.lines) < self.target or para < 2:
+            if para % 50 == 0:
+                out.area_a(f"S{para // 50:04d}-SECTION SECTION.")
+            out.area_a(f"P{para % self.paragraphs:06d}-PROC.")
+            if rnd.random() < 0.1:
+                out.comment(f"PARAGRAPH {para} HANDLES BATCH STEP {rnd.randint(1, 99)}")
+            # Every 20th paragraph reaches the full nesting depth
+            if para % 20 == 0:
+                self.statement(0, force_depth=self.depth)
+            for _ in range(rnd.randint(3, 12)):
+                self.statement(0)
+            if para > 0 and para % 40 == 0:
+                out.area_b(f"COPY {PROCEDURE_COPYBOOK}.")
+            else:
+                out.end_sentence()
+            para += 1
+        out.area_a("9999-EXIT.")
+        out.area_b("GOBACK.")
+
+    def block(self, level: int, force_depth: int = 0):
+        if force_depth:
+            self.statement(level, force_depth)
+        for _ in range(self.rnd.randint(1, 3)):
+            self.statement(level)
+
+    def statement(self, level: int, force_depth: int = 0):
+        """Write one statement nested `level` blocks deep. With `force_depth`, a
+        compound statement nesting that many more levels."""
+        out, rnd = self.out, self.rnd
+        nestable = level + 1 < self.depth
+        if force_depth > 1 and nestable:
+            kind = rnd.choice((0.0, 0.2, 0.28))
+        elif nestable and rnd.random() < 0.3 / (1 + level):
+            # Compound statements thin out with depth so blocks stay small
+            kind = rnd.random() * 0.3
+        else:
+            kind = 0.3 + rnd.random() * 0.7
+        deeper = force_depth - 1 if force_depth > 1 else 0
+        indent = 2 * level
+        if kind < 0.15:
+            out.area_b(f"IF {self.field()} > {rnd.randint(0, 999)}{' THEN' if rnd.random() < 0.3 else ''}", indent)
+            self.block(level + 1, deeper)
+            if rnd.random() < 0.5:
+                out.area_b("ELSE", indent)
+                self.block(level + 1)
+            out.area_b("END-IF", indent)
+        elif kind < 0.22:
+            out.area_b(f"EVALUATE {self.field()}", indent)
+            for value in range(rnd.randint(2, 4)):
+                out.area_b(f"WHEN {value}", indent + 1)
+                self.block(level + 1, deeper if value == 0 else 0)
+            out.area_b("WHEN OTHER", indent + 1)
+            out.area_b("CONTINUE", indent + 2)
+            out.area_b("END-EVALUATE", indent)
+        elif kind < 0.3:
+            if rnd.random() < 0.5:
+                out.area_b(f"PERFORM UNTIL {rnd.choice(self.flags)}-ON", indent)
+            else:
+                out.area_b(f"PERFORM VARYING {self.field()} FROM 1 BY 1 UNTIL {self.field()} > 10", indent)
+            self.block(level + 1, deeper)
+            out.area_b("END-PERFORM", indent)
+        elif kind < 0.6:
+            source = rnd.choice((self.field(), "SPACES", "ZERO", f"'VALUE-{rnd.randint(0, 999)}'"))
+            out.area_b(f"MOVE {source} TO {self.field()}", indent)
+        elif kind < 0.7:
+            out.area_b(f"COMPUTE {self.field()} = {self.field()} * {rnd.randint(2, 99)} + {self.field()}", indent)
+        elif kind < 0.76:
+            out.area_b(f"ADD {rnd.randint(1, 9)} TO {self.field()}", indent)
+        elif kind < 0.84:
+            if rnd.random() < 0.2:
+                out.area_b(f"PERFORM {self.paragraph_name()} THRU {self.paragraph_name()}", indent)
+            else:
+                out.area_b(f"PERFORM {self.paragraph_name()}", indent)
+        elif kind < 0.9:
+            out.area_b(f"DISPLAY 'STEP {rnd.randint(0, 9999)} ' {self.field()}", indent)
+        elif kind < 0.95:
+            out.area_b(f"CALL 'SUB{rnd.randint(0, 99):03d}' USING {self.field()} {self.field()}", indent)
+            if rnd.random() < 0.3:
+                out.area_b("END-CALL", indent)
+        elif kind < 0.97:
+            out.area_b(f"GO TO {self.paragraph_name()}", indent)
+        else:
+            out.area_b(f"SET {rnd.choice(self.flags)}-ON TO TRUE", indent)
+
+
+def generate_copybook(source_format: str, fields: int, seed: int) -> str:
+    out = SourceWriter(source_format)
+    for line in generate_copybook_lines(fields, seed):
+        if line.startswith("01"):
+            out.area_a(line)
+        else:
+            out.area_b(line.strip(), 1 if line.startswith("    05") else 2)
+    return out.text()
+
+
+def generate_procedure_copybook(source_format: str) -> str:
+    out = SourceWriter(source_format)
+    out.area_b("MOVE SPACES TO WS-FLD-0000")
+    out.area_b("IF WS-FLD-0001 > 0")
+    out.area_b("ADD 1 TO WS-FLD-0002", 1)
+    out.area_b("END-IF")
+    out.end_sentence()
+    return out.text()
+
+
+def write_corpus(out_dir: str, lines: int, formats=FORMATS, depth: int = 6, copybooks: int = 3,
+                 copybook_fields: int = 20000, seed: int = 42) -> Dict[str, str]:
+    """Write one program per format plus its copybooks. Returns {format:
+    program path}; the copybooks are in OUT_DIR/copybooks/<format>."""
+    programs = {}
+    for source_format in formats:
+        book_dir = os.path.join(out_dir, "copybooks", source_format)
+        os.makedirs(book_dir, exist_ok=True)
+        names = [f"CPY{i:03d}" for i in range(copybooks)]
+        for i, name in enumerate(names):
+            with open(os.path.join(book_dir, name + ".cpy"), "w") as f:
+                f.write(generate_copybook(source_format, copybook_fields, seed + i))
+        with open(os.path.join(book_dir, PROCEDURE_COPYBOOK + ".cpy"), "w") as f:
+            f.write(generate_procedure_copybook(source_format))
+        path = os.path.join(out_dir, f"BENCH-{source_format}.cbl")
+        with open(path, "w") as f:
+            f.write(ProgramGenerator(source_format, lines, depth, names, seed).generate())
+        programs[source_format] = path
+    return programs
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("out_dir")
+    ap.add_argument("--lines", type=int, default=100_000, help="program size in lines, copybooks excluded")
+    ap.add_argument("--format", choices=FORMATS + ("both",), default="both")
+    ap.add_argument("--depth", type=int, default=6, help="deepest statement nesting")
+    ap.add_argument("--copybooks", type=int, default=3, help="data copybooks each program COPYs")
+    ap.add_argument("--copybook-fields", type=int, default=20000, help="data entries per copybook")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    formats = FORMATS if args.format == "both" else (args.format,)
+    programs = write_corpus(args.out_dir, args.lines, formats, args.depth, args.copybooks,
+                            args.copybook_fields, args.seed)
+    for source_format, path in programs.items():
+        print(f"{source_format:5} {path}  ({os.path.getsize(path):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
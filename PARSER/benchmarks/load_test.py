@@ -0,0 +1,128 @@
+"""Load test for server.py: concurrent multipart uploads to /parse.
+
+Usage: python benchmarks/load_test.py [--url http://localhost:8000] [--clients 50]
+                                      [--requests 20] [--unique] [FILE]
+
+Each client thread opens its own connections and posts FILE (example.cbl by
+default) --requests times; latencies of all requests are pooled. With
+--unique every upload gets a different trailing comment line, so none is
+answered from the server's result cache. Refusals (429/503) are counted with
+the errors; the server's queue wait and parse time are printed from /metrics.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def multipart_body(filename, data):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def client(url, make_body, count, latencies, errors, lock):
+    for _ in range(count):
+        body, content_type = make_body()
+        start = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=300)
+            conn.request("POST", url.path or "/parse", body=body,
+                         headers={"Content-Type": content_type, "Content-Length": str(len(body))})
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            status = response.status
+        except OSError as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            if status == 200:
+                latencies.append(elapsed)
+            else:
+                errors[status] = errors.get(status, 0) + 1
+
+
+def print_server_timings(url):
+    """The server's queue wait and parse time from /metrics, if it has them."""
+    try:
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+        conn.request("GET", "/metrics")
+        data = json.loads(conn.getresponse().read())
+        conn.close()
+    except (OSError, ValueError):
+        return
+    for name in ("queue_wait_seconds", "parse_seconds"):
+        timing = data.get("timings", {}).get(name)
+        if timing:
+            print(f"server {name.replace('_seconds', '').replace('_', ' '):<11}: p50 {timing['p50'] * 1000:.1f} ms, "
+                  f"p99 {timing['p99'] * 1000:.1f} ms, max {timing['max'] * 1000:.1f} ms over {timing['count']:,}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("file", nargs="?", default=os.path.join(HERE, "example.cbl"))
+    ap.add_argument("--url", default="http://localhost:8000/parse")
+    ap.add_argument("--clients", type=int, default=50)
+    ap.add_argument("--requests", type=int, default=20, help="requests per client")
+    ap.add_argument("--unique", action="store_true", help="make every upload different")
+    args = ap.parse_args()
+
+    url = urlsplit(args.url if args.url.rstrip("/").endswith("/parse") else args.url.rstrip("/") + "/parse")
+    with open(args.file, "rb") as f:
+        data = f.read()
+    body, content_type = multipart_body(os.path.basename(args.file), data)
+    if args.unique:
+        counter = itertools.count()
+        newline = b"\r\n" if b"\r\n" in data else b"\n"
+        make_body = lambda: multipart_body(os.path.basename(args.file),
+                                           data.rstrip() + newline + b"      * load %d" % next(counter) + newline)
+    else:
+        make_body = lambda: (body, content_type)
+
+    latencies, errors, lock = [], {}, threading.Lock()
+    threads = [threading.Thread(target=client, args=(url, make_body, args.requests, latencies, errors, lock))
+               for _ in range(args.clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies) + sum(errors.values())
+    print(f"{args.clients} clients x {args.requests} requests, {len(body):,} byte upload")
+    print(f"ok         : {len(latencies):>8,} / {total:,}")
+    if errors:
+        print("errors     : " + ", ".join(f"{k}={v}" for k, v in sorted(errors.items(), key=str)))
+    print(f"throughput : {len(latencies) / wall:8.1f} req/s over {wall:.1f}s")
+    print(f"p50        : {percentile(latencies, 50) * 1000:8.1f} ms")
+    print(f"p99        : {percentile(latencies, 99) * 1000:8.1f} ms")
+    print(f"max        : {(latencies[-1] if latencies else 0) * 1000:8.1f} ms")
+    print_server_timings(url)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
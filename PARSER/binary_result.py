@@ -0,0 +1,444 @@
+"""Compact binary form of a parse result, with lazy paragraph access.
+
+    with open("output.cbr", "wb") as f, BinaryWriter(f) as writer:
+        CobolParser(path).parse(sink=writer)
+
+    with BinaryResult.open("output.cbr") as result:
+        result.paragraph("MAIN-PARA")    # decodes that paragraph only
+        result.to_dict()                 # == parsed_data
+
+Layout: a magic number, one record per division, data entry and paragraph
+in the order the parser emits them, the string table, an index of record
+offsets, and a fixed-size trailer pointing at the table and the index.
+Values are tagged MessagePack-style. Dict keys and strings of up to
+MAX_INTERNED characters are stored once in the string table and referenced
+by number, so verbs, statement types and data names take a byte or two per
+use. Records are self-delimiting, so reading one needs only its offset:
+opening a result reads the trailer, the string table and the index, and
+nothing else is decoded until asked for.
+"""
+import mmap
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from json_stream import TOP_LEVEL_KEYS
+
+MAGIC = b"CBR1"
+TRAILER = struct.Struct("<QQ4s")  # string table offset, index offset, MAGIC
+DOUBLE = struct.Struct("<d")
+# Longer strings (statement texts, conditions) are rarely repeated and are
+# stored inline
+MAX_INTERNED = 32
+SUFFIX = ".cbr"
+
+# Value tags
+NONE, FALSE, TRUE, INT, FLOAT, STR, REF, LIST, DICT = range(9)
+_END = object()
+
+
+class BinaryFormatError(ValueError):
+    pass
+
+
+def _varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _encode(value: Any, out: bytearray, strings: Dict[str, int]):
+    t = type(value)
+    if t is str:
+        if len(value) <= MAX_INTERNED:
+            ref = strings.get(value)
+            if ref is None:
+                ref = strings[value] = len(strings)
+            out.append(REF)
+            _varint(out, ref)
+        else:
+            data = value.encode("utf-8")
+            out.append(STR)
+            _varint(out, len(data))
+            out += data
+    elif t is dict:
+        out.append(DICT)
+        _varint(out, len(value))
+        for key, item in value.items():
+            if type(key) is not str:
+                raise TypeError(f"dict keys must be str, not {type(key).__name__}")
+            ref = strings.get(key)
+            if ref is None:
+                ref = strings[key] = len(strings)
+            _varint(out, ref)
+            _encode(item, out, strings)
+    elif t is list or t is tuple:
+        out.append(LIST)
+        _varint(out, len(value))
+        for item in value:
+            _encode(item, out, strings)
+    elif value is None:
+        out.append(NONE)
+    elif value is True:
+        out.append(TRUE)
+    elif value is False:
+        out.append(FALSE)
+    elif t is int:
+        out.append(INT)
+        # Zigzag, so small negative numbers stay short
+        _varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    elif t is float:
+        out.append(FLOAT)
+        out += DOUBLE.pack(value)
+    else:
+        raise TypeError(f"cannot encode {t.__name__}")
+
+
+def _dict_items(value: Dict[str, Any], out: bytearray, strings: Dict[str, int]) -> Iterator[Any]:
+    # Writes each key just before its value is encoded
+    for key, item in value.items():
+        if type(key) is not str:
+            raise TypeError(f"dict keys must be str, not {type(key).__name__}")
+        ref = strings.get(key)
+        if ref is None:
+            ref = strings[key] = len(strings)
+        _varint(out, ref)
+        yield item
+
+
+def _encode_iterative(value: Any, out: bytearray, strings: Dict[str, int]):
+    """_encode with an explicit stack, for values nested deeper than the
+    recursion limit allows."""
+    stack: List[Iterator[Any]] = [iter((value,))]
+    while stack:
+        item = next(stack[-1], _END)
+        if item is _END:
+            stack.pop()
+            continue
+        t = type(item)
+        if t is dict:
+            out.append(DICT)
+            _varint(out, len(item))
+            stack.append(_dict_items(item, out, strings))
+        elif t is list or t is tuple:
+            out.append(LIST)
+            _varint(out, len(item))
+            stack.append(iter(item))
+        else:
+            _encode(item, out, strings)
+
+
+def _read_varint(buf, pos: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _decoder(buf, strings: List[str]):
+    """A function decoding the value at a position of `buf`: pos -> (value, end)."""
+    unpack_double = DOUBLE.unpack_from
+
+    def read(pos: int) -> Tuple[Any, int]:
+        tag = buf[pos]
+        pos += 1
+        if tag == REF:
+            n = buf[pos]
+            if n < 0x80:
+                return strings[n], pos + 1
+            n, pos = _read_varint(buf, pos)
+            return strings[n], pos
+        if tag == DICT:
+            count, pos = _read_varint(buf, pos)
+            value = {}
+            for _ in range(count):
+                n = buf[pos]
+                if n < 0x80:
+                    pos += 1
+                else:
+                    n, pos = _read_varint(buf, pos)
+                value[strings[n]], pos = read(pos)
+            return value, pos
+        if tag == LIST:
+            count, pos = _read_varint(buf, pos)
+            value = []
+            append = value.append
+            for _ in range(count):
+                item, pos = read(pos)
+                append(item)
+            return value, pos
+        if tag == STR:
+            n, pos = _read_varint(buf, pos)
+            return bytes(buf[pos:pos + n]).decode("utf-8"), pos + n
+        if tag == INT:
+            n, pos = _read_varint(buf, pos)
+            return (n >> 1) ^ -(n & 1), pos
+        if tag == NONE:
+            return None, pos
+        if tag == TRUE:
+            return True, pos
+        if tag == FALSE:
+            return False, pos
+        if tag == FLOAT:
+            return unpack_double(buf, pos)[0], pos + DOUBLE.size
+        raise BinaryFormatError(f"unknown tag {tag} at offset {pos - 1}")
+
+    def read_iterative(pos: int) -> Tuple[Any, int]:
+        # read() with an explicit stack, for values nested too deep to recurse.
+        # Per open container: the container, items left, whether it is a dict
+        root: List[Any] = []
+        stack = [[root, 1, False]]
+        while stack:
+            frame = stack[-1]
+            if not frame[1]:
+                stack.pop()
+                continue
+            frame[1] -= 1
+            if frame[2]:
+                n, pos = _read_varint(buf, pos)
+                key = strings[n]
+            tag = buf[pos]
+            count = 0
+            if tag == DICT or tag == LIST:
+                count, pos = _read_varint(buf, pos + 1)
+                value = {} if tag == DICT else []
+            else:
+                value, pos = read(pos)
+            if frame[2]:
+                frame[0][key] = value
+            else:
+                frame[0].append(value)
+            if count:
+                stack.append([value, count, tag == DICT])
+        return root[0], pos
+
+    def read_any(pos: int) -> Tuple[Any, int]:
+        try:
+            return read(pos)
+        except RecursionError:
+            return read_iterative(pos)
+
+    return read_any
+
+
+class BinaryWriter:
+    """Writes a parse result to the binary file `fp` as CobolParser emits it.
+
+    Pass an instance as `CobolParser.parse(sink=...)` or feed it
+    `iterparse` events through `json_stream.write_events`. Records go out as
+    they arrive; only the string table and the offsets are held until
+    close(). `fp` must be positioned at the start of the file. As with
+    StreamingJsonWriter, a division or paragraph emitted twice keeps its
+    first position and its last value.
+    """
+
+    def __init__(self, fp: BinaryIO):
+        self.fp = fp
+        self._strings: Dict[str, int] = {}
+        self._divisions: Dict[str, int] = {}
+        self._data_entries: List[int] = []
+        self._paragraphs: Dict[str, int] = {}
+        self._offset = len(MAGIC)
+        self._closed = False
+        fp.write(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # No trailer after a failure, so the file does not open as a result
+        if exc_type is None:
+            self.close()
+
+    def _record(self, value: Any) -> int:
+        out = bytearray()
+        try:
+            _encode(value, out, self._strings)
+        except RecursionError:
+            out = bytearray()
+            _encode_iterative(value, out, self._strings)
+        offset = self._offset
+        self.fp.write(out)
+        self._offset += len(out)
+        return offset
+
+    def metadata(self, metadata: Dict[str, Any]):
+        self.division("metadata", metadata)
+
+    def division(self, key: str, value: Any):
+        if key == "data_division":
+            for entry in value:
+                self.data_entry(entry)
+        elif key == "procedure_division":
+            for name, statements in value.items():
+                self.paragraph(name, statements)
+        else:
+            self._divisions[key] = self._record(value)
+
+    def data_entry(self, entry: Dict[str, Any]):
+        self._data_entries.append(self._record(entry))
+
+    def paragraph(self, name: str, statements: List[Dict[str, Any]]):
+        self._paragraphs[name] = self._record(statements)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        index = {"divisions": self._divisions, "data_entries": self._data_entries, "paragraphs": self._paragraphs}
+        out = bytearray()
+        # Encode the index first so its keys are in the table
+        _encode(index, out, self._strings)
+        # Character lengths, then all strings as one UTF-8 blob
+        table = bytearray()
+        _varint(table, len(self._strings))
+        for text in self._strings:
+            _varint(table, len(text))
+        blob = "".join(self._strings).encode("utf-8")
+        _varint(table, len(blob))
+        table += blob
+        table_offset = self._offset
+        self.fp.write(table)
+        self.fp.write(out)
+        self.fp.write(TRAILER.pack(table_offset, table_offset + len(table), MAGIC))
+        self.fp.flush()
+
+
+class BinaryResult:
+    """Read access to a binary parse result held in `buf` (bytes or mmap).
+
+    The divisions, data entries and paragraphs are decoded on each access
+    and not kept, so a caller holding one paragraph holds only that.
+    """
+
+    def __init__(self, buf: Union[bytes, bytearray, memoryview, mmap.mmap], _owned: Optional[mmap.mmap] = None):
+        if len(buf) < len(MAGIC) + TRAILER.size or buf[:len(MAGIC)] != MAGIC:
+            raise BinaryFormatError("not a binary parse result")
+        table_offset, index_offset, end_magic = TRAILER.unpack_from(buf, len(buf) - TRAILER.size)
+        if end_magic != MAGIC or not len(MAGIC) <= table_offset <= index_offset <= len(buf) - TRAILER.size:
+            raise BinaryFormatError("truncated or corrupt binary parse result")
+        self._buf = buf
+        self._mmap = _owned
+        self.strings = self._read_strings(table_offset)
+        self._read = _decoder(buf, self.strings)
+        index = self._read(index_offset)[0]
+        self._divisions: Dict[str, int] = index["divisions"]
+        self._data_entries: List[int] = index["data_entries"]
+        self._paragraphs: Dict[str, int] = index["paragraphs"]
+
+    @classmethod
+    def open(cls, path: str) -> "BinaryResult":
+        """Memory-map `path`, so only the parts read are paged in."""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(mapped, _owned=mapped)
+        except BaseException:
+            mapped.close()
+            raise
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _read_strings(self, pos: int) -> List[str]:
+        buf = self._buf
+        count, pos = _read_varint(buf, pos)
+        lengths = []
+        for _ in range(count):
+            n, pos = _read_varint(buf, pos)
+            lengths.append(n)
+        size, pos = _read_varint(buf, pos)
+        blob = bytes(self._buf[pos:pos + size]).decode("utf-8")
+        strings = []
+        start = 0
+        for n in lengths:
+            strings.append(blob[start:start + n])
+            start += n
+        return strings
+
+    def _value(self, offset: int) -> Any:
+        return self._read(offset)[0]
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.division("metadata")
+
+    def division(self, key: str) -> Any:
+        """A top-level value of parsed_data, decoded in full."""
+        if key == "data_division":
+            return list(self.data_entries())
+        if key == "procedure_division":
+            return dict(self.paragraphs())
+        if key not in self._divisions:
+            raise KeyError(key)
+        return self._value(self._divisions[key])
+
+    def data_entry_count(self) -> int:
+        return len(self._data_entries)
+
+    def data_entry(self, i: int) -> Dict[str, Any]:
+        return self._value(self._data_entries[i])
+
+    def data_entries(self) -> Iterator[Dict[str, Any]]:
+        for offset in self._data_entries:
+            yield self._value(offset)
+
+    def paragraph_names(self) -> List[str]:
+        return list(self._paragraphs)
+
+    def paragraph(self, name: str) -> List[Dict[str, Any]]:
+        """The statements of one paragraph; KeyError if there is none."""
+        return self._value(self._paragraphs[name])
+
+    def paragraphs(self) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        for name, offset in self._paragraphs.items():
+            yield name, self._value(offset)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The whole result in the shape of CobolParser.parsed_data."""
+        data: Dict[str, Any] = {}
+        for key in TOP_LEVEL_KEYS:
+            if key == "data_division" or key == "procedure_division":
+                data[key] = self.division(key)
+            else:
+                data[key] = self._value(self._divisions[key]) if key in self._divisions else {}
+        for key, offset in self._divisions.items():
+            if key not in data:
+                data[key] = self._value(offset)
+        return data
+
+
+def dumps(data: Dict[str, Any]) -> bytes:
+    """Encode a whole parsed_data dict."""
+    import io
+    buf = io.BytesIO()
+    with BinaryWriter(buf) as writer:
+        for key, value in data.items():
+            writer.division(key, value)
+    return buf.getvalue()
+
+
+def loads(buf: Union[bytes, bytearray, memoryview]) -> Dict[str, Any]:
+    return BinaryResult(buf).to_dict()
+
+
+def load(path: str) -> Dict[str, Any]:
+    with BinaryResult.open(path) as result:
+        return result.to_dict()
+
+
+def is_binary_result(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
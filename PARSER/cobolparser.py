@@ -1,27 +1,422 @@
+import hashlib
+import io
 import re
 import json
 import sys
 import os
+from array import array
+from bisect import bisect_right
 from enum import Enum
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Callable
+
+from normalizer import NONBLANK, SourceBuffer, Span, clean_spans, stream_clean_spans
+from profiling import phase
+from sniff import PREFIX_BYTES, SourceSniff, classify_format, sniff_bytes
+
+# Bump whenever parse output can change, so cached results are invalidated.
+PARSER_VERSION = "5"
+
+DIVISION_KEYS = {
+    "IDENTIFICATION DIVISION": "identification_division",
+    "ENVIRONMENT DIVISION": "environment_division",
+    "DATA DIVISION": "data_division",
+    "PROCEDURE DIVISION": "procedure_division",
+}
+
+DIVISION_PATTERN = re.compile(r'^\s*(IDENTIFICATION|ENVIRONMENT|DATA|PROCEDURE)\s+DIVISION\s*\.?', re.IGNORECASE)
+SECTION_PATTERN = re.compile(r'^\s*([\w-]+)\s+SECTION\s*\.?', re.IGNORECASE)
+
+# (event, name, data) as yielded by CobolParser.iterparse
+Event = Tuple[str, Optional[str], Any]
+# PROCEDURE DIVISION lines tokenized and parsed together when streaming
+PROCEDURE_WINDOW = 2000
 
 class SourceFormat(Enum):
     FIXED = "FIXED"
     FREE = "FREE"
 
+# Data description entries are scanned token by token: literals (with
+# doubled quotes), words (a period inside a word, as in PIC 9(3).99, is kept)
+# and the separator period. Entries without literals take a split() fast path.
+DATA_TOKEN_PATTERN = re.compile(r"""'(?:[^']|'')*'?|"(?:[^"]|"")*"?|(?:[^\s.'"]|\.(?=[^\s.]))+|\.""")
+SEPARATOR_PERIOD = re.compile(r'\.+(?=\s|$)')
+USAGE_WORDS = frozenset((
+    "COMP", "COMP-1", "COMP-2", "COMP-3", "COMP-4", "COMP-5",
+    "COMPUTATIONAL", "COMPUTATIONAL-1", "COMPUTATIONAL-2", "COMPUTATIONAL-3", "COMPUTATIONAL-4",
+    "COMPUTATIONAL-5", "BINARY", "DISPLAY", "PACKED-DECIMAL", "INDEX", "POINTER",
+))
+# Words that start a clause, and so end the operands of the previous one
+DATA_CLAUSE_WORDS = USAGE_WORDS | frozenset((
+    "PIC", "PICTURE", "USAGE", "VALUE", "VALUES", "OCCURS", "REDEFINES", "SIGN", "LEADING", "TRAILING",
+    "JUSTIFIED", "JUST", "BLANK", "SYNC", "SYNCHRONIZED", "EXTERNAL", "GLOBAL", "RENAMES",
+))
+OCCURS_CLAUSE_WORDS = frozenset(("DEPENDING", "ASCENDING", "DESCENDING", "INDEXED", "KEY"))
+CONDITION_LEVEL = "88"
+
+
+def scan_data_entry(text: str) -> Optional[Dict[str, Any]]:
+    """Recognize one data description entry in a single pass over its tokens.
+
+    Returns None unless `text` starts with a level number. `occurs`,
+    `depending_on`, `redefines`, `sign`, `justified` and (for level 88)
+    `values` are only present when the entry has those clauses.
+    """
+    if "'" in text or '"' in text:
+        words = []
+        for word in DATA_TOKEN_PATTERN.findall(text):
+            if word == ".":
+                break
+            words.append(word)
+        upper = [w.upper() for w in words]
+    else:
+        text = text.rstrip().rstrip('.')
+        if '.' in text:
+            period = SEPARATOR_PERIOD.search(text)
+            if period:
+                text = text[:period.start()]
+        words = text.split()
+        upper = text.upper().split()
+    if not words:
+        return None
+    level = words[0]
+    if not level.isdigit():
+        return None
+
+    entry: Dict[str, Any] = {
+        "level": level,
+        "name": "",
+        "picture": None,
+        "usage": None,
+        "value": None
+    }
+    n = len(words)
+    i = 1
+    if n > 1:
+        if upper[1] in DATA_CLAUSE_WORDS:
+            # Unnamed item, e.g. "05 PIC X(4)."
+            entry["name"] = "FILLER"
+        else:
+            entry["name"] = words[1]
+            i = 2
+
+    while i < n:
+        word = upper[i]
+        i += 1
+        if word in ("PIC", "PICTURE"):
+            if i < n and upper[i] == "IS":
+                i += 1
+            if i < n:
+                entry["picture"] = words[i].rstrip(",")
+                i += 1
+        elif word in ("VALUE", "VALUES"):
+            if i < n and upper[i] in ("IS", "ARE"):
+                i += 1
+            first = i
+            while i < n and upper[i] not in DATA_CLAUSE_WORDS:
+                i += 1
+            if i > first:
+                entry["value"] = " ".join(words[first:i])
+                if level == CONDITION_LEVEL:
+                    entry["values"] = _condition_values(words[first:i], upper[first:i])
+        elif word == "USAGE":
+            if i < n and upper[i] == "IS":
+                i += 1
+            if i < n:
+                entry["usage"] = words[i]
+                i += 1
+        elif word in USAGE_WORDS:
+            entry["usage"] = words[i - 1]
+        elif word == "OCCURS":
+            counts = []
+            while i < n and upper[i] not in DATA_CLAUSE_WORDS and upper[i] not in OCCURS_CLAUSE_WORDS:
+                if words[i].isdigit():
+                    counts.append(int(words[i]))
+                i += 1
+            if counts:
+                entry["occurs"] = counts[-1]
+            while i < n and upper[i] in OCCURS_CLAUSE_WORDS:
+                sub = upper[i]
+                i += 1
+                while i < n and upper[i] in ("ON", "KEY", "IS", "BY"):
+                    i += 1
+                if sub == "DEPENDING" and i < n:
+                    entry["depending_on"] = words[i]
+                while i < n and upper[i] not in DATA_CLAUSE_WORDS and upper[i] not in OCCURS_CLAUSE_WORDS:
+                    i += 1
+        elif word == "REDEFINES":
+            if i < n:
+                entry["redefines"] = words[i]
+                i += 1
+        elif word in ("SIGN", "LEADING", "TRAILING"):
+            if word == "SIGN":
+                if i < n and upper[i] == "IS":
+                    i += 1
+                word = upper[i] if i < n and upper[i] in ("LEADING", "TRAILING") else "TRAILING"
+                if i < n and upper[i] == word:
+                    i += 1
+            sign = word
+            if i < n and upper[i] == "SEPARATE":
+                sign += " SEPARATE"
+                i += 1
+                if i < n and upper[i] == "CHARACTER":
+                    i += 1
+            entry["sign"] = sign
+        elif word in ("JUSTIFIED", "JUST"):
+            entry["justified"] = True
+            if i < n and upper[i] == "RIGHT":
+                i += 1
+
+    return entry
+
+
+def _condition_values(words: List[str], upper: List[str]) -> List[str]:
+    """Level-88 values, with `a THRU b` ranges kept together."""
+    # Commas between values are separators, not part of them
+    words = [w if w[0] in "'\"" else w.rstrip(",") for w in words]
+    values: List[str] = []
+    i = 0
+    while i < len(words):
+        if upper[i] in ("THRU", "THROUGH") and values and i + 1 < len(words):
+            values[-1] = f"{values[-1]} THRU {words[i + 1]}"
+            i += 2
+            continue
+        if words[i]:
+            values.append(words[i])
+        i += 1
+    return values
+
+# Token type codes produced by the lexer
+T_KEYWORD = 1
+T_IDENTIFIER = 2
+T_NUMBER = 3
+T_STRING = 4
+T_PERIOD = 5
+T_OPERATOR = 6
+
+TOKEN_TYPE_NAMES = {
+    T_KEYWORD: "KEYWORD",
+    T_IDENTIFIER: "IDENTIFIER",
+    T_NUMBER: "NUMBER",
+    T_STRING: "STRING",
+    T_PERIOD: "PERIOD",
+    T_OPERATOR: "OPERATOR",
+}
+
+# Reserved words the procedure parser cares about. Each one is interned to a
+# small integer so the parser compares ints instead of upper-cased strings.
+KEYWORDS = (
+    ".", "IF", "THEN", "ELSE", "END-IF", "EVALUATE", "WHEN", "END-EVALUATE",
+    "PERFORM", "END-PERFORM", "VARYING", "UNTIL", "TIMES", "WITH", "TEST",
+    "CALL", "END-CALL", "ON", "EXCEPTION", "MOVE", "GO", "TO", "DISPLAY",
+    "ADD", "SUBTRACT", "COMPUTE", "SET", "NEXT", "CONTINUE", "RETURN", "OPEN",
+    "CLOSE", "READ", "WRITE", "REWRITE", "DELETE", "START", "STOP", "EXIT",
+    "GOBACK", "RUN", "END-READ", "END-STRING", "END-UNSTRING",
+)
+KEYWORD_IDS = {name: idx for idx, name in enumerate(KEYWORDS, 1)}
+
+KW_PERIOD = KEYWORD_IDS["."]
+KW_IF = KEYWORD_IDS["IF"]
+KW_THEN = KEYWORD_IDS["THEN"]
+KW_ELSE = KEYWORD_IDS["ELSE"]
+KW_END_IF = KEYWORD_IDS["END-IF"]
+KW_EVALUATE = KEYWORD_IDS["EVALUATE"]
+KW_WHEN = KEYWORD_IDS["WHEN"]
+KW_END_EVALUATE = KEYWORD_IDS["END-EVALUATE"]
+KW_PERFORM = KEYWORD_IDS["PERFORM"]
+KW_END_PERFORM = KEYWORD_IDS["END-PERFORM"]
+KW_CALL = KEYWORD_IDS["CALL"]
+KW_END_CALL = KEYWORD_IDS["END-CALL"]
+KW_MOVE = KEYWORD_IDS["MOVE"]
+KW_GO = KEYWORD_IDS["GO"]
+KW_TO = KEYWORD_IDS["TO"]
+
+
+def _kw_set(*names: str) -> frozenset:
+    return frozenset(KEYWORD_IDS[n] for n in names)
+
+
+PARAGRAPH_RESERVED = _kw_set(
+    "EXIT", "GOBACK", "STOP", "RUN", "END-IF", "END-PERFORM", "END-EVALUATE",
+    "END-READ", "END-CALL", "END-STRING", "END-UNSTRING", "ELSE"
+)
+STATEMENT_TERMINATORS = _kw_set("END-IF", "END-EVALUATE", "END-PERFORM", "ELSE", "WHEN")
+COMPOUND_VERBS = _kw_set("IF", "EVALUATE", "PERFORM")
+IF_CONDITION_STOP = _kw_set(
+    "MOVE", "DISPLAY", "PERFORM", "IF", "GO", "CALL", "ADD", "SUBTRACT",
+    "COMPUTE", "SET", "EVALUATE", "NEXT"
+)
+WHEN_CONDITION_STOP = _kw_set(
+    "MOVE", "DISPLAY", "PERFORM", "IF", "GO", "CALL", "ADD", "SUBTRACT", "SET",
+    "CONTINUE", "WHEN", "END-EVALUATE", "."
+)
+PERFORM_NON_PROCEDURE = _kw_set("END-PERFORM", ".", "VARYING", "UNTIL", "TIMES", "WITH", "TEST")
+PERFORM_BODY_VERBS = _kw_set(
+    "MOVE", "IF", "DISPLAY", "CALL", "SET", "ADD", "SUBTRACT", "GO", "EVALUATE",
+    "CONTINUE", "STOP", "EXIT", "READ", "WRITE"
+)
+CALL_ARGUMENT_STOP = _kw_set(".", "END-CALL", "ON", "EXCEPTION")
+MOVE_STOP = _kw_set(".", "MOVE", "IF", "PERFORM", "CALL")
+GENERIC_STOP = _kw_set(
+    ".", "ELSE", "END-IF", "WHEN", "END-EVALUATE", "END-PERFORM", "END-CALL",
+    "MOVE", "DISPLAY", "PERFORM", "IF", "GO", "CALL", "ADD", "SUBTRACT",
+    "COMPUTE", "SET", "EVALUATE", "CONTINUE", "RETURN", "OPEN", "CLOSE", "READ",
+    "WRITE", "REWRITE", "DELETE", "START", "STOP", "EXIT"
+)
+IF_THEN_TERMINATORS = _kw_set("ELSE", "END-IF", ".")
+IF_ELSE_TERMINATORS = _kw_set("END-IF", ".")
+WHEN_TERMINATORS = _kw_set("WHEN", "END-EVALUATE", ".")
+PERFORM_TERMINATORS = _kw_set("END-PERFORM", ".")
+
+# Quoted literal, COBOL word, or any other single non-blank character.
+TOKEN_PATTERN = re.compile(r"""'[^']*'|"[^"]*"|[\w-]+|[^\s]""")
+
+
 class Token:
-    def __init__(self, type_: str, value: str, line_num: int):
-        self.type = type_
-        self.value = value
-        self.line_num = line_num
-    
+    """Lightweight view of one token in a TokenStore."""
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "TokenStore", index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def type(self) -> int:
+        return self.store.types[self.index]
+
+    @property
+    def kw(self) -> int:
+        return self.store.kws[self.index]
+
+    @property
+    def line_num(self) -> int:
+        return self.store.line_nums[self.index]
+
+    @property
+    def value(self) -> str:
+        return self.store.value(self.index)
+
     def __repr__(self):
-        return f"Token({self.type}, '{self.value}')"
+        return f"Token({TOKEN_TYPE_NAMES[self.type]}, '{self.value}')"
+
+
+class TokenStore:
+    """Columnar token storage.
+
+    Tokens live in parallel arrays (type code, keyword id, line number, and
+    offset/length into `source`) instead of one Python object per token.
+    """
+    __slots__ = ("source", "types", "kws", "line_nums", "offsets", "lengths")
+
+    def __init__(self, source: str = ""):
+        self.source = source
+        self.types = array("B")
+        self.kws = array("B")
+        self.line_nums = array("I")
+        self.offsets = array("I")
+        self.lengths = array("I")
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> Token:
+        if index < 0:
+            index += len(self.types)
+        if not 0 <= index < len(self.types):
+            raise IndexError("token index out of range")
+        return Token(self, index)
+
+    def value(self, index: int) -> str:
+        offset = self.offsets[index]
+        return self.source[offset:offset + self.lengths[index]]
+
+    def nbytes(self) -> int:
+        """Bytes held by the token arrays (excluding the shared source text)."""
+        return sum(a.itemsize * len(a) for a in (self.types, self.kws, self.line_nums, self.offsets, self.lengths))
+
+
+class Lexer:
+    """Single-pass tokenizer for PROCEDURE DIVISION text.
+
+    Every distinct lexeme is classified once and memoized, so repeated
+    identifiers and keywords cost one dict lookup.
+    """
+
+    def __init__(self):
+        self._classified: Dict[str, Tuple[int, int]] = {}
+
+    def classify(self, value: str) -> Tuple[int, int]:
+        entry = self._classified.get(value)
+        if entry is None:
+            first = value[0]
+            if first == "'" or first == '"':
+                entry = (T_STRING, 0)
+            elif value == ".":
+                entry = (T_PERIOD, KW_PERIOD)
+            elif first.isalnum() or first == "_" or first == "-":
+                kw = KEYWORD_IDS.get(value.upper(), 0)
+                if kw:
+                    entry = (T_KEYWORD, kw)
+                elif value.isdigit():
+                    entry = (T_NUMBER, 0)
+                else:
+                    entry = (T_IDENTIFIER, 0)
+            else:
+                entry = (T_OPERATOR, 0)
+            self._classified[value] = entry
+        return entry
+
+    def tokenize(self, lines: List[Tuple[int, str]]) -> TokenStore:
+        store = TokenStore("\n".join(text for _, text in lines))
+        source = store.source
+        finditer = TOKEN_PATTERN.finditer
+        classified = self._classified
+        classify = self.classify
+        add_type = store.types.append
+        add_kw = store.kws.append
+        add_line = store.line_nums.append
+        add_offset = store.offsets.append
+        add_length = store.lengths.append
+        pos = 0
+        for line_num, text in lines:
+            end = pos + len(text)
+            for m in finditer(source, pos, end):
+                value = m.group()
+                type_, kw = classified.get(value) or classify(value)
+                add_type(type_)
+                add_kw(kw)
+                add_line(line_num)
+                add_offset(m.start())
+                add_length(len(value))
+            pos = end + 1
+        return store
+
 
 class CobolParser:
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: str, source: Optional[bytes] = None, cache=None, copybooks=None,
+                 profile=None, encoding: Optional[str] = None):
+        """`source` supplies the file contents directly (e.g. an upload), in
+        which case `filepath` only names the program. `cache` is an optional
+        parse_cache.ParseCache consulted before parsing. `copybooks` is an
+        optional copybook.CopybookLibrary used to expand COPY statements.
+        `profile` is an optional profiling.ParseProfile filled in by parse()
+        and iterparse(). `encoding` overrides the sniffed codepage."""
         self.filepath = filepath
-        self.raw_lines: List[str] = []
+        self.source = source
+        self.encoding = encoding
+        self.sniffed: Optional[SourceSniff] = None
+        # The whole file, when sniffing read all of it
+        self._small_source: Optional[bytes] = None
+        self.cache = cache
+        self.cache_hit = False
+        self.copybooks = copybooks
+        self.profile = profile
+        # With copybooks, parallel to the cleaned lines the division loop
+        # saw: None, or the (copybook, path, line) a line was copied from
+        self.line_origins: List[Optional[Tuple[str, str, int]]] = []
+        self.buffer: Optional[SourceBuffer] = None
+        self._raw_lines: Optional[List[str]] = None
+        # (division, line number) for every division header, in source order
+        self.division_starts: List[Tuple[str, int]] = []
         self.source_format: SourceFormat = SourceFormat.FIXED
         self.parsed_data: Dict[str, Any] = {
             "metadata": {
@@ -34,122 +429,423 @@ class CobolParser:
             "procedure_division": {} 
         }
 
+    def read_source(self) -> bytes:
+        if self.source is None:
+            try:
+                with open(self.filepath, 'rb') as f:
+                    self.source = f.read()
+            except FileNotFoundError:
+                print(f"Error: File not found: {self.filepath}")
+                sys.exit(1)
+        return self.source
+
+    def sniff(self) -> SourceSniff:
+        """Codepage, line endings and format from the first PREFIX_BYTES of
+        the source; no more of it is read or decoded."""
+        if self.sniffed is None:
+            data = self.source
+            if data is None:
+                try:
+                    with open(self.filepath, 'rb') as f:
+                        data = f.read(PREFIX_BYTES + 1)
+                except FileNotFoundError:
+                    print(f"Error: File not found: {self.filepath}")
+                    sys.exit(1)
+                if len(data) <= PREFIX_BYTES:
+                    self._small_source = data
+            self.sniffed = sniff_bytes(data[:PREFIX_BYTES], len(data) <= PREFIX_BYTES, self.encoding)
+            if self.sniffed.encoding != "utf-8":
+                self.parsed_data["metadata"]["encoding"] = self.sniffed.encoding
+        return self.sniffed
+
     def load_file(self):
-        try:
-            with open(self.filepath, 'r', encoding='utf-8', errors='replace') as f:
-                self.raw_lines = f.readlines()
-        except FileNotFoundError:
-            print(f"Error: File not found: {self.filepath}")
-            sys.exit(1)
+        sniffed = self.sniff()
+        data = self.source if self.source is not None else self._small_source
+        if data is not None:
+            self.buffer = SourceBuffer.from_bytes(data, decode=sniffed.decode)
+        else:
+            try:
+                self.buffer = SourceBuffer.from_path(self.filepath, decode=sniffed.decode)
+            except FileNotFoundError:
+                print(f"Error: File not found: {self.filepath}")
+                sys.exit(1)
+        self._raw_lines = None
+
+    @property
+    def raw_lines(self) -> List[str]:
+        """Source lines with their newlines, built on first use."""
+        if self._raw_lines is None:
+            self._raw_lines = self.buffer.lines() if self.buffer is not None else []
+        return self._raw_lines
 
     def detect_format(self):
-        check_lines = [l for l in self.raw_lines if l.strip()][:20]
-        if not check_lines:
+        # Sniffing usually settled it from the first block of the source
+        source_format = self.sniffed.source_format if self.sniffed is not None else None
+        if source_format is None:
+            check_lines = []
+            text = self.buffer.text
+            for _, start, end in self.buffer.line_spans():
+                if NONBLANK.search(text, start, end):
+                    # With its newline, as classify_format expects
+                    check_lines.append(text[start:end + 1])
+                    if len(check_lines) == 20:
+                        break
+            source_format = classify_format(check_lines)
+        if not source_format:
             self.source_format = SourceFormat.FIXED
             return
+        self.source_format = SourceFormat(source_format)
+        self.parsed_data["metadata"]["format"] = self.source_format.value
 
-        fixed_indicators = 0
-        total_checked = 0
+    def clean_spans(self, start: int = 0, end: Optional[int] = None) -> Iterator[Span]:
+        """Lazily yield (line_num, buffer, start, end) for the cleaned content
+        of lines[start:end]; see normalizer.clean_spans."""
+        return clean_spans(self.buffer, self.source_format == SourceFormat.FIXED, start, end)
 
-        for line in check_lines:
-            if len(line) > 6:
-                seq_area = line[0:6]
-                indicator = line[6]
-                if indicator in ['*', '/', '-', ' ', 'D']:
-                    if seq_area.isdigit() or seq_area.strip() == "":
-                        fixed_indicators += 1
-            total_checked += 1
+    def iter_clean_lines(self, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        for line_num, text, s, e in self.clean_spans(start, end):
+            yield line_num, text[s:e]
 
-        if total_checked > 0 and (fixed_indicators / total_checked) >= 0.8:
-            self.source_format = SourceFormat.FIXED
-        else:
-            self.source_format = SourceFormat.FREE
-        
-        self.parsed_data["metadata"]["format"] = self.source_format.value
+    def clean_lines(self, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, str]]:
+        """Strip comments and margins from lines[start:end]."""
+        return list(self.iter_clean_lines(start, end))
 
-    def clean_lines(self) -> List[Tuple[int, str]]:
-        cleaned = []
-        for idx, line in enumerate(self.raw_lines):
-            line_num = idx + 1
-            line_val = line.rstrip('\n')
-            
-            if self.source_format == SourceFormat.FIXED:
-                if len(line_val) < 7: continue
-                indicator = line_val[6]
-                if indicator in ['*', '/']: continue 
-                content = line_val[7:72]
-                if content.strip() == "": continue
-                cleaned.append((line_num, content))
-                
+    def _parse_data_entry(self, line: str) -> Optional[Dict[str, Any]]:
+        return scan_data_entry(line)
+
+    def _data_entry_events(self, pending: Tuple[int, str], section: Optional[str]) -> Iterator[Event]:
+        index, text = pending
+        entry = self._parse_data_entry(text)
+        if not entry:
+            return
+        entry["section"] = section
+        origin = self.line_origins[index] if self.line_origins else None
+        if origin is not None:
+            entry["copybook"] = {"name": origin[0], "file": origin[1], "line": origin[2]}
+        yield "data_entry", entry["name"], entry
+
+    def parse(self, sink=None):
+        """Parse the file into `parsed_data`.
+
+        If `sink` is given (see json_stream), results are handed to it as
+        they complete: metadata, each IDENTIFICATION/ENVIRONMENT division when
+        it ends, each data entry, and each paragraph. Data entries and
+        paragraphs are then not retained in `parsed_data`.
+
+        With a cache, a hit replaces `parsed_data` with the stored result and
+        skips parsing entirely; results are always retained so they can be
+        stored, and are replayed into `sink` afterwards.
+        """
+        if self.profile is None:
+            return self._parse_or_load(sink)
+        self.profile.start()
+        try:
+            self._parse_or_load(sink)
+        finally:
+            self.profile.stop()
+
+    def _parse_or_load(self, sink=None):
+        profile = self.profile
+        if self.cache is not None:
+            with phase(profile, "cache_lookup"):
+                key = self.cache_key()
+                cached = self.cache.get(key)
+                hit = cached is not None and self._copybooks_unchanged(cached)
+            if profile is not None:
+                profile.cache_hit = hit
+            if hit:
+                cached["metadata"]["file"] = self.parsed_data["metadata"]["file"]
+                self.parsed_data = cached
+                self.cache_hit = True
+                if profile is not None:
+                    profile.count("data_entries", len(cached["data_division"]))
+                    for statements in cached["procedure_division"].values():
+                        profile.paragraph(statements)
             else:
-                if "*>" in line_val:
-                    content = line_val.split("*>")[0]
+                self._parse()
+                entry = self.parsed_data
+                if self.copybooks is not None:
+                    entry = dict(entry, copybook_digest=self._copybook_digest(entry["metadata"]["copybooks"]))
+                self.cache.put(key, entry)
+            if sink is not None:
+                self.replay(sink)
+            return
+        self._parse(sink)
+
+    def cache_key(self) -> str:
+        """Cache key for this source. With COPY expansion the copybook search
+        path is part of the key; copybook contents are checked on each hit."""
+        version = PARSER_VERSION
+        if self.encoding is not None:
+            version += "\0encoding=" + self.encoding
+        if self.copybooks is not None:
+            version += "\0" + os.pathsep.join(self.copybooks.search_paths)
+        return self.cache.key(self.read_source(), version)
+
+    @staticmethod
+    def _copybook_digest(resolved: Dict[str, Optional[str]]) -> Optional[str]:
+        digest = hashlib.sha256()
+        for name in sorted(resolved):
+            path = resolved[name]
+            digest.update(f"{name}\0{path}\0".encode("utf-8"))
+            if path is not None:
+                try:
+                    with open(path, "rb") as f:
+                        digest.update(f.read())
+                except OSError:
+                    return None
+        return digest.hexdigest()
+
+    def _copybooks_unchanged(self, cached: Dict[str, Any]) -> bool:
+        """Whether the copybooks a cached result was expanded from are still
+        the same files with the same contents."""
+        stored = cached.pop("copybook_digest", None)
+        if self.copybooks is None:
+            return True
+        resolved = cached["metadata"].get("copybooks", {})
+        # A copybook that was missing may have appeared since
+        if any(path is None and self.copybooks.resolve(name) for name, path in resolved.items()):
+            return False
+        return stored is not None and stored == self._copybook_digest(resolved)
+
+    def replay(self, sink):
+        """Feed an already built `parsed_data` to a sink in parse order."""
+        data = self.parsed_data
+        sink.metadata(data["metadata"])
+        sink.division("identification_division", data["identification_division"])
+        sink.division("environment_division", data["environment_division"])
+        for entry in data["data_division"]:
+            sink.data_entry(entry)
+        for name, statements in data["procedure_division"].items():
+            sink.paragraph(name, statements)
+
+    def iterparse(self, window: int = PROCEDURE_WINDOW) -> Iterator[Event]:
+        """Parse as a stream of (event, name, data) tuples, in bounded memory.
+
+        Events are ("metadata", None, metadata), ("division", key, value)
+        when the IDENTIFICATION or ENVIRONMENT division ends, ("data_entry",
+        name, entry) and ("paragraph", name, statements), each yielded as soon
+        as it is complete. The source is read a block at a time and the
+        PROCEDURE DIVISION is tokenized and parsed `window` lines at a time,
+        so memory follows the largest paragraph rather than the program.
+        Data entries and paragraphs are not kept in `parsed_data`, and the
+        cache is not consulted. The paragraphs equal those `parse(sink=...)`
+        emits. A profile gets the data entry, paragraph and statement counts
+        and the wall time of the whole stream; the phases interleave, so
+        there are no per-phase times or line and token counts.
+        """
+        if self.profile is None:
+            return self._iterparse(window)
+        return self._profiled_events(self._iterparse(window))
+
+    def _profiled_events(self, events: Iterator[Event]) -> Iterator[Event]:
+        profile = self.profile
+        profile.start()
+        try:
+            for event in events:
+                if event[0] == "paragraph":
+                    profile.paragraph(event[2])
+                elif event[0] == "data_entry":
+                    profile.count("data_entries")
+                yield event
+        finally:
+            profile.stop()
+
+    def _iterparse(self, window: int) -> Iterator[Event]:
+        if self.copybooks is not None:
+            # COPY expansion needs the whole cleaned program
+            self.load_file()
+            self.detect_format()
+            lines = self._cleaned_lines()
+            yield "metadata", None, self.parsed_data["metadata"]
+            yield from self._stream_events(lines, window)
+            return
+
+        sniffed = self.sniff()
+        data = self.source if self.source is not None else self._small_source
+        if data is not None:
+            raw = io.BytesIO(data)
+        else:
+            try:
+                raw = open(self.filepath, "rb")
+            except FileNotFoundError:
+                print(f"Error: File not found: {self.filepath}")
+                sys.exit(1)
+        with sniffed.open_text(raw) as fp:
+            head = self._read_head(fp) if sniffed.source_format is None else ""
+            self.buffer = SourceBuffer(head)
+            self.detect_format()
+            self.buffer = None
+            fixed = self.source_format == SourceFormat.FIXED
+            lines = ((line_num, text[s:e]) for line_num, text, s, e in stream_clean_spans(fp, fixed, head))
+            self.line_origins = []
+            yield "metadata", None, self.parsed_data["metadata"]
+            yield from self._stream_events(lines, window)
+
+    @staticmethod
+    def _read_head(fp) -> str:
+        """Read from `fp` until the text holds enough nonblank lines for
+        detect_format, or the stream ends."""
+        head = ""
+        while True:
+            more = fp.read(65536)
+            head += more
+            if not more:
+                return head
+            complete = head[:head.rfind("\n") + 1].split("\n")
+            if sum(1 for line in complete if line.strip()) >= 20:
+                return head
+
+    def _stream_events(self, lines: Iterator[Tuple[int, str]], window: int) -> Iterator[Event]:
+        procedure_lines: List[Tuple[int, str]] = []
+        limit = window
+        first = True
+        for event in self._scan_divisions(lines):
+            if event[0] != "line":
+                yield event
+                continue
+            procedure_lines.append(event[2])
+            if len(procedure_lines) >= limit:
+                events, carry = self._paragraph_events(procedure_lines, first, final=False)
+                if len(carry) < len(procedure_lines):
+                    first = False
+                    limit = window
                 else:
-                    content = line_val
-                if content.strip() == "": continue
-                cleaned.append((line_num, content))
-        
-        return cleaned
+                    # No paragraph boundary yet; wait for a bigger window
+                    limit *= 2
+                procedure_lines = carry
+                yield from events
+        if procedure_lines:
+            events, _ = self._paragraph_events(procedure_lines, first, final=True)
+            yield from events
 
-    def _parse_data_entry(self, line: str) -> Optional[Dict[str, Any]]:
-        clean = line.rstrip('.')
-        parts = clean.split()
-        if not parts: return None
-        level = parts[0]
-        if not level.isdigit(): return None
-        
-        entry = {
-            "level": level,
-            "name": "",
-            "picture": None,
-            "usage": None,
-            "value": None
-        }
-        
-        if len(parts) > 1:
-            entry["name"] = parts[1]
-        
-        rest_of_line = " ".join(parts[2:])
-        pic_match = re.search(r'\b(PIC|PICTURE)\s+(IS\s+)?([A-Z0-9\(\)V9S]+)', rest_of_line, re.IGNORECASE)
-        if pic_match:
-            entry["picture"] = pic_match.group(3)
-        val_match = re.search(r'\bVALUE\s+(IS\s+)?(.+)', rest_of_line, re.IGNORECASE)
-        if val_match:
-            raw_val = val_match.group(2)
-            entry["value"] = raw_val.strip()
-        usage_match = re.search(r'\b(COMP|COMP-3|BINARY|DISPLAY|PACKED-DECIMAL)\b', rest_of_line, re.IGNORECASE)
-        if usage_match:
-            entry["usage"] = usage_match.group(1)
+    @staticmethod
+    def _paragraph_events(lines: List[Tuple[int, str]], first: bool, final: bool
+                          ) -> Tuple[List[Event], List[Tuple[int, str]]]:
+        """Parse a window of PROCEDURE DIVISION lines.
 
-        return entry
+        Returns the events for its complete paragraphs and the lines to carry
+        into the next window. A paragraph is complete once the parser reaches
+        the header of a later paragraph at the top level; the window is cut
+        at the last such header that starts its line. The parser looks at
+        most one token ahead, so nothing before that header depends on the
+        lines after the window. Unless `first`, the window opens with a
+        header and its empty _ROOT_ paragraph is dropped.
+        """
+        collected: List[Tuple[str, List[Dict[str, Any]]]] = []
+        proc_parser = ProcedureParser(lines)
+        try:
+            proc_parser.parse(on_paragraph=lambda name, stmts: collected.append((name, stmts)))
+        except IndexError:
+            # A statement ran off the end of the window
+            if final:
+                raise
+        skip = 0 if first else 1
+        if final:
+            return [("paragraph", name, stmts) for name, stmts in collected[skip:]], []
 
-    def parse(self):
-        self.load_file()
-        self.detect_format()
-        lines = self.clean_lines()
-        
+        tokens = proc_parser.tokens
+        # Offset in the token source where each line starts
+        line_offsets = []
+        pos = 0
+        for _, text in lines:
+            line_offsets.append(pos)
+            pos += len(text) + 1
+        starts = proc_parser.paragraph_starts
+        cut = len(starts) - 1
+        while cut > 0 and starts[cut] > 0:
+            tok = starts[cut]
+            line = bisect_right(line_offsets, tokens.offsets[tok]) - 1
+            if bisect_right(line_offsets, tokens.offsets[tok - 1]) - 1 != line:
+                break
+            cut -= 1
+        else:
+            return [], lines
+        events = [("paragraph", name, stmts) for name, stmts in collected[skip:cut]]
+        return events, lines[line:]
+
+    def _cleaned_lines(self) -> Iterator[Tuple[int, str]]:
+        if self.copybooks is not None:
+            resolved: Dict[str, Optional[str]] = {}
+            lines, self.line_origins = self.copybooks.expand(self.clean_lines(), resolved)
+            self.parsed_data["metadata"]["copybooks"] = resolved
+            return iter(lines)
+        self.line_origins = []
+        return self.iter_clean_lines()
+
+    def _parse(self, sink=None):
+        profile = self.profile
+        with phase(profile, "read"):
+            self.load_file()
+        with phase(profile, "detect_format"):
+            self.detect_format()
+        with phase(profile, "clean_lines"):
+            lines = self._cleaned_lines()
+            if profile is not None:
+                # Clean everything up front so the division loop is timed alone
+                lines = list(lines)
+                profile.count("lines", len(lines))
+        if sink is not None:
+            sink.metadata(self.parsed_data["metadata"])
+
+        procedure_lines = []
+        data_entries = self.parsed_data["data_division"]
+        entry_count = 0
+        with phase(profile, "divisions"):
+            for event, name, data in self._scan_divisions(lines):
+                if event == "line":
+                    procedure_lines.append(data)
+                elif event == "data_entry":
+                    entry_count += 1
+                    if sink is None:
+                        data_entries.append(data)
+                    else:
+                        sink.data_entry(data)
+                elif sink is not None:
+                    sink.division(name, data)
+        if profile is not None:
+            profile.count("data_entries", entry_count)
+
+        if procedure_lines:
+            self._parse_procedure(procedure_lines, sink)
+
+    def _scan_divisions(self, lines: Iterator[Tuple[int, str]]) -> Iterator[Event]:
+        """Walk the cleaned lines through the divisions.
+
+        Fills the IDENTIFICATION and ENVIRONMENT divisions of `parsed_data`
+        and yields ("division", key, value) when one of them ends,
+        ("data_entry", name, entry) for each data entry, and ("line", None,
+        (line_num, text)) for each PROCEDURE DIVISION line.
+        """
         current_division = None
         current_section = None
+        # Data entry still being read: (index of its first line, text so far)
+        pending_entry: Optional[Tuple[int, str]] = None
         
-        procedure_lines = []
-        
-        div_pattern = re.compile(r'^\s*(IDENTIFICATION|ENVIRONMENT|DATA|PROCEDURE)\s+DIVISION\s*\.?', re.IGNORECASE)
-        sec_pattern = re.compile(r'^\s*([\w-]+)\s+SECTION\s*\.?', re.IGNORECASE)
-
-        for line_num, line_content in lines:
+        for index, (line_num, line_content) in enumerate(lines):
             line_stripped = line_content.strip()
 
-            div_match = div_pattern.match(line_stripped)
+            div_match = DIVISION_PATTERN.match(line_stripped)
             if div_match:
+                if pending_entry is not None:
+                    yield from self._data_entry_events(pending_entry, current_section)
+                    pending_entry = None
+                key = DIVISION_KEYS.get(current_division)
+                if key in ("identification_division", "environment_division"):
+                    yield "division", key, self.parsed_data[key]
                 current_division = div_match.group(1).upper() + " DIVISION"
+                self.division_starts.append((current_division, line_num))
                 current_section = None
                 continue
 
-            sec_match = sec_pattern.match(line_stripped)
+            sec_match = SECTION_PATTERN.match(line_stripped)
             if sec_match:
+                if pending_entry is not None:
+                    yield from self._data_entry_events(pending_entry, current_section)
+                    pending_entry = None
                 current_section = sec_match.group(1).upper()
                 if current_division == "PROCEDURE DIVISION":
-                     procedure_lines.append((line_num, line_content))
+                     yield "line", None, (line_num, line_content)
                 continue
             
             if current_division == "IDENTIFICATION DIVISION":
@@ -168,212 +864,249 @@ class CobolParser:
             
             elif current_division == "DATA DIVISION":
                 if "SECTION" in line_stripped and sec_match: continue
-                entry = self._parse_data_entry(line_stripped)
-                if entry:
-                    entry["section"] = current_section
-                    self.parsed_data["data_division"].append(entry)
+                if pending_entry is not None:
+                    # An entry continues on the next line until its period,
+                    # unless that line starts a new entry with a level number
+                    if not pending_entry[1].endswith('.') and not line_stripped.split(None, 1)[0].isdigit():
+                        pending_entry = (pending_entry[0], pending_entry[1] + " " + line_stripped)
+                        continue
+                    yield from self._data_entry_events(pending_entry, current_section)
+                pending_entry = (index, line_stripped)
 
             elif current_division == "PROCEDURE DIVISION":
-                procedure_lines.append((line_num, line_content))
+                yield "line", None, (line_num, line_content)
 
-        if procedure_lines:
-            proc_parser = ProcedureParser(procedure_lines)
+        if pending_entry is not None:
+            yield from self._data_entry_events(pending_entry, current_section)
+        key = DIVISION_KEYS.get(current_division)
+        if key in ("identification_division", "environment_division"):
+            yield "division", key, self.parsed_data[key]
+
+    def _parse_procedure(self, procedure_lines: List[Tuple[int, str]], sink=None):
+        profile = self.profile
+        proc_parser = ProcedureParser(procedure_lines, profile)
+        if sink is not None:
+            on_paragraph = sink.paragraph
+            if profile is not None:
+                def on_paragraph(name, statements):
+                    profile.paragraph(statements)
+                    sink.paragraph(name, statements)
+            proc_parser.parse(on_paragraph=on_paragraph)
+        else:
             self.parsed_data["procedure_division"] = proc_parser.parse()
+            if profile is not None:
+                for statements in self.parsed_data["procedure_division"].values():
+                    profile.paragraph(statements)
 
 
 class ProcedureParser:
-    def __init__(self, lines: List[Tuple[int, str]]):
+    def __init__(self, lines: List[Tuple[int, str]], profile=None):
         self.lines = lines
-        self.tokens: List[Token] = []
+        self.profile = profile
+        self.tokens = TokenStore()
+        self.kws = self.tokens.kws
         self.pos = 0
         self.length = 0
+        # Token index where each paragraph (including _ROOT_) starts
+        self.paragraph_starts: List[int] = []
+        # Statement parsers by leading keyword: compound statements open a
+        # block on the parse_compound stack, the rest parse in one call
+        self.openers = {KW_IF: self.open_if, KW_EVALUATE: self.open_evaluate, KW_PERFORM: self.open_perform}
+        self.leaf_parsers = {KW_CALL: self.parse_call, KW_MOVE: self.parse_move, KW_GO: self.parse_go_to}
 
     def tokenize(self):
-        token_pattern = re.compile(r"""('[^']*'|"[^"]*"|[\w-]+|.)""")
-        for line_num, text in self.lines:
-            matches = token_pattern.findall(text)
-            for m in matches:
-                val = m.strip()
-                if not val: continue
-                self.tokens.append(Token("WORD", val, line_num))
+        self.tokens = Lexer().tokenize(self.lines)
+        self.kws = self.tokens.kws
         self.length = len(self.tokens)
 
-    def parse(self) -> Dict[str, Any]:
-        self.tokenize()
+    def parse(self, on_paragraph: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None) -> Dict[str, Any]:
+        """Parse the tokens into {paragraph: [statements]}.
+
+        With `on_paragraph`, each paragraph is passed to the callback as soon
+        as the next one starts instead of being collected, and an empty dict
+        is returned.
+        """
+        with phase(self.profile, "tokenize"):
+            self.tokenize()
+        if self.profile is not None:
+            self.profile.count("tokens", self.length)
+        with phase(self.profile, "parse_statements"):
+            return self._parse_paragraphs(on_paragraph)
+
+    def _parse_paragraphs(self, on_paragraph) -> Dict[str, Any]:
         structure = {}
         current_paragraph = "_ROOT_"
-        structure[current_paragraph] = []
+        statements = structure[current_paragraph] = []
+        self.paragraph_starts = [0]
         
         while self.pos < self.length:
-            token = self.peek()
-            
             if self.is_paragraph_start():
-                para_name = self.consume().value
-                if self.peek() and self.peek().value == '.':
-                   self.consume() # eat dot
+                self.paragraph_starts.append(self.pos)
+                para_name = self.consume_value()
+                if self.peek_kw() == KW_PERIOD:
+                   self.advance() # eat dot
+                if on_paragraph is not None:
+                    on_paragraph(current_paragraph, statements)
+                    structure.clear()
                 current_paragraph = para_name
-                structure[current_paragraph] = []
+                statements = structure[current_paragraph] = []
                 continue
             
             start_pos = self.pos
             stmt = self.parse_statement()
             if stmt:
-                structure[current_paragraph].append(stmt)
+                statements.append(stmt)
             else:
                 # Only consume if we didn't advance (e.g. unmatched terminator)
                 if self.pos == start_pos:
                     if self.pos < self.length:
-                        self.consume()
-                
+                        self.advance()
+
+        if on_paragraph is not None:
+            on_paragraph(current_paragraph, statements)
+            return {}
         return structure
 
     def is_paragraph_start(self) -> bool:
-        t1 = self.peek(0)
-        t2 = self.peek(1)
-        if t1 and t2 and t2.value == '.' and t1.type == "WORD":
-            reserved = {
-                "EXIT", "GOBACK", "STOP", "RUN", "END-IF", "END-PERFORM", "END-EVALUATE", 
-                "END-READ", "END-CALL", "END-STRING", "END-UNSTRING", "ELSE"
-            }
-            if t1.value.upper() not in reserved:
-                return True
+        if self.pos + 1 < self.length and self.kws[self.pos + 1] == KW_PERIOD:
+            return self.kws[self.pos] not in PARAGRAPH_RESERVED
         return False
 
     def parse_statement(self) -> Optional[Dict[str, Any]]:
-        token = self.peek()
-        if not token: return None
-        if token.value == '.': 
-            self.consume()
-            return None 
-
-        verb = token.value.upper()
-        if verb == "IF":
-            return self.parse_if()
-        elif verb == "EVALUATE":
-            return self.parse_evaluate()
-        elif verb == "PERFORM":
-            return self.parse_perform()
-        elif verb == "CALL":
-            return self.parse_call()
-        elif verb == "MOVE":
-            return self.parse_move()
-        elif verb == "GO": 
-            return self.parse_go_to()
-        elif verb in ["END-IF", "END-EVALUATE", "END-PERFORM", "ELSE", "WHEN"]:
-            return None 
-        else:
-            return self.parse_generic()
+        if self.pos >= self.length: return None
+        kw = self.kws[self.pos]
+        if kw == KW_PERIOD:
+            self.advance()
+            return None
+        if kw in COMPOUND_VERBS:
+            return self.parse_compound()
+        if kw in STATEMENT_TERMINATORS:
+            return None
+        return self.leaf_parsers.get(kw, self.parse_generic)()
 
-    def parse_block(self, terminators: set) -> List[Dict[str, Any]]:
-        statements = []
-        while self.pos < self.length:
-            token = self.peek()
-            if not token: break
-            
-            if token.value.upper() in terminators:
-                break
+    def parse_compound(self) -> Dict[str, Any]:
+        """Parse an IF, EVALUATE or PERFORM and everything nested in it.
 
-            stmt = self.parse_statement()
-            if stmt:
-                statements.append(stmt)
-            else:
-                 # Check again after trying to parse
-                 curr = self.peek()
-                 if curr and curr.value.upper() in terminators:
-                     break
-                 
-                 if self.pos > 0 and self.tokens[self.pos-1].value == '.':
-                     break
-                 
-                 # Break on unconsumed junk or unmatched terminator
-                 break
-        return statements
+        Open blocks are kept on an explicit stack rather than the Python call
+        stack, so nesting depth costs neither frames nor the recursion limit.
+        A frame is [statement, block, terminators, close]: statements are
+        appended to `block` until a terminator (or anything that cannot start
+        a statement), then `close(frame)` either opens the statement's next
+        block (ELSE, the next WHEN) and returns None, or consumes its END-
+        keyword and returns the finished statement.
+        """
+        kws = self.kws
+        stack: List[list] = []
+        stmt = self.openers[kws[self.pos]](stack)
+        while stack:
+            frame = stack[-1]
+            if stmt is not None:
+                # A nested statement finished inside the enclosing block
+                frame[1].append(stmt)
+                stmt = None
+            kw = kws[self.pos] if self.pos < self.length else None
+            if kw is not None and kw not in frame[2]:
+                if kw in COMPOUND_VERBS:
+                    stmt = self.openers[kw](stack)
+                    continue
+                if kw == KW_PERIOD:
+                    self.advance()
+                elif kw not in STATEMENT_TERMINATORS:
+                    frame[1].append(self.leaf_parsers.get(kw, self.parse_generic)())
+                    continue
+            # The block is over
+            stmt = frame[3](frame)
+            if stmt is not None:
+                stack.pop()
+        return stmt
 
-    def parse_if(self):
-        self.consume() # IF
+    def open_if(self, stack: List[list]) -> None:
+        self.advance() # IF
         
         condition_tokens = []
         while self.pos < self.length:
-            t = self.peek()
-            if t.value.upper() == "THEN":
-                self.consume()
+            kw = self.kws[self.pos]
+            if kw == KW_THEN:
+                self.advance()
                 break
-            if t.value == '.': break 
-            
-            verbs = {"MOVE", "DISPLAY", "PERFORM", "IF", "GO", "CALL", "ADD", "SUBTRACT", "COMPUTE", "SET", "EVALUATE", "NEXT"}
-            if t.value.upper() in verbs and t.value.upper() not in ["IS", "NOT", "OR", "AND", "GREATER", "LESS", "EQUAL", "THAN"]:
+            if kw == KW_PERIOD: break 
+            if kw in IF_CONDITION_STOP:
                  break
                  
-            condition_tokens.append(self.consume().value)
+            condition_tokens.append(self.consume_value())
 
-        condition_str = " ".join(condition_tokens)
-        then_stmts = self.parse_block({"ELSE", "END-IF", "."})
-        
-        else_stmts = []
-        if self.peek() and self.peek().value.upper() == "ELSE":
-            self.consume()
-            else_stmts = self.parse_block({"END-IF", "."})
-            
-        if self.peek() and self.peek().value.upper() == "END-IF":
-            self.consume()
-            
-        return {
+        stmt = {
             "type": "IF",
-            "condition": condition_str,
-            "then": then_stmts,
-            "else": else_stmts
+            "condition": " ".join(condition_tokens),
+            "then": [],
+            "else": []
         }
+        stack.append([stmt, stmt["then"], IF_THEN_TERMINATORS, self.close_then])
+
+    def close_then(self, frame: list) -> Optional[Dict[str, Any]]:
+        if self.peek_kw() == KW_ELSE:
+            self.advance()
+            frame[1:] = [frame[0]["else"], IF_ELSE_TERMINATORS, self.close_if]
+            return None
+        return self.close_if(frame)
+
+    def close_if(self, frame: list) -> Dict[str, Any]:
+        if self.peek_kw() == KW_END_IF:
+            self.advance()
+        return frame[0]
 
-    def parse_evaluate(self):
-        self.consume() # EVALUATE
+    def open_evaluate(self, stack: List[list]) -> Optional[Dict[str, Any]]:
+        self.advance() # EVALUATE
         subject_tokens = []
         while self.pos < self.length:
-            t = self.peek()
-            if t.value.upper() == "WHEN": break
-            if t.value == '.': break
-            subject_tokens.append(self.consume().value)
+            kw = self.kws[self.pos]
+            if kw == KW_WHEN or kw == KW_PERIOD: break
+            subject_tokens.append(self.consume_value())
         
-        subject = " ".join(subject_tokens)
-        cases = []
-        
-        while self.peek() and self.peek().value.upper() == "WHEN":
-            self.consume() 
+        frame = [{"type": "EVALUATE", "subject": " ".join(subject_tokens), "cases": []},
+                 None, WHEN_TERMINATORS, self.close_when]
+        stmt = self.close_when(frame)
+        if stmt is None:
+            stack.append(frame)
+        return stmt
+
+    def close_when(self, frame: list) -> Optional[Dict[str, Any]]:
+        """Open the next WHEN's body, or finish the EVALUATE."""
+        if self.peek_kw() == KW_WHEN:
+            self.advance() 
             when_cond = []
             while self.pos < self.length:
-                t = self.peek()
-                verbs = {"MOVE", "DISPLAY", "PERFORM", "IF", "GO", "CALL", "ADD", "SUBTRACT", "SET", "CONTINUE"}
-                if t.value.upper() in verbs or t.value.upper() in ["WHEN", "END-EVALUATE"]:
+                kw = self.kws[self.pos]
+                if kw in WHEN_CONDITION_STOP:
                      break
-                if t.value == '.': break
-                when_cond.append(self.consume().value)
-            cond_str = " ".join(when_cond)
-            body = self.parse_block({"WHEN", "END-EVALUATE", "."})
-            cases.append({"condition": cond_str, "statements": body})
-            
-        if self.peek() and self.peek().value.upper() == "END-EVALUATE":
-            self.consume()
+                when_cond.append(self.consume_value())
+            frame[1] = []
+            frame[0]["cases"].append({"condition": " ".join(when_cond), "statements": frame[1]})
+            return None
             
-        return {"type": "EVALUATE", "subject": subject, "cases": cases}
+        if self.peek_kw() == KW_END_EVALUATE:
+            self.advance()
+        return frame[0]
 
-    def parse_perform(self):
-        self.consume() 
+    def open_perform(self, stack: List[list]) -> Optional[Dict[str, Any]]:
+        self.advance() 
         details = []
         is_inline = False
         has_procedure = False
         
         while self.pos < self.length:
-            t = self.peek()
+            kw = self.kws[self.pos]
             
             # Check first token to determine if it's potentially out-of-line (has procedure name)
-            if not details and t.value.upper() not in ["END-PERFORM", ".", "VARYING", "UNTIL", "TIMES", "WITH", "TEST"]:
+            if not details and kw not in PERFORM_NON_PROCEDURE:
                  has_procedure = True
 
-            if t.value.upper() == "END-PERFORM":
+            if kw == KW_END_PERFORM:
                 is_inline = True
                 break
             
             # If we hit a verb:
-            if t.value.upper() in ["MOVE", "IF", "DISPLAY", "CALL", "SET", "ADD", "SUBTRACT", "GO", "EVALUATE", "CONTINUE", "STOP", "EXIT", "READ", "WRITE"]: 
+            if kw in PERFORM_BODY_VERBS: 
                 if has_procedure:
                     # e.g. PERFORM PARA ... IF ...
                     # The IF is the next statement, not body.
@@ -384,98 +1117,183 @@ class ProcedureParser:
                     is_inline = True
                     break
             
-            if t.value == '.': break
-            details.append(self.consume().value)
+            if kw == KW_PERIOD: break
+            details.append(self.consume_value())
             
-        body = []
+        stmt = {"type": "PERFORM", "details": " ".join(details), "body": []}
         # If explicitly inline (hit Verb without Procedure, or hit END-PERFORM), parse body
         # Note: If we broke on Verb with has_procedure=False, is_inline is True.
         # If we broke on Verb with has_procedure=True, is_inline is False.
         # If we broke on END-PERFORM, is_inline is True.
         
         if is_inline:
-             # If we broke on END-PERFORM, body might be empty? or we consumed everything into details?
-             # No, if END-PERFORM, body is between details and END-PERFORM. 
-             # Wait, my loop consumes into details until break.
-             # If END-PERFORM, we broke. details has the header. Body is empty? 
-             # No, inline perform has statements.
-             # "PERFORM ... statements ... END-PERFORM"
-             # My loop would consume "statements" into "details" if they are not Verbs?
-             # But statements start with Verbs.
-             # So loop breaks on first Verb.
-             # Then we call parse_block.
-             body = self.parse_block({"END-PERFORM", "."})
-        
-        if self.peek() and self.peek().value.upper() == "END-PERFORM":
-            self.consume()
-        
-        return {"type": "PERFORM", "details": " ".join(details), "body": body}
+             # The header loop stops on the first verb, so the inline
+             # statements are parsed as a block up to END-PERFORM.
+             stack.append([stmt, stmt["body"], PERFORM_TERMINATORS, self.close_perform])
+             return None
+        return self.close_perform([stmt])
+
+    def close_perform(self, frame: list) -> Dict[str, Any]:
+        if self.peek_kw() == KW_END_PERFORM:
+            self.advance()
+        return frame[0]
 
     def parse_call(self):
-        self.consume() 
-        target = self.consume().value
+        self.advance() 
+        target = self.consume_value()
         args = []
         while self.pos < self.length:
-            t = self.peek()
-            if t.value == '.': break
-            if t.value.upper() in ["END-CALL"]: break
-            if t.value.upper() in ["ON", "EXCEPTION"]: break
-            args.append(self.consume().value)
-        if self.peek() and self.peek().value.upper() == "END-CALL":
-            self.consume()
+            kw = self.kws[self.pos]
+            if kw in CALL_ARGUMENT_STOP: break
+            args.append(self.consume_value())
+        if self.peek_kw() == KW_END_CALL:
+            self.advance()
         return {"type": "CALL", "target": target, "arguments": " ".join(args)}
     
     def parse_move(self):
-        self.consume()
+        self.advance()
         tokens = []
         while self.pos < self.length:
-            t = self.peek()
-            if t.value == '.': break
-            verbs = {"MOVE", "IF", "PERFORM", "CALL"} 
-            if t.value.upper() in verbs: break
-            tokens.append(self.consume().value)
+            kw = self.kws[self.pos]
+            if kw in MOVE_STOP: break
+            tokens.append(self.consume_value())
         return {"type": "MOVE", "statement": "MOVE " + " ".join(tokens)}
 
     def parse_go_to(self):
-        self.consume()
-        if self.peek() and self.peek().value.upper() == "TO":
-            self.consume()
-        target = self.consume().value
+        self.advance()
+        if self.peek_kw() == KW_TO:
+            self.advance()
+        target = self.consume_value()
         return {"type": "GO TO", "target": target}
 
     def parse_generic(self):
         tokens = []
-        first = self.consume().value
+        first = self.consume_value()
         tokens.append(first)
         while self.pos < self.length:
-            t = self.peek()
-            if t.value == '.': break
-            if t.value.upper() in ["ELSE", "END-IF", "WHEN", "END-EVALUATE", "END-PERFORM", "END-CALL"]:
-                break
-            verbs = {"MOVE", "DISPLAY", "PERFORM", "IF", "GO", "CALL", "ADD", "SUBTRACT", "COMPUTE", "SET", "EVALUATE", "CONTINUE", "RETURN", "OPEN", "CLOSE", "READ", "WRITE", "REWRITE", "DELETE", "START", "STOP", "EXIT"}
-            if t.value.upper() in verbs:
+            kw = self.kws[self.pos]
+            if kw in GENERIC_STOP:
                 break
-            tokens.append(self.consume().value)
+            tokens.append(self.consume_value())
         return {"type": "STATEMENT", "verb": first.upper(), "text": " ".join(tokens)}
 
     def peek(self, offset=0) -> Optional[Token]:
         idx = self.pos + offset
         if 0 <= idx < self.length:
-            return self.tokens[idx]
+            return Token(self.tokens, idx)
         return None
 
+    def peek_kw(self, offset=0) -> int:
+        """Keyword id of the token at pos+offset, 0 for non-keywords or EOF."""
+        idx = self.pos + offset
+        if 0 <= idx < self.length:
+            return self.kws[idx]
+        return 0
+
+    def advance(self):
+        self.pos += 1
+
     def consume(self) -> Token:
         t = self.tokens[self.pos]
         self.pos += 1
         return t
 
+    def consume_value(self) -> str:
+        if self.pos >= self.length:
+            raise IndexError("token index out of range")
+        value = self.tokens.value(self.pos)
+        self.pos += 1
+        return value
+
+
+def nested_blocks(stmt: Dict[str, Any]) -> Iterator[List[Dict[str, Any]]]:
+    """The statement lists nested in a parsed IF, EVALUATE or inline PERFORM."""
+    kind = stmt.get("type")
+    if kind == "IF":
+        yield stmt.get("then", [])
+        yield stmt.get("else", [])
+    elif kind == "EVALUATE":
+        for case in stmt.get("cases", []):
+            yield case.get("statements", [])
+    elif kind == "PERFORM":
+        yield stmt.get("body", [])
+
+
+def iterparse(filepath: str, source: Optional[bytes] = None, copybooks=None,
+              window: int = PROCEDURE_WINDOW) -> Iterator[Event]:
+    """Stream (event, name, data) tuples for a file; see CobolParser.iterparse."""
+    return CobolParser(filepath, source=source, copybooks=copybooks).iterparse(window)
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+    from json_stream import StreamingJsonWriter, NdjsonWriter, write_events
+    from copybook import CopybookLibrary, search_paths_from_env
+
+    ap = argparse.ArgumentParser(description="Parse a COBOL source file into JSON.")
+    ap.add_argument("filename")
+    ap.add_argument("-o", "--output", default="output.json", help="output path (default: output.json)")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--compact", action="store_true", help="write JSON without indentation")
+    mode.add_argument("--ndjson", action="store_true", help="write one record per line (metadata, divisions, data entries, paragraphs)")
+    mode.add_argument("--binary", action="store_true",
+                      help="write the compact binary format of binary_result.py (lazy per-paragraph reads)")
+    ap.add_argument("--cache-dir", default=os.environ.get("COBOL_PARSE_CACHE"),
+                    help="reuse results for unchanged sources from this directory (default: $COBOL_PARSE_CACHE)")
+    ap.add_argument("-I", "--copybook-path", action="append", default=None,
+                    help="expand COPY statements from copybooks in this directory; repeatable (default: $COBCPY)")
+    ap.add_argument("--encoding", help="codepage of the source, e.g. cp037 or cp1047 (default: sniffed)")
+    ap.add_argument("--stream", action="store_true",
+                    help="parse in bounded memory, writing records as they complete (requires --ndjson or --binary)")
+    profile_env = os.environ.get("COBOL_PROFILE", "").lower()
+    ap.add_argument("--profile", action="store_true", default=profile_env not in ("", "0"),
+                    help="write phase timings and statement counts to OUTPUT's name + .profile.json "
+                         "(default: on when $COBOL_PROFILE is set)")
+    ap.add_argument("--profile-memory", action="store_true", default=profile_env == "memory",
+                    help="with --profile, also trace peak allocated memory (slow; $COBOL_PROFILE=memory)")
+    args = ap.parse_args(argv)
+    if args.stream and not (args.ndjson or args.binary):
+        ap.error("--stream requires --ndjson or --binary")
+
+    cache = None
+    if args.cache_dir:
+        from parse_cache import ParseCache
+        cache = ParseCache(args.cache_dir)
+    copybooks = None
+    search_paths = args.copybook_path or search_paths_from_env()
+    if search_paths:
+        copybooks = CopybookLibrary(search_paths)
+    profile = None
+    if args.profile or args.profile_memory:
+        from profiling import ParseProfile
+        profile = ParseProfile(memory=args.profile_memory)
+    parser = CobolParser(args.filename, cache=cache, copybooks=copybooks, profile=profile, encoding=args.encoding)
+    # Written under a temporary name and renamed only once complete, so a
+    # failed parse never leaves a truncated result at args.output
+    partial_path = args.output + ".partial"
+    try:
+        with open(partial_path, "wb" if args.binary else "w") as f:
+            if args.binary:
+                from binary_result import BinaryWriter
+                writer = BinaryWriter(f)
+            elif args.ndjson:
+                writer = NdjsonWriter(f)
+            else:
+                writer = StreamingJsonWriter(f, indent=None if args.compact else 4)
+            with writer:
+                if args.stream:
+                    write_events(writer, parser.iterparse())
+                else:
+                    parser.parse(sink=writer)
+        os.replace(partial_path, args.output)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    if profile is not None:
+        profile_path = os.path.splitext(args.output)[0] + ".profile.json"
+        with open(profile_path, "w") as f:
+            json.dump(profile.to_dict(), f, indent=4)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python cobolparser.py <filename>")
-        sys.exit(1)
-        
-    filename = sys.argv[1]
-    parser = CobolParser(filename)
-    parser.parse()
-    with open("output.json", "w") as f:
-        f.write(json.dumps(parser.parsed_data, indent=4))
+    main()
@@ -0,0 +1,300 @@
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_EXTENSIONS = ("", ".cpy", ".CPY", ".cbl", ".CBL", ".cob", ".COB", ".copy", ".COPY")
+
+COPY_START = re.compile(r'^\s*COPY\s', re.IGNORECASE)
+# COPY text-name [OF|IN library] [SUPPRESS] [REPLACING ...]
+COPY_HEAD = re.compile(
+    r"""^\s*COPY\s+('[^']*'|"[^"]*"|[\w-]+)(?:\s+(?:OF|IN)\s+('[^']*'|"[^"]*"|[\w-]+))?(?:\s+SUPPRESS)?\s*""",
+    re.IGNORECASE,
+)
+REPLACING_OPERAND = re.compile(r"""==(.*?)==|'[^']*'|"[^"]*"|[^\s]+""", re.DOTALL)
+
+# (line number in the file it came from, cleaned content)
+Line = Tuple[int, str]
+# Where an expanded line came from: copybook name, file path, line number
+Origin = Tuple[str, str, int]
+
+
+class CopyStatement:
+    def __init__(self, name: str, library: Optional[str], replacing: List[Tuple[re.Pattern, str]]):
+        self.name = name
+        self.library = library
+        self.replacing = replacing
+        # One pass over the text: each operand is a group, tried in declaration order
+        self.replacing_pattern = re.compile(
+            "|".join("(%s)" % pattern.pattern for pattern, _ in replacing), re.IGNORECASE
+        ) if replacing else None
+
+    def replace(self, text: str) -> str:
+        # A function, so the pseudo-text is inserted as is, not as a template
+        return self.replacing_pattern.sub(lambda m: self.replacing[m.lastindex - 1][1], text)
+
+
+class Copybook:
+    """A copybook read, cleaned and scanned once (see scan_copy_statements)."""
+
+    def __init__(self, name: str, path: str, items: List[Tuple[str, tuple]], line_count: int,
+                 stamp: Optional[Tuple[int, int]] = None):
+        self.name = name
+        self.path = path
+        self.items = items
+        self.line_count = line_count
+        # (mtime, size) of the file when it was read
+        self.stamp = stamp
+
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _unquote(text: str) -> str:
+    if len(text) >= 2 and text[0] in "'\"" and text[-1] == text[0]:
+        return text[1:-1]
+    return text
+
+
+def _find_terminator(text: str) -> int:
+    """Index of the period ending a COPY statement, or -1 if it continues."""
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c in "'\"":
+            end = text.find(c, i + 1)
+            if end < 0:
+                return -1
+            i = end + 1
+            continue
+        if text.startswith("==", i):
+            end = text.find("==", i + 2)
+            if end < 0:
+                return -1
+            i = end + 2
+            continue
+        if c == "." and (i + 1 == n or text[i + 1].isspace()):
+            return i
+        i += 1
+    return -1
+
+
+def _operand_pattern(operand: str) -> re.Pattern:
+    """Regex matching a REPLACING operand as a whole text-word sequence."""
+    words = operand.split()
+    body = r"\s+".join(re.escape(w) for w in words)
+    if re.match(r"[\w-]", words[0]):
+        body = r"(?<![\w-])" + body
+    if re.search(r"[\w-]$", words[-1]):
+        body = body + r"(?![\w-])"
+    return re.compile(body, re.IGNORECASE)
+
+
+def parse_copy_statement(text: str) -> Optional[CopyStatement]:
+    head = COPY_HEAD.match(text)
+    if not head:
+        return None
+    name = _unquote(head.group(1)).upper()
+    library = _unquote(head.group(2)).upper() if head.group(2) else None
+    rest = text[head.end():].strip()
+    replacing = []
+    if rest[:9].upper() == "REPLACING":
+        operands = []
+        for m in REPLACING_OPERAND.finditer(rest[9:]):
+            operands.append(m.group(1) if m.group(1) is not None else m.group(0))
+        # operands come in "old BY new" triples
+        i = 0
+        while i + 2 < len(operands):
+            old, by, new = operands[i], operands[i + 1], operands[i + 2]
+            if by.upper() != "BY" or not old.strip():
+                break
+            replacing.append((_operand_pattern(old), " ".join(new.split())))
+            i += 3
+    return CopyStatement(name, library, replacing)
+
+
+def scan_copy_statements(lines: Sequence[Line]) -> List[Tuple[str, tuple]]:
+    """Split cleaned lines into plain lines and COPY statements.
+
+    Yields ("line", Line) and ("copy", (line_num, CopyStatement, lines))
+    items, where `lines` are the original lines of the statement. A COPY
+    statement starts a line and may span several lines up to its
+    terminating period. Text after the period on the same line is kept
+    unless it is a `*>` comment.
+    """
+    items: List[Tuple[str, tuple]] = []
+    i, n = 0, len(lines)
+    while i < n:
+        line_num, content = lines[i]
+        if not COPY_START.match(content):
+            items.append(("line", (line_num, content)))
+            i += 1
+            continue
+        first = i
+        text = content
+        end = _find_terminator(text)
+        while end < 0 and i + 1 < n:
+            i += 1
+            text += " " + lines[i][1]
+            end = _find_terminator(text)
+        stmt = parse_copy_statement(text[:end] if end >= 0 else text)
+        if stmt is None:
+            items.extend(("line", line) for line in lines[first:i + 1])
+        else:
+            items.append(("copy", (line_num, stmt, list(lines[first:i + 1]))))
+            trailing = text[end + 1:].strip() if end >= 0 else ""
+            if trailing and not trailing.startswith("*>"):
+                items.append(("line", (lines[i][0], trailing)))
+        i += 1
+    return items
+
+
+class CopybookLibrary:
+    """Resolves and expands COPY statements against a list of directories.
+
+    Each copybook is read, cleaned and scanned once and kept in an LRU shared
+    by every program parsed with this library; `max_entries` and
+    `max_lines` bound how much stays resident. A copybook whose file has
+    changed (or that has appeared since it was missing) is read again.
+    """
+
+    def __init__(self, search_paths: Sequence[str], extensions: Sequence[str] = DEFAULT_EXTENSIONS,
+                 max_entries: int = 1024, max_lines: int = 2_000_000):
+        self.search_paths = list(search_paths)
+        self.extensions = list(extensions)
+        self.max_entries = max_entries
+        self.max_lines = max_lines
+        self.loads = 0
+        self.hits = 0
+        self._books: "OrderedDict[Tuple[str, Optional[str]], Optional[Copybook]]" = OrderedDict()
+        self._resident_lines = 0
+
+    def resolve(self, name: str, library: Optional[str] = None) -> Optional[str]:
+        dirs = self.search_paths
+        if library:
+            dirs = [os.path.join(d, sub) for d in dirs for sub in (library, library.lower())] + dirs
+        candidates = {name, name.lower()}
+        for d in dirs:
+            for base in candidates:
+                for ext in self.extensions:
+                    path = os.path.join(d, base + ext)
+                    if os.path.isfile(path):
+                        return path
+        return None
+
+    def get(self, name: str, library: Optional[str] = None) -> Optional[Copybook]:
+        key = (name, library)
+        if key in self._books:
+            book = self._books[key]
+            if self._current(book, name, library):
+                self._books.move_to_end(key)
+                self.hits += 1
+                return book
+            del self._books[key]
+            if book is not None:
+                self._resident_lines -= book.line_count
+        book = self._load(name, library)
+        self._books[key] = book
+        if book is not None:
+            self._resident_lines += book.line_count
+        while len(self._books) > self.max_entries or (self._resident_lines > self.max_lines and len(self._books) > 1):
+            _, evicted = self._books.popitem(last=False)
+            if evicted is not None:
+                self._resident_lines -= evicted.line_count
+        return book
+
+    def _current(self, book: Optional[Copybook], name: str, library: Optional[str]) -> bool:
+        if book is None:
+            return self.resolve(name, library) is None
+        return _stamp(book.path) == book.stamp
+
+    def _load(self, name: str, library: Optional[str]) -> Optional[Copybook]:
+        from cobolparser import CobolParser
+
+        path = self.resolve(name, library)
+        if path is None:
+            return None
+        self.loads += 1
+        stamp = _stamp(path)
+        reader = CobolParser(path)
+        reader.load_file()
+        reader.detect_format()
+        lines = reader.clean_lines()
+        return Copybook(name, path, scan_copy_statements(lines), len(lines), stamp)
+
+    def expand(self, lines: Sequence[Line], resolved: Optional[Dict[str, Optional[str]]] = None
+               ) -> Tuple[List[Line], List[Optional[Origin]]]:
+        """Replace COPY statements in cleaned `lines` with copybook text.
+
+        Returns the expanded lines plus a parallel list of origins: None for
+        lines of the including file, or (copybook, path, line) for copied
+        ones. Copied lines take the line number of the COPY statement so
+        line numbers stay in the including file's space. `resolved`
+        collects name -> path (None when not found). Unresolved COPY
+        statements are left in place.
+
+        REPLACING is applied to each copied line on its own, so an operand
+        only matches text within one line of the copybook, never a word
+        sequence that continues onto the next line.
+        """
+        out_lines: List[Line] = []
+        origins: List[Optional[Origin]] = []
+        if resolved is None:
+            resolved = {}
+        for kind, payload in scan_copy_statements(lines):
+            if kind == "line":
+                out_lines.append(payload)
+                origins.append(None)
+                continue
+            line_num, stmt, original = payload
+            if not self._include(stmt, line_num, out_lines, origins, resolved, ()):
+                out_lines.extend(original)
+                origins.extend([None] * len(original))
+        return out_lines, origins
+
+    def _include(self, stmt: CopyStatement, line_num: int, out_lines: List[Line],
+                 origins: List[Optional[Origin]], resolved: Dict[str, Optional[str]],
+                 stack: Tuple[str, ...]) -> bool:
+        book = self.get(stmt.name, stmt.library)
+        resolved[stmt.name] = book.path if book is not None else None
+        if book is None or stmt.name in stack:
+            return False
+        start = len(out_lines)
+        for kind, payload in book.items:
+            if kind == "line":
+                out_lines.append((line_num, payload[1]))
+                origins.append((book.name, book.path, payload[0]))
+            else:
+                _, inner, original = payload
+                if not self._include(inner, line_num, out_lines, origins, resolved, stack + (stmt.name,)):
+                    for inner_line, content in original:
+                        out_lines.append((line_num, content))
+                        origins.append((book.name, book.path, inner_line))
+        if stmt.replacing:
+            for i in range(start, len(out_lines)):
+                out_lines[i] = (out_lines[i][0], stmt.replace(out_lines[i][1]))
+        return True
+
+
+_libraries: Dict[Tuple[str, ...], CopybookLibrary] = {}
+
+
+def get_library(search_paths: Sequence[str]) -> CopybookLibrary:
+    """Process-wide library per search path list, so copybooks are shared
+    across every program parsed in this process."""
+    key = tuple(search_paths)
+    library = _libraries.get(key)
+    if library is None:
+        library = _libraries[key] = CopybookLibrary(key)
+    return library
+
+
+def search_paths_from_env() -> List[str]:
+    """Copybook directories from $COBCPY (os.pathsep separated), as used by GnuCOBOL."""
+    value = os.environ.get("COBCPY", "")
+    return [p for p in value.split(os.pathsep) if p]
@@ -0,0 +1,498 @@
+"""Control-flow and call graphs over parsed programs.
+
+    cfg = build_cfg(parser.parsed_data)
+    cfg.dead_paragraphs()
+    cfg.graph.ancestors("2000-PROCESS")       # what can reach it
+
+    calls = CallGraph.from_results(results)   # parsed_data of many programs
+    calls.graph.ancestors("DATEUTIL")         # every program that may call it
+
+Both are `Digraph`s: nodes are numbered and edges held in compressed
+sparse row arrays (one offset array and one target array per direction).
+Transitive reachability is computed once per graph by collapsing strongly
+connected components and OR-ing per-component bitsets in topological order;
+queries then only decode a bitset.
+"""
+import argparse
+import json
+import os
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cobolparser import nested_blocks
+
+# Edge kinds
+PERFORM = 1
+GO_TO = 2
+FALLTHROUGH = 3
+CALL = 4
+EDGE_KIND_NAMES = {PERFORM: "perform", GO_TO: "go_to", FALLTHROUGH: "fallthrough", CALL: "call"}
+
+ROOT = "_ROOT_"
+THRU_WORDS = ("THRU", "THROUGH")
+
+
+class Digraph:
+    """Directed graph over named nodes in compressed sparse row form."""
+
+    def __init__(self, names: List[str], edges: Iterable[Tuple[int, int, int]]):
+        """`edges` are (source, target, kind) node index triples; duplicates
+        are dropped."""
+        self.names = names
+        self.index: Dict[str, int] = {name.upper(): i for i, name in enumerate(names)}
+        edge_list = sorted(set(edges))
+        self.offsets, self.targets, self.kinds = self._csr(len(names), edge_list)
+        reverse = sorted((t, s, k) for s, t, k in edge_list)
+        self.reverse_offsets, self.sources, _ = self._csr(len(names), reverse)
+        self._components: Optional[List[List[int]]] = None
+        self._component_of: Optional[array] = None
+        self._masks: Dict[bool, List[int]] = {}
+        self._memo: Dict[Tuple[bool, int], List[str]] = {}
+
+    @staticmethod
+    def _csr(n: int, edges: List[Tuple[int, int, int]]) -> Tuple[array, array, array]:
+        offsets = array("I", bytes(4 * (n + 1)))
+        targets = array("I")
+        kinds = array("B")
+        for source, target, kind in edges:
+            offsets[source + 1] += 1
+            targets.append(target)
+            kinds.append(kind)
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        return offsets, targets, kinds
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def node(self, name: str) -> int:
+        try:
+            return self.index[name.upper()]
+        except KeyError:
+            raise KeyError(f"unknown node: {name}") from None
+
+    def successors(self, name: str) -> List[str]:
+        i = self.node(name)
+        return [self.names[t] for t in self.targets[self.offsets[i]:self.offsets[i + 1]]]
+
+    def predecessors(self, name: str) -> List[str]:
+        i = self.node(name)
+        return [self.names[s] for s in self.sources[self.reverse_offsets[i]:self.reverse_offsets[i + 1]]]
+
+    def edges(self) -> Iterator[Tuple[int, int, int]]:
+        offsets, targets, kinds = self.offsets, self.targets, self.kinds
+        for source in range(len(self.names)):
+            for j in range(offsets[source], offsets[source + 1]):
+                yield source, targets[j], kinds[j]
+
+    def descendants(self, name: str) -> List[str]:
+        """Nodes reachable from `name` (itself only if it is on a cycle)."""
+        return self._reach(self.node(name), True)
+
+    def ancestors(self, name: str) -> List[str]:
+        """Nodes that can reach `name` (itself only if it is on a cycle)."""
+        return self._reach(self.node(name), False)
+
+    def reaches(self, source: str, target: str) -> bool:
+        masks = self._closure(True)
+        comp = self._component_of
+        return bool(masks[comp[self.node(source)]] >> comp[self.node(target)] & 1)
+
+    def _reach(self, node: int, forward: bool) -> List[str]:
+        key = (forward, node)
+        found = self._memo.get(key)
+        if found is None:
+            mask = self._closure(forward)[self._component_of[node]]
+            found = self._memo[key] = [self.names[i] for i in sorted(self._members(mask))]
+        return found
+
+    def _members(self, mask: int) -> Iterator[int]:
+        components = self._components
+        bits = bin(mask)
+        top = len(bits) - 1
+        pos = bits.find("1", 2)
+        while pos >= 0:
+            yield from components[top - pos]
+            pos = bits.find("1", pos + 1)
+
+    def _closure(self, forward: bool) -> List[int]:
+        """Per-component bitsets of the components reachable from (or, when
+        not `forward`, reaching) each component."""
+        masks = self._masks.get(forward)
+        if masks is not None:
+            return masks
+        if self._components is None:
+            self._strongly_connected()
+        components = self._components
+        comp = self._component_of
+        if forward:
+            offsets, targets = self.offsets, self.targets
+            # Tarjan emits a component after everything it reaches
+            order = range(len(components))
+        else:
+            offsets, targets = self.reverse_offsets, self.sources
+            order = range(len(components) - 1, -1, -1)
+        masks = [0] * len(components)
+        for c in order:
+            mask = 0
+            cyclic = len(components[c]) > 1
+            for node in components[c]:
+                for j in range(offsets[node], offsets[node + 1]):
+                    d = comp[targets[j]]
+                    if d == c:
+                        cyclic = True
+                    else:
+                        mask |= masks[d] | (1 << d)
+            masks[c] = mask | (1 << c) if cyclic else mask
+        self._masks[forward] = masks
+        return masks
+
+    def _strongly_connected(self):
+        """Iterative Tarjan; components come out in reverse topological order."""
+        n = len(self.names)
+        offsets, targets = self.offsets, self.targets
+        index = [-1] * n
+        low = [0] * n
+        on_stack = [False] * n
+        stack: List[int] = []
+        components: List[List[int]] = []
+        comp = array("I", bytes(4 * n))
+        counter = 0
+        for root in range(n):
+            if index[root] >= 0:
+                continue
+            work = [(root, offsets[root])]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                node, j = work[-1]
+                if j < offsets[node + 1]:
+                    work[-1] = (node, j + 1)
+                    t = targets[j]
+                    if index[t] < 0:
+                        index[t] = low[t] = counter
+                        counter += 1
+                        stack.append(t)
+                        on_stack[t] = True
+                        work.append((t, offsets[t]))
+                    elif on_stack[t] and index[t] < low[node]:
+                        low[node] = index[t]
+                    continue
+                work.pop()
+                if work and low[node] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[node]
+                if low[node] == index[node]:
+                    members = []
+                    while True:
+                        t = stack.pop()
+                        on_stack[t] = False
+                        comp[t] = len(components)
+                        members.append(t)
+                        if t == node:
+                            break
+                    components.append(members)
+        self._components = components
+        self._component_of = comp
+
+
+def statement_words(stmt: Dict[str, Any]) -> List[str]:
+    """The words of one statement, without its nested statements. Verbs the
+    parser folded into a neighbouring statement's text show up here too."""
+    kind = stmt.get("type")
+    if kind == "PERFORM":
+        return ["PERFORM"] + stmt.get("details", "").split()
+    if kind == "GO TO":
+        return ["GO", "TO", stmt.get("target", "")]
+    if kind == "CALL":
+        return ["CALL", stmt.get("target", "")] + stmt.get("arguments", "").split()
+    if kind == "MOVE":
+        return stmt.get("statement", "").split()
+    if kind == "STATEMENT":
+        return stmt.get("text", "").split()
+    if kind == "IF":
+        return stmt.get("condition", "").split()
+    if kind == "EVALUATE":
+        words = stmt.get("subject", "").split()
+        for case in stmt.get("cases", []):
+            words.extend(case.get("condition", "").split())
+        return words
+    return []
+
+
+def statement_references(statements: List[Dict[str, Any]]) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """(kind, target, thru) for every PERFORM, GO TO and CALL in
+    `statements` and the statements nested in them. GO TO yields one
+    reference per listed procedure (GO TO A B DEPENDING ON X)."""
+    pending = [statements]
+    while pending:
+        for stmt in pending.pop():
+            words = statement_words(stmt)
+            n = len(words)
+            for i, word in enumerate(words):
+                word = word.upper()
+                if word == "PERFORM" and i + 1 < n:
+                    thru = words[i + 3] if i + 3 < n and words[i + 2].upper() in THRU_WORDS else None
+                    yield PERFORM, words[i + 1], thru
+                elif word == "GO":
+                    j = i + 2 if i + 1 < n and words[i + 1].upper() == "TO" else i + 1
+                    while j < n and words[j].upper() not in ("DEPENDING", "."):
+                        yield GO_TO, words[j], None
+                        j += 1
+                elif word == "CALL" and i + 1 < n:
+                    yield CALL, words[i + 1], None
+            pending.extend(nested_blocks(stmt))
+
+
+def _ends_flow(stmt: Dict[str, Any]) -> bool:
+    """Whether control never falls past this top-level statement."""
+    if stmt.get("type") == "GO TO":
+        return True
+    if stmt.get("type") not in ("STATEMENT", "MOVE"):
+        return False
+    words = [w.upper() for w in statement_words(stmt)]
+    for i, word in enumerate(words):
+        nxt = words[i + 1] if i + 1 < len(words) else ""
+        if word == "GOBACK" or (word == "STOP" and nxt == "RUN") or (word == "EXIT" and nxt == "PROGRAM") \
+                or (word == "GO" and i > 0):
+            return True
+    return False
+
+
+def _section_name(stmt: Dict[str, Any]) -> Optional[str]:
+    """The parser leaves `NAME SECTION.` headers as statements."""
+    if stmt.get("type") != "STATEMENT":
+        return None
+    words = stmt.get("text", "").split()
+    if len(words) == 2 and words[1].upper() == "SECTION":
+        return words[0]
+    return None
+
+
+def call_target(target: str) -> Optional[str]:
+    """Program name of a static CALL ('PROG' or "PROG"); None for a CALL
+    through a data item."""
+    if len(target) >= 2 and target[0] in "'\"" and target[-1] == target[0]:
+        return target[1:-1].strip().upper() or None
+    return None
+
+
+class ControlFlowGraph:
+    """Paragraph/section control flow of one program.
+
+    Nodes are _ROOT_ (the statements before the first header), sections and
+    paragraphs in source order. Edges are PERFORM (to every procedure of a
+    THRU range), GO TO, and fall-through into the next procedure unless the
+    last statement is GO TO, STOP RUN, GOBACK or EXIT PROGRAM.
+    """
+
+    def __init__(self, procedure: Dict[str, List[Dict[str, Any]]]):
+        names: List[str] = []
+        self.kinds: List[str] = []
+        # Section each node belongs to (None outside sections)
+        self.sections: List[Optional[str]] = []
+        bodies: List[List[Dict[str, Any]]] = []
+        section = None
+        for name, statements in procedure.items():
+            names.append(name)
+            self.kinds.append("root" if name == ROOT else "paragraph")
+            self.sections.append(section)
+            bodies.append([])
+            for stmt in statements:
+                header = _section_name(stmt)
+                if header is None:
+                    bodies[-1].append(stmt)
+                    continue
+                section = header
+                names.append(header)
+                self.kinds.append("section")
+                self.sections.append(header)
+                bodies.append([])
+
+        lookup = {name.upper(): i for i, name in enumerate(names)}
+        edges: List[Tuple[int, int, int]] = []
+        self.calls: List[str] = []
+        self.dynamic_calls = 0
+        for i, body in enumerate(bodies):
+            for kind, target, thru in statement_references(body):
+                if kind == CALL:
+                    program = call_target(target)
+                    if program is None:
+                        self.dynamic_calls += 1
+                    elif program not in self.calls:
+                        self.calls.append(program)
+                    continue
+                first = lookup.get(target.upper())
+                if first is None:
+                    continue
+                last = lookup.get(thru.upper(), first) if thru else first
+                for j in range(first, max(first, last) + 1):
+                    edges.append((i, j, kind))
+            if i + 1 < len(names) and not (body and _ends_flow(body[-1])):
+                edges.append((i, i + 1, FALLTHROUGH))
+        self.graph = Digraph(names, edges)
+        self._dead: Optional[List[str]] = None
+
+    @property
+    def entry(self) -> Optional[str]:
+        return self.graph.names[0] if self.graph.names else None
+
+    def dead_paragraphs(self) -> List[str]:
+        """Sections and paragraphs no path from the entry reaches."""
+        if self._dead is None:
+            if self.entry is None:
+                self._dead = []
+            else:
+                live = set(self.graph.descendants(self.entry))
+                live.add(self.entry)
+                self._dead = [name for name in self.graph.names if name not in live]
+        return self._dead
+
+    def to_dict(self) -> Dict[str, Any]:
+        names = self.graph.names
+        return {
+            "nodes": [{"name": name, "kind": kind, "section": section}
+                      for name, kind, section in zip(names, self.kinds, self.sections)],
+            "edges": [{"from": names[s], "to": names[t], "kind": EDGE_KIND_NAMES[k]}
+                      for s, t, k in self.graph.edges()],
+            "dead": self.dead_paragraphs(),
+            "calls": self.calls,
+            "dynamic_calls": self.dynamic_calls,
+        }
+
+
+def build_cfg(parsed_data: Dict[str, Any]) -> ControlFlowGraph:
+    return ControlFlowGraph(parsed_data.get("procedure_division", {}))
+
+
+def program_name(parsed_data: Dict[str, Any]) -> str:
+    """PROGRAM-ID, or the file name without extension."""
+    program_id = parsed_data.get("identification_division", {}).get("PROGRAM-ID", "")
+    words = program_id.replace(".", " ").split()
+    if words:
+        return call_target(words[0]) or words[0].upper()
+    return os.path.splitext(parsed_data.get("metadata", {}).get("file", ""))[0].upper()
+
+
+class CallGraph:
+    """Inter-program CALL graph. Programs that are called but were not in
+    the input are kept as "external" nodes."""
+
+    def __init__(self, calls: Dict[str, List[str]]):
+        names = list(calls)
+        self.defined = len(names)
+        index = {name: i for i, name in enumerate(names)}
+        edges = []
+        for caller, targets in calls.items():
+            for target in targets:
+                if target not in index:
+                    index[target] = len(names)
+                    names.append(target)
+                edges.append((index[caller], index[target], CALL))
+        self.calls = calls
+        self.graph = Digraph(names, edges)
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict[str, Any]]) -> "CallGraph":
+        calls: Dict[str, List[str]] = {}
+        for data in results:
+            cfg = build_cfg(data)
+            targets = calls.setdefault(program_name(data), [])
+            targets.extend(t for t in cfg.calls if t not in targets)
+        return cls(calls)
+
+    def external(self) -> List[str]:
+        return self.graph.names[self.defined:]
+
+    def roots(self) -> List[str]:
+        """Programs in the input that no other program calls."""
+        rev = self.graph.reverse_offsets
+        return [self.graph.names[i] for i in range(self.defined) if rev[i] == rev[i + 1]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "roots": self.roots(), "external": self.external()}
+
+
+def load_results(paths: Iterable[str], copybook_paths: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """parsed_data from batch outputs (.json or binary .cbr files, `batch.py
+    --ndjson` files, directories of them) or from COBOL sources, parsed here."""
+    from batch import DEFAULT_INCLUDE, MANIFEST_NAME, collect_sources
+    from binary_result import SUFFIX as BINARY_SUFFIX, load as load_binary
+    from cobolparser import CobolParser
+    from copybook import get_library
+
+    for path in collect_sources(list(paths), DEFAULT_INCLUDE + ["*.json", "*.ndjson", "*" + BINARY_SUFFIX]):
+        if os.path.basename(path) == MANIFEST_NAME:
+            continue
+        if path.endswith(".ndjson"):
+            with open(path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record.get("status") == "ok":
+                        yield record["result"]
+        elif path.endswith(".json"):
+            with open(path) as f:
+                yield json.load(f)
+        elif path.endswith(BINARY_SUFFIX):
+            yield load_binary(path)
+        else:
+            parser = CobolParser(path, copybooks=get_library(copybook_paths) if copybook_paths else None)
+            parser.parse()
+            yield parser.parsed_data
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Build control-flow and CALL graphs from parsed COBOL.")
+    ap.add_argument("mode", choices=("cfg", "calls"),
+                    help="cfg: paragraph flow of each input; calls: CALL graph across all inputs")
+    ap.add_argument("sources", nargs="+", help="sources, batch JSON/NDJSON/.cbr outputs, or directories")
+    query = ap.add_mutually_exclusive_group()
+    query.add_argument("--reaching", metavar="NODE", help="list what can reach NODE")
+    query.add_argument("--from", dest="start", metavar="NODE", help="list what NODE can reach")
+    query.add_argument("--dead", action="store_true", help="cfg: list unreachable paragraphs only")
+    ap.add_argument("-I", "--copybook-path", action="append", default=None,
+                    help="expand COPY statements from copybooks in this directory; repeatable")
+    ap.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = ap.parse_args(argv)
+
+    results = load_results(args.sources, args.copybook_path)
+    if args.mode == "calls":
+        graphs = {"*": CallGraph.from_results(results)}
+    else:
+        graphs = {}
+        for data in results:
+            graphs[data.get("metadata", {}).get("file", "")] = build_cfg(data)
+
+    if args.dead and args.mode != "cfg":
+        ap.error("--dead applies to cfg mode")
+    node = args.reaching or args.start
+    out: Dict[str, Any] = {}
+    for name, built in graphs.items():
+        if node and node.upper() not in built.graph.index:
+            continue
+        if args.reaching:
+            out[name] = built.graph.ancestors(args.reaching)
+        elif args.start:
+            out[name] = built.graph.descendants(args.start)
+        elif args.dead:
+            out[name] = built.dead_paragraphs()
+        else:
+            out[name] = built.to_dict()
+    if node and not out:
+        print(f"Error: unknown node: {node}")
+        sys.exit(1)
+    if args.mode == "calls":
+        out = out["*"]
+
+    text = json.dumps(out, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
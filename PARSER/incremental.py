@@ -0,0 +1,192 @@
+"""Incremental re-parsing at paragraph granularity.
+
+    inc = IncrementalParser("PROG.cbl")
+    data = inc.parse(source_bytes)
+    data = inc.update(edited_bytes)   # re-parses only the touched paragraphs
+
+The PROCEDURE DIVISION is kept as a list of chunks. A chunk starts at a line
+whose first token is a paragraph header that the full parse reached at the
+top level, so the text before it cannot influence how it parses. An edit
+re-cleans and re-parses only the chunks its changed lines fall in, checks
+that the chunk following the edit still starts a paragraph, and splices the
+untouched chunks back in. Edits outside the PROCEDURE DIVISION, or that add
+or remove division headers, fall back to a full parse.
+"""
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from cobolparser import CobolParser, ProcedureParser, SourceFormat, DIVISION_PATTERN
+from normalizer import INDICATOR_COLUMN
+
+Paragraphs = List[Tuple[str, List[Dict[str, Any]]]]
+
+
+class IncrementalParser(CobolParser):
+    def __init__(self, filepath: str):
+        super().__init__(filepath)
+        # Raw line index where each chunk starts, and the paragraphs in it
+        self.chunk_starts: List[int] = []
+        self.chunk_paragraphs: List[Paragraphs] = []
+        self.last_update: Dict[str, Any] = {}
+
+    def _reset(self, source: bytes):
+        fresh = CobolParser(self.filepath, source=source)
+        self.source = source
+        self.parsed_data = fresh.parsed_data
+        self.division_starts = []
+        self.chunk_starts = []
+        self.chunk_paragraphs = []
+
+    def parse(self, source: Optional[bytes] = None, sink=None) -> Dict[str, Any]:
+        """Full parse of `source` (or the file), remembering the chunk table."""
+        if source is None:
+            source = self.read_source()
+        self._reset(source)
+        self._parse()
+        self.last_update = {"mode": "full", "reparsed_lines": len(self.buffer)}
+        if sink is not None:
+            self.replay(sink)
+        return self.parsed_data
+
+    def _parse_procedure(self, procedure_lines: List[Tuple[int, str]], sink=None):
+        header_line = self.division_starts[-1][1]
+        parsed = self._parse_chunks(procedure_lines, header_line, keep_root=True)
+        self.chunk_starts, self.chunk_paragraphs = parsed
+        self._assemble()
+
+    def _parse_chunks(self, lines: List[Tuple[int, str]], first_start: int, keep_root: bool,
+                      boundary_line: Optional[int] = None) -> Optional[Tuple[List[int], List[Paragraphs]]]:
+        """Parse `lines` and split the paragraphs into chunks.
+
+        When `boundary_line` is given, the last line in `lines` is the header
+        line of the chunk after this region; it must still start a top-level
+        paragraph, otherwise None is returned. Without `keep_root` the region
+        must itself open with a paragraph header on line `first_start`.
+        """
+        collected: Paragraphs = []
+        proc_parser = ProcedureParser(lines)
+        try:
+            proc_parser.parse(on_paragraph=lambda name, stmts: collected.append((name, stmts)))
+        except IndexError:
+            # A statement ran off the end of the region (e.g. a trailing GO
+            # TO), so it must be continuing into the chunk after it.
+            if boundary_line is None:
+                raise
+            return None
+        line_nums = proc_parser.tokens.line_nums
+        records = list(zip(collected, proc_parser.paragraph_starts))
+
+        if boundary_line is not None:
+            limit = sum(1 for n in line_nums if n < boundary_line)
+            ends = [i for i, (_, tok) in enumerate(records) if i > 0 and tok == limit]
+            if not ends:
+                return None
+            records = records[:ends[0]]
+
+        root, rest = records[0], records[1:]
+        if keep_root:
+            starts, chunks = [first_start], [[root[0]]]
+        else:
+            if root[0][1] or not rest or rest[0][1] != 0 or line_nums[0] - 1 != first_start:
+                return None
+            starts, chunks = [], []
+        for (name, stmts), tok in rest:
+            if tok == 0 or line_nums[tok - 1] != line_nums[tok]:
+                starts.append(line_nums[tok] - 1)
+                chunks.append([])
+            chunks[-1].append((name, stmts))
+        return starts, chunks
+
+    def _assemble(self):
+        structure: Dict[str, Any] = {}
+        for paragraphs in self.chunk_paragraphs:
+            for name, stmts in paragraphs:
+                structure[name] = stmts
+        self.parsed_data["procedure_division"] = structure
+
+    def _incremental_ok(self, probe: CobolParser, first_changed: int, new_end: int) -> bool:
+        """Whether an edit starting at raw line `first_changed` stays inside
+        the only PROCEDURE DIVISION and leaves the source format alone."""
+        if not self.chunk_starts or first_changed < self.chunk_starts[0]:
+            return False
+        divisions = [div for div, _ in self.division_starts]
+        if divisions.count("PROCEDURE DIVISION") != 1 or divisions[-1] != "PROCEDURE DIVISION":
+            return False
+        probe.detect_format()
+        if probe.source_format != self.source_format:
+            return False
+        if probe.source_format == SourceFormat.FIXED:
+            # A continuation line joins onto the line before it, which may
+            # sit in an earlier chunk
+            text = probe.buffer.text
+            if any(e - s > INDICATOR_COLUMN and text[s + INDICATOR_COLUMN] == "-"
+                   for _, s, e in probe.buffer.line_spans(first_changed, new_end + 1)):
+                return False
+        return not any(DIVISION_PATTERN.match(text.strip())
+                       for _, text in probe.iter_clean_lines(first_changed, new_end))
+
+    def update(self, source: bytes) -> Dict[str, Any]:
+        """Re-parse after an edit, reusing every chunk the edit did not touch."""
+        old_lines = self.raw_lines
+        probe = CobolParser(self.filepath, source=source)
+        probe.load_file()
+        new_lines = probe.raw_lines
+
+        prefix = 0
+        limit = min(len(old_lines), len(new_lines))
+        while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+            suffix += 1
+        old_end = len(old_lines) - suffix
+        new_end = len(new_lines) - suffix
+        delta = new_end - old_end
+
+        if prefix == len(old_lines) == len(new_lines):
+            self.source = source
+            self.last_update = {"mode": "unchanged", "reparsed_lines": 0}
+            return self.parsed_data
+        if not self._incremental_ok(probe, prefix, new_end):
+            return self.parse(source)
+
+        starts = self.chunk_starts
+        first = bisect_right(starts, prefix) - 1
+        if first > 0 and starts[first] == prefix:
+            # The header line itself changed (or lines were inserted right
+            # before it); the previous paragraph may absorb the difference.
+            first -= 1
+        last = max(first, bisect_right(starts, max(old_end - 1, prefix - 1)) - 1)
+
+        self.buffer = probe.buffer
+        self._raw_lines = new_lines
+        self.source = source
+        region_start = starts[first]
+        nxt = last + 1
+        while True:
+            if nxt < len(starts):
+                boundary = starts[nxt] + delta
+                lines = self.clean_lines(region_start, boundary + 1)
+                parsed = self._parse_chunks(lines, region_start, keep_root=(first == 0),
+                                            boundary_line=boundary + 1)
+            else:
+                lines = self.clean_lines(region_start)
+                parsed = self._parse_chunks(lines, region_start, keep_root=(first == 0))
+            if parsed is not None:
+                break
+            if nxt >= len(starts):
+                return self.parse(source)
+            nxt += 1
+
+        new_starts, new_chunks = parsed
+        self.chunk_starts = starts[:first] + new_starts + [s + delta for s in starts[nxt:]]
+        self.chunk_paragraphs = self.chunk_paragraphs[:first] + new_chunks + self.chunk_paragraphs[nxt:]
+        # Shallow copy so the previous result handed to the caller stays intact
+        self.parsed_data = dict(self.parsed_data)
+        self._assemble()
+        self.last_update = {
+            "mode": "incremental",
+            "reparsed_lines": len(lines),
+            "reparsed_paragraphs": sum(len(c) for c in new_chunks),
+        }
+        return self.parsed_data
@@ -0,0 +1,225 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, TextIO, Tuple
+
+# Top-level keys of CobolParser.parsed_data, in output order.
+TOP_LEVEL_KEYS = (
+    "metadata",
+    "identification_division",
+    "environment_division",
+    "data_division",
+    "procedure_division",
+)
+CONTAINER_KEYS = {"data_division": ("[", "]"), "procedure_division": ("{", "}")}
+_END = object()
+
+
+def dumps(value: Any, indent: Optional[int] = None, separators: Optional[Tuple[str, str]] = None) -> str:
+    """json.dumps(value, indent=indent, separators=separators), also for
+    statements nested deeper than json's recursive encoder can go."""
+    try:
+        return json.dumps(value, indent=indent, separators=separators)
+    except RecursionError:
+        return _dumps_iterative(value, indent, separators)
+
+
+def _dumps_iterative(value: Any, indent: Optional[int], separators: Optional[Tuple[str, str]]) -> str:
+    # Same output as json.dumps, walking containers with an explicit stack
+    item_separator, key_separator = separators or ((", ", ": ") if indent is None else (",", ": "))
+    parts: List[str] = []
+    # Per open container: its items, whether it is a dict, its closer, whether an item was written
+    stack: List[list] = []
+    pending = [value]
+    while pending or stack:
+        if pending:
+            item = pending.pop()
+        else:
+            frame = stack[-1]
+            item = next(frame[0], _END)
+            if item is _END:
+                stack.pop()
+                if frame[3] and indent is not None:
+                    parts.append("\n" + " " * (indent * len(stack)))
+                parts.append(frame[2])
+                continue
+            if frame[3]:
+                parts.append(item_separator)
+            frame[3] = True
+            if indent is not None:
+                parts.append("\n" + " " * (indent * len(stack)))
+            if frame[1]:
+                key, item = item
+                if not isinstance(key, str):
+                    raise TypeError(f"keys must be str, not {type(key).__name__}")
+                parts.append(json.dumps(key) + key_separator)
+        if isinstance(item, dict):
+            parts.append("{")
+            stack.append([iter(item.items()), True, "}", False])
+        elif isinstance(item, (list, tuple)):
+            parts.append("[")
+            stack.append([iter(item), False, "]", False])
+        else:
+            parts.append(json.dumps(item))
+    return "".join(parts)
+
+
+def write_events(sink, events: Iterable[Tuple[str, Optional[str], Any]]):
+    """Hand CobolParser.iterparse events to a writer."""
+    for event, name, data in events:
+        if event == "paragraph":
+            sink.paragraph(name, data)
+        elif event == "data_entry":
+            sink.data_entry(data)
+        elif event == "division":
+            sink.division(name, data)
+        else:
+            sink.metadata(data)
+
+
+class StreamingJsonWriter:
+    """Writes a parse result to `fp` piece by piece as CobolParser emits it.
+
+    Pass an instance as `CobolParser.parse(sink=...)`. With `indent=4` the
+    output is byte-identical to `json.dumps(parsed_data, indent=4)`;
+    `indent=None` gives compact output. A division that shows up again after
+    the writer has moved past it (nested programs) is written once more at
+    the end, so JSON readers see the merged value in its original position.
+    """
+
+    def __init__(self, fp: TextIO, indent: Optional[int] = 4):
+        self.fp = fp
+        self.indent = indent
+        self._separators = (",", ":") if indent is None else (",", ": ")
+        self._position = -1
+        self._open_items: Optional[int] = None
+        self._late: Dict[str, Any] = {}
+        self._closed = False
+        fp.write("{")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # After a failure, leave the output unterminated rather than
+        # closing it into JSON that looks complete
+        if exc_type is None:
+            self.close()
+
+    def _dumps(self, value: Any, depth: int) -> str:
+        text = dumps(value, indent=self.indent, separators=self._separators)
+        if self.indent:
+            # json.dumps escapes newlines inside strings, so every raw newline
+            # is structural and can be re-indented safely.
+            text = text.replace("\n", "\n" + " " * (self.indent * depth))
+        return text
+
+    def _newline(self, depth: int) -> str:
+        if self.indent is None:
+            return ""
+        return "\n" + " " * (self.indent * depth)
+
+    def _start_member(self, key: str):
+        prefix = "" if self._position < 0 else ","
+        self.fp.write(prefix + self._newline(1) + json.dumps(key) + self._separators[1])
+
+    def _close_container(self):
+        if self._open_items is None:
+            return
+        opener, closer = CONTAINER_KEYS[TOP_LEVEL_KEYS[self._position]]
+        if self._open_items == 0:
+            self.fp.write(opener + closer)
+        else:
+            self.fp.write(self._newline(1) + closer)
+        self._open_items = None
+
+    def _advance_to(self, key: str) -> bool:
+        """Move the writer to `key`, filling skipped keys with empty values.
+
+        Returns False when the writer is already past `key`.
+        """
+        target = TOP_LEVEL_KEYS.index(key)
+        if target < self._position:
+            return False
+        if target == self._position:
+            return True
+        self._close_container()
+        for skipped in TOP_LEVEL_KEYS[self._position + 1:target]:
+            self._start_member(skipped)
+            self._position += 1
+            opener, closer = CONTAINER_KEYS.get(skipped, ("{", "}"))
+            self.fp.write(opener + closer)
+        self._start_member(key)
+        self._position = target
+        if key in CONTAINER_KEYS:
+            self._open_items = 0
+        return True
+
+    def _item(self, text: str):
+        if self._open_items == 0:
+            self.fp.write(CONTAINER_KEYS[TOP_LEVEL_KEYS[self._position]][0])
+        else:
+            self.fp.write(",")
+        self.fp.write(self._newline(2) + text)
+        self._open_items += 1
+
+    def metadata(self, metadata: Dict[str, Any]):
+        self.division("metadata", metadata)
+
+    def division(self, key: str, value: Dict[str, Any]):
+        if TOP_LEVEL_KEYS.index(key) <= self._position:
+            self._late[key] = value
+            return
+        self._advance_to(key)
+        self.fp.write(self._dumps(value, 1))
+
+    def data_entry(self, entry: Dict[str, Any]):
+        if not self._advance_to("data_division"):
+            raise ValueError("data entry emitted after the PROCEDURE DIVISION started")
+        self._item(self._dumps(entry, 2))
+
+    def paragraph(self, name: str, statements: List[Dict[str, Any]]):
+        self._advance_to("procedure_division")
+        self._item(json.dumps(name) + self._separators[1] + self._dumps(statements, 2))
+
+    def close(self):
+        if self._closed:
+            return
+        self._advance_to(TOP_LEVEL_KEYS[-1])
+        self._close_container()
+        for key, value in self._late.items():
+            self._start_member(key)
+            self.fp.write(self._dumps(value, 1))
+        self.fp.write(self._newline(0) + "}")
+        self._closed = True
+
+
+class NdjsonWriter:
+    """Writes one JSON record per line: metadata, each division, each data
+    entry and each paragraph, in the order CobolParser emits them."""
+
+    def __init__(self, fp: TextIO):
+        self.fp = fp
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write(self, record: Dict[str, Any]):
+        self.fp.write(dumps(record, separators=(",", ":")))
+        self.fp.write("\n")
+
+    def metadata(self, metadata: Dict[str, Any]):
+        self._write({"kind": "metadata", "data": metadata})
+
+    def division(self, key: str, value: Dict[str, Any]):
+        self._write({"kind": key, "data": value})
+
+    def data_entry(self, entry: Dict[str, Any]):
+        self._write({"kind": "data_entry", "data": entry})
+
+    def paragraph(self, name: str, statements: List[Dict[str, Any]]):
+        self._write({"kind": "paragraph", "name": name, "statements": statements})
+
+    def close(self):
+        self.fp.flush()
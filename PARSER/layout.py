@@ -0,0 +1,295 @@
+"""Storage layout of DATA DIVISION records.
+
+    layouts = DataLayout().records(parser.parsed_data["data_division"])
+
+Turns the flat data entries into one tree per 01/77 record and computes each
+field's byte offset (from the start of the record) and length, honouring
+PICTURE, USAGE (inherited from the group), OCCURS and REDEFINES. Layouts are
+cached per record, so a copybook included by many programs is laid out once.
+"""
+import argparse
+import json
+import re
+import sys
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+PIC_REPEAT = re.compile(r'(.)\((\d+)\)')
+
+# Levels that describe no storage of their own
+CONDITION_LEVEL = 88
+RENAMES_LEVEL = 66
+INDEPENDENT_LEVEL = 77
+
+USAGE_ALIASES = {
+    "COMPUTATIONAL": "COMP",
+    "COMPUTATIONAL-1": "COMP-1",
+    "COMPUTATIONAL-2": "COMP-2",
+    "COMPUTATIONAL-3": "COMP-3",
+    "COMPUTATIONAL-4": "COMP-4",
+    "COMPUTATIONAL-5": "COMP-5",
+    "PACKED-DECIMAL": "COMP-3",
+    "BINARY": "COMP",
+    "COMP-4": "COMP",
+}
+
+
+class Picture:
+    __slots__ = ("category", "size", "digits", "storage_digits", "scale", "signed")
+
+    def __init__(self, category: str, size: int, digits: int, scale: int, signed: bool,
+                 storage_digits: Optional[int] = None):
+        self.category = category  # "numeric", "alphanumeric" or "edited"
+        self.size = size          # display characters
+        self.digits = digits      # including P scaling positions
+        # Digits actually stored, which size COMP and COMP-3 items
+        self.storage_digits = digits if storage_digits is None else storage_digits
+        self.scale = scale
+        self.signed = signed
+
+
+@lru_cache(maxsize=4096)
+def parse_picture(picture: str) -> Picture:
+    """Expand a PICTURE string such as S9(5)V99 or X(10)."""
+    expanded = PIC_REPEAT.sub(lambda m: m.group(1) * int(m.group(2)), picture.upper())
+    signed = expanded.startswith("S")
+    size = digits = storage_digits = scale = 0
+    after_point = False
+    numeric = True
+    for c in expanded:
+        if c == "S":
+            continue
+        if c == "V":
+            after_point = True
+            continue
+        if c == "P":
+            # Scaling position: counts as a digit but takes no storage
+            digits += 1
+            continue
+        size += 1
+        if c == "9":
+            digits += 1
+            storage_digits += 1
+            if after_point:
+                scale += 1
+        elif c == ".":
+            after_point = True
+            numeric = False
+        else:
+            numeric = False
+    if numeric:
+        category = "numeric"
+    elif set(expanded) <= set("AX9"):
+        category = "alphanumeric"
+    else:
+        category = "edited"
+    return Picture(category, size, digits, scale, signed, storage_digits)
+
+
+def storage_size(picture: Optional[str], usage: str, sign: Optional[str] = None) -> int:
+    """Bytes taken by one occurrence of an elementary item."""
+    if usage in ("COMP-1", "INDEX", "POINTER"):
+        return 4
+    if usage == "COMP-2":
+        return 8
+    if not picture:
+        return 0
+    pic = parse_picture(picture)
+    if usage == "COMP-3":
+        return pic.storage_digits // 2 + 1
+    if usage in ("COMP", "COMP-5"):
+        if pic.storage_digits <= 4:
+            return 2
+        if pic.storage_digits <= 9:
+            return 4
+        return 8
+    if sign and sign.endswith("SEPARATE"):
+        return pic.size + 1
+    return pic.size
+
+
+class Field:
+    __slots__ = ("level", "name", "picture", "usage", "sign", "occurs", "depending_on", "redefines",
+                 "offset", "length", "children", "conditions")
+
+    def __init__(self, entry: Dict[str, Any], usage: str):
+        self.level = int(entry["level"])
+        self.name = entry["name"]
+        self.picture = entry.get("picture")
+        self.usage = usage
+        self.sign = entry.get("sign")
+        self.occurs = entry.get("occurs", 1)
+        self.depending_on = entry.get("depending_on")
+        self.redefines = entry.get("redefines")
+        self.offset = 0
+        # Length of one occurrence; the item spans length * occurs bytes
+        self.length = 0
+        self.children: List["Field"] = []
+        self.conditions: List[Dict[str, Any]] = []
+
+    @property
+    def size(self) -> int:
+        return self.length * self.occurs
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "level": self.level,
+            "name": self.name,
+            "offset": self.offset,
+            "length": self.length,
+        }
+        if self.picture:
+            out["picture"] = self.picture
+            out["usage"] = self.usage
+            if self.sign:
+                out["sign"] = self.sign
+        if self.occurs != 1 or self.depending_on:
+            out["occurs"] = self.occurs
+            if self.depending_on:
+                out["depending_on"] = self.depending_on
+        if self.redefines:
+            out["redefines"] = self.redefines
+        if self.conditions:
+            out["conditions"] = self.conditions
+        if self.children:
+            out["children"] = [child.to_dict() for child in self.children]
+        return out
+
+
+def _usage_of(entry: Dict[str, Any], inherited: str) -> str:
+    usage = entry.get("usage")
+    if not usage:
+        return inherited
+    usage = usage.upper()
+    return USAGE_ALIASES.get(usage, usage)
+
+
+def build_record(entries: List[Dict[str, Any]]) -> Field:
+    """Build the tree for one record; `entries[0]` is its 01 or 77 entry."""
+    root = Field(entries[0], _usage_of(entries[0], "DISPLAY"))
+    stack = [root]
+    for entry in entries[1:]:
+        level = int(entry["level"])
+        if level == CONDITION_LEVEL:
+            stack[-1].conditions.append({"name": entry["name"], "values": entry.get("values", [])})
+            continue
+        if level == RENAMES_LEVEL:
+            continue
+        while len(stack) > 1 and stack[-1].level >= level:
+            stack.pop()
+        parent = stack[-1]
+        field = Field(entry, _usage_of(entry, parent.usage))
+        parent.children.append(field)
+        stack.append(field)
+    _assign_offsets(root, 0)
+    return root
+
+
+def _assign_offsets(field: Field, offset: int):
+    field.offset = offset
+    if not field.children:
+        field.length = storage_size(field.picture, field.usage, field.sign)
+        return
+    cursor = offset
+    end = offset
+    placed: Dict[str, Field] = {}
+    for child in field.children:
+        target = placed.get(child.redefines.upper()) if child.redefines else None
+        start = target.offset if target is not None else cursor
+        _assign_offsets(child, start)
+        if target is None:
+            cursor = start + child.size
+            placed[child.name.upper()] = child
+        end = max(end, start + child.size)
+    field.length = end - offset
+
+
+def _record_key(entries: List[Dict[str, Any]]) -> Tuple:
+    return tuple(
+        (e["level"], e["name"], e.get("picture"), e.get("usage"), e.get("occurs"),
+         e.get("depending_on"), e.get("redefines"), e.get("sign"), e.get("value") if e["level"] == "88" else None)
+        for e in entries
+    )
+
+
+def split_records(entries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group data entries into records, each starting at an 01 or 77 level.
+    Entries before the first record (or 66 RENAMES at the top) are dropped."""
+    records: List[List[Dict[str, Any]]] = []
+    for entry in entries:
+        if not entry.get("level", "").isdigit():
+            continue
+        level = int(entry["level"])
+        if level in (1, INDEPENDENT_LEVEL):
+            records.append([entry])
+        elif records:
+            records[-1].append(entry)
+    return records
+
+
+class DataLayout:
+    """Lays out records, keeping up to `max_records` layouts keyed by the
+    record's entries so identical records (shared copybooks) are reused."""
+
+    def __init__(self, max_records: int = 4096):
+        self.max_records = max_records
+        self.hits = 0
+        self.misses = 0
+        self._records: "OrderedDict[Tuple, Field]" = OrderedDict()
+
+    def record(self, entries: List[Dict[str, Any]]) -> Field:
+        key = _record_key(entries)
+        field = self._records.get(key)
+        if field is not None:
+            self._records.move_to_end(key)
+            self.hits += 1
+            return field
+        self.misses += 1
+        field = self._records[key] = build_record(entries)
+        if len(self._records) > self.max_records:
+            self._records.popitem(last=False)
+        return field
+
+    def records(self, entries: List[Dict[str, Any]]) -> List[Field]:
+        return [self.record(group) for group in split_records(entries)]
+
+
+def record_entries(parser) -> List[Dict[str, Any]]:
+    """The data entries of a parsed program, or of a bare copybook, which has
+    no DATA DIVISION header for the parser to find them under."""
+    entries = parser.parsed_data["data_division"]
+    if not entries:
+        entries = []
+        for _, line in parser.clean_lines():
+            entry = parser._parse_data_entry(line.strip())
+            if entry:
+                entries.append(entry)
+    return entries
+
+
+def main(argv: Optional[List[str]] = None):
+    from cobolparser import CobolParser
+    from copybook import CopybookLibrary, search_paths_from_env
+
+    ap = argparse.ArgumentParser(description="Print the storage layout of each DATA DIVISION record.")
+    ap.add_argument("filename")
+    ap.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    ap.add_argument("-I", "--copybook-path", action="append", default=None,
+                    help="expand COPY statements from copybooks in this directory; repeatable (default: $COBCPY)")
+    args = ap.parse_args(argv)
+
+    search_paths = args.copybook_path or search_paths_from_env()
+    parser = CobolParser(args.filename, copybooks=CopybookLibrary(search_paths) if search_paths else None)
+    parser.parse()
+    layouts = [record.to_dict() for record in DataLayout().records(record_entries(parser))]
+    text = json.dumps(layouts, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Streaming multipart/form-data reader.
+
+    reader = MultipartReader(rfile, boundary, content_length)
+    for part in reader:
+        if part.name == "file":
+            data = part.read(limit)
+        # unread part bodies are skipped
+
+Reads the request body in chunks straight off the socket, so a part is
+only held in memory when the caller asks for it, and never reads past
+`content_length`.
+"""
+from email.message import Message
+from typing import BinaryIO, Dict, Iterator, Optional
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class MultipartError(ValueError):
+    pass
+
+
+def form_boundary(content_type: Optional[str]) -> Optional[bytes]:
+    """The boundary of a multipart/form-data Content-Type, else None."""
+    message = Message()
+    message["Content-Type"] = content_type or ""
+    boundary = message.get_param("boundary")
+    if message.get_content_type() != "multipart/form-data" or not isinstance(boundary, str) or not boundary:
+        return None
+    return boundary.encode("latin-1")
+
+
+class Part:
+    def __init__(self, reader: "MultipartReader", headers: Dict[str, str]):
+        self._reader = reader
+        self.headers = headers
+        message = Message()
+        message["Content-Disposition"] = headers.get("content-disposition", "")
+        self.name: Optional[str] = message.get_param("name", header="content-disposition")
+        self.filename: Optional[str] = message.get_filename()
+        self.content_type = headers.get("content-type", "text/plain")
+        self.done = False
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """The part body, chunk by chunk, as it arrives."""
+        if self.done:
+            return
+        yield from self._reader._body_chunks()
+        self.done = True
+
+    def read(self, limit: Optional[int] = None) -> bytes:
+        """The whole body; MultipartError if it is longer than `limit`."""
+        data = bytearray()
+        for chunk in self.iter_chunks():
+            data += chunk
+            if limit is not None and len(data) > limit:
+                raise MultipartError(f"part {self.name!r} exceeds {limit} bytes")
+        return bytes(data)
+
+    def drain(self):
+        for _ in self.iter_chunks():
+            pass
+
+
+class MultipartReader:
+    def __init__(self, stream: BinaryIO, boundary: bytes, content_length: int, chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.remaining = content_length
+        self.chunk_size = chunk_size
+        self.delimiter = b"\r\n--" + boundary
+        # Leading CRLF so the first boundary matches like the others
+        self.buffer = bytearray(b"\r\n")
+        self.finished = False
+
+    def _fill(self) -> bool:
+        if self.remaining <= 0:
+            return False
+        chunk = self.stream.read(min(self.chunk_size, self.remaining))
+        if not chunk:
+            raise MultipartError("request body ended early")
+        self.remaining -= len(chunk)
+        self.buffer += chunk
+        return True
+
+    def _read_until(self, marker: bytes, limit: int) -> bytes:
+        while True:
+            pos = self.buffer.find(marker)
+            if pos >= 0:
+                data = bytes(self.buffer[:pos])
+                del self.buffer[:pos + len(marker)]
+                return data
+            if len(self.buffer) > limit or not self._fill():
+                raise MultipartError("malformed multipart body")
+
+    def _body_chunks(self) -> Iterator[bytes]:
+        """Yield body bytes up to the next delimiter, which is consumed."""
+        keep = len(self.delimiter) - 1
+        while True:
+            pos = self.buffer.find(self.delimiter)
+            if pos >= 0:
+                if pos:
+                    yield bytes(self.buffer[:pos])
+                del self.buffer[:pos + len(self.delimiter)]
+                self._after_delimiter()
+                return
+            # Everything but a possible partial delimiter at the end is body
+            if len(self.buffer) > keep:
+                yield bytes(self.buffer[:-keep])
+                del self.buffer[:-keep]
+            if not self._fill():
+                raise MultipartError("missing closing boundary")
+
+    def _after_delimiter(self):
+        while len(self.buffer) < 2 and self._fill():
+            pass
+        if self.buffer[:2] == b"--":
+            self.finished = True
+            # Ignore the epilogue without reading it into memory
+            self.buffer.clear()
+            return
+        self._read_until(b"\r\n", MAX_HEADER_BYTES)
+
+    def __iter__(self) -> Iterator[Part]:
+        # Skip the preamble up to the first boundary
+        for _ in self._body_chunks():
+            pass
+        while not self.finished:
+            raw = self._read_until(b"\r\n\r\n", MAX_HEADER_BYTES)
+            headers: Dict[str, str] = {}
+            for line in raw.split(b"\r\n"):
+                if b":" in line:
+                    key, value = line.split(b":", 1)
+                    headers[key.strip().lower().decode("latin-1")] = value.strip().decode("utf-8", "replace")
+            part = Part(self, headers)
+            yield part
+            part.drain()
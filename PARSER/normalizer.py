@@ -0,0 +1,247 @@
+"""Source buffer and line normalizer.
+
+The decoded source is held as one string; lines are found lazily and
+described by (start, end) offsets into it, so nothing is copied until a
+caller asks for the text. `clean_spans` yields the code-bearing part of each
+line as (line_num, text, start, end), where `text[start:end]` is the content.
+`text` is the shared buffer except for FIXED-format lines continued with a
+`-` indicator, which are joined into a new string. `stream_clean_spans` does
+the same for a text stream, holding about one block of it at a time.
+"""
+import mmap
+import re
+from typing import Any, Callable, Iterator, List, Optional, TextIO, Tuple
+
+NONBLANK = re.compile(r'\S')
+# Columns (0-based) of the FIXED-format indicator and the end of area B
+INDICATOR_COLUMN = 6
+AREA_B_END = 72
+# Characters read from a stream at a time by stream_clean_spans
+BLOCK_SIZE = 1 << 20
+
+# (line number, buffer, start, end) of one cleaned line
+Span = Tuple[int, str, int, int]
+
+
+class SourceBuffer:
+    """Decoded source text with lazily indexed line boundaries.
+
+    Line endings are normalized to "\\n" the way text-mode reading does, so
+    line i matches the i-th line of the file read with readlines().
+    """
+
+    def __init__(self, text: str):
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        self.text = text
+        # Start offset of every line found so far
+        self._starts: List[int] = [0] if text else []
+        self._complete = not text
+
+    @classmethod
+    def from_bytes(cls, data, encoding: str = "utf-8",
+                   decode: Optional[Callable[[Any], str]] = None) -> "SourceBuffer":
+        """`decode` (e.g. sniff.SourceSniff.decode) replaces decoding with
+        `encoding`."""
+        if decode is not None:
+            return cls(decode(data))
+        return cls(str(data, encoding, "replace"))
+
+    @classmethod
+    def from_path(cls, path: str, encoding: str = "utf-8",
+                  decode: Optional[Callable[[Any], str]] = None) -> "SourceBuffer":
+        """Decode a file straight from a memory map, without reading it into
+        an intermediate bytes object."""
+        with open(path, "rb") as f:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return cls.from_bytes(mm, encoding, decode)
+            except ValueError:
+                # Empty files cannot be mapped
+                return cls("")
+
+    def _index_to(self, line: int) -> bool:
+        """Find line starts up to `line`; False if the text has fewer lines."""
+        starts = self._starts
+        text = self.text
+        while len(starts) <= line and not self._complete:
+            nl = text.find("\n", starts[-1])
+            if nl < 0 or nl + 1 == len(text):
+                self._complete = True
+            else:
+                starts.append(nl + 1)
+        return line < len(starts)
+
+    def __len__(self) -> int:
+        if not self.text:
+            return 0
+        return self.text.count("\n") + (0 if self.text.endswith("\n") else 1)
+
+    def line_spans(self, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int, int]]:
+        """(line index, start, end) of lines[start:end]; `end` excludes the newline."""
+        if not self._index_to(start):
+            return
+        text = self.text
+        starts = self._starts
+        pos = starts[start]
+        i = start
+        while end is None or i < end:
+            nl = text.find("\n", pos)
+            stop = nl if nl >= 0 else len(text)
+            yield i, pos, stop
+            if nl < 0 or nl + 1 == len(text):
+                self._complete = True
+                return
+            pos = nl + 1
+            i += 1
+            if i == len(starts):
+                starts.append(pos)
+
+    def offset(self, line: int) -> int:
+        """Offset where line `line` starts (the text length past the end)."""
+        if not self._index_to(line):
+            return len(self.text)
+        return self._starts[line]
+
+    def line(self, index: int) -> str:
+        """Line `index` including its newline, as readlines() would return it."""
+        if not self._index_to(index):
+            raise IndexError(index)
+        start = self._starts[index]
+        nl = self.text.find("\n", start)
+        return self.text[start:] if nl < 0 else self.text[start:nl + 1]
+
+    def lines(self) -> List[str]:
+        parts = self.text.split("\n")
+        last = parts.pop()
+        lines = [p + "\n" for p in parts]
+        if last:
+            lines.append(last)
+        return lines
+
+
+def _open_quote(text: str) -> Optional[str]:
+    """The quote character of a literal left open at the end of `text`."""
+    quote = None
+    for c in text:
+        if quote is None:
+            if c == "'" or c == '"':
+                quote = c
+        elif c == quote:
+            quote = None
+    return quote
+
+
+def clean_spans(buffer: SourceBuffer, fixed: bool, start: int = 0, end: Optional[int] = None) -> Iterator[Span]:
+    """Strip comments and margins from lines[start:end], lazily.
+
+    FIXED format keeps columns 8-72 and drops `*` and `/` comment lines; a
+    `-` in column 7 continues the previous line: a continued literal resumes
+    after the continuation line's opening quote (the continued line counts
+    as running to column 72), anything else is joined at its first nonblank
+    character. FREE format drops `*>` comments. Blank results are skipped.
+    """
+    text = buffer.text
+    nonblank = NONBLANK.search
+    if not fixed:
+        for i, s, e in buffer.line_spans(start, end):
+            comment = text.find("*>", s, e)
+            if comment >= 0:
+                e = comment
+            if nonblank(text, s, e):
+                yield i + 1, text, s, e
+        return
+
+    # The logical line being built; it is only yielded once the next line
+    # shows it is not continued. `width` is its last physical line's width.
+    p_num = 0
+    p_text = text
+    p_start = p_end = width = 0
+    pending = False
+    find = text.find
+    size = len(text)
+    s = buffer.offset(start)
+    i = start - 1
+    while s < size:
+        i += 1
+        if end is not None and i >= end:
+            break
+        e = find("\n", s)
+        if e < 0:
+            e = size
+        line_start, s = s, e + 1
+        if e - line_start <= INDICATOR_COLUMN:
+            continue
+        indicator = text[line_start + INDICATOR_COLUMN]
+        if indicator == "*" or indicator == "/":
+            continue
+        cs = line_start + INDICATOR_COLUMN + 1
+        ce = line_start + AREA_B_END
+        if ce > e:
+            ce = e
+        if not nonblank(text, cs, ce):
+            continue
+        if indicator == "-" and pending:
+            prev = p_text[p_start:p_end]
+            body = text[cs:ce].lstrip()
+            quote = _open_quote(prev)
+            if quote and body[:1] == quote:
+                prev += " " * (AREA_B_END - INDICATOR_COLUMN - 1 - width)
+                p_text = prev + body[1:]
+            else:
+                p_text = prev.rstrip() + body
+            p_start, p_end, width = 0, len(p_text), ce - cs
+            continue
+        if pending:
+            yield p_num, p_text, p_start, p_end
+        p_num, p_text, p_start, p_end, width = i + 1, text, cs, ce, ce - cs
+        pending = True
+    if pending:
+        yield p_num, p_text, p_start, p_end
+
+
+def _logical_line_start(text: str, end: int) -> int:
+    """Offset of the last line in text[:end] (which ends with a newline) that
+    starts a FIXED-format logical line: not a comment, blank or continuation.
+    Cleaning the text before it cannot depend on anything after it. 0 if
+    there is no such line."""
+    nonblank = NONBLANK.search
+    pos = end
+    while pos > 0:
+        start = text.rfind("\n", 0, pos - 1) + 1
+        line_end = pos - 1
+        if line_end - start > INDICATOR_COLUMN and text[start + INDICATOR_COLUMN] not in "-*/" \
+                and nonblank(text, start + INDICATOR_COLUMN + 1, min(start + AREA_B_END, line_end)):
+            return start
+        pos = start
+    return 0
+
+
+def stream_clean_spans(fp: TextIO, fixed: bool, head: str = "", block_size: int = BLOCK_SIZE) -> Iterator[Span]:
+    """`clean_spans` over a text stream, read `block_size` characters at a
+    time. `head` is text already read from `fp` (e.g. for format detection).
+
+    Each block is cut at a line boundary (in FIXED format, before a line
+    that starts a logical line, so continuations are never split) and the
+    remainder is carried into the next block. Line numbers count from the
+    start of `head`.
+    """
+    carry = head
+    base = 0
+    while True:
+        data = fp.read(block_size)
+        text = carry + data if carry else data
+        if not data:
+            if text:
+                for line_num, span_text, s, e in clean_spans(SourceBuffer(text), fixed):
+                    yield line_num + base, span_text, s, e
+            return
+        end = text.rfind("\n") + 1
+        cut = _logical_line_start(text, end) if fixed else end
+        if cut == 0:
+            carry = text
+            continue
+        for line_num, span_text, s, e in clean_spans(SourceBuffer(text[:cut]), fixed):
+            yield line_num + base, span_text, s, e
+        base += text.count("\n", 0, cut)
+        carry = text[cut:]
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class ParseCache:
+    """On-disk store of parse results keyed by content hash.
+
+    Keys are the SHA-256 of the parser version plus the raw source bytes, so
+    a result is reused only for byte-identical input parsed by the same
+    parser version. Entries are compact JSON files sharded by the first two
+    hex digits of the key. When the store grows past `max_bytes` or
+    `max_entries`, the least recently used entries (by file mtime, which
+    `get` refreshes) are removed.
+    """
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+                 max_entries: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._total_bytes = 0
+
+    @staticmethod
+    def key(source: bytes, version: str) -> str:
+        digest = hashlib.sha256(version.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def _load_index(self):
+        """Scan the store once, oldest entries first."""
+        entries = []
+        if os.path.isdir(self.directory):
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith(".json"):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, entry.name[:-5], st.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(size for _, _, size in entries)
+
+    def _touch(self, key: str, size: int):
+        if self._index is None:
+            self._load_index()
+        if key in self._index:
+            self._total_bytes -= self._index[key]
+        self._index[key] = size
+        self._index.move_to_end(key)
+        self._total_bytes += size
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = json.loads(f.read())
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self._index is not None:
+            self._touch(key, os.path.getsize(path))
+        return data
+
+    def put(self, key: str, data: Dict[str, Any]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        # Write to a temp file and rename so concurrent readers never see a
+        # partially written entry.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._touch(key, len(payload))
+        self._evict()
+
+    def _evict(self):
+        while self._index and (
+            (self.max_bytes is not None and self._total_bytes > self.max_bytes)
+            or (self.max_entries is not None and len(self._index) > self.max_entries)
+        ):
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        if self._index is None:
+            self._load_index()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._index),
+            "bytes": self._total_bytes,
+        }
+
+
+_caches: Dict[str, ParseCache] = {}
+
+
+def get_cache(directory: str, max_bytes: Optional[int] = DEFAULT_MAX_BYTES) -> ParseCache:
+    """Process-wide ParseCache for `directory`, so its counters accumulate."""
+    cache = _caches.get(directory)
+    if cache is None:
+        cache = _caches[directory] = ParseCache(directory, max_bytes=max_bytes)
+    return cache
@@ -0,0 +1,196 @@
+"""Optional parse instrumentation.
+
+    profile = ParseProfile()
+    CobolParser(path, profile=profile).parse()
+    json.dumps(profile.to_dict())
+
+Phases are timed at their boundaries only, and statement statistics are
+gathered from finished paragraphs, so the parser runs the same code with or
+without a profile; without one the cost is a None check per phase.
+"""
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# In the order a full parse runs them
+PHASES = ("cache_lookup", "read", "detect_format", "clean_lines", "divisions", "tokenize", "parse_statements")
+# Percentiles of a timing are taken over its most recent samples
+TIMING_WINDOW = 1024
+
+
+def phase(profile: Optional["ParseProfile"], name: str):
+    """`profile.phase(name)`, or a no-op context when not profiling."""
+    return profile.phase(name) if profile is not None else nullcontext()
+
+
+def max_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class ParseProfile:
+    """Timings and counts for one parse.
+
+    With `memory=True`, tracemalloc runs between start() and stop() and the
+    peak traced allocation is reported; it slows the parse down noticeably,
+    so the phase times of such a run are not comparable to others.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.phases: Dict[str, float] = {}
+        self.counters: Counter = Counter()
+        self.statement_types: Counter = Counter()
+        self.verbs: Counter = Counter()
+        self.max_depth = 0
+        self.cache_hit: Optional[bool] = None
+        self.total_seconds = 0.0
+        self.peak_traced_bytes: Optional[int] = None
+        self._started: Optional[float] = None
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start()
+        self._started = time.perf_counter()
+
+    def stop(self):
+        if self._started is None:
+            return
+        self.total_seconds += time.perf_counter() - self._started
+        self._started = None
+        if self.memory:
+            self.peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def paragraph(self, statements: List[Dict[str, Any]]):
+        """Count the statements of a finished paragraph by type (and by verb
+        for generic statements) and track the deepest nesting."""
+        from cobolparser import nested_blocks  # cobolparser imports this module
+
+        self.counters["paragraphs"] += 1
+        pending = [(statements, 1)]
+        while pending:
+            block, depth = pending.pop()
+            if block and depth > self.max_depth:
+                self.max_depth = depth
+            for stmt in block:
+                kind = stmt.get("type")
+                self.statement_types[kind] += 1
+                if kind == "STATEMENT":
+                    self.verbs[stmt.get("verb")] += 1
+                pending.extend((nested, depth + 1) for nested in nested_blocks(stmt))
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "total_seconds": self.total_seconds,
+            "phases": {name: self.phases[name] for name in PHASES if name in self.phases},
+        }
+        for name in ("lines", "data_entries", "tokens", "paragraphs"):
+            data[name] = self.counters[name]
+        data["statements"] = sum(self.statement_types.values())
+        data["statement_types"] = dict(self.statement_types.most_common())
+        data["verbs"] = dict(self.verbs.most_common())
+        data["max_depth"] = self.max_depth
+        if self.cache_hit is not None:
+            data["cache_hit"] = self.cache_hit
+        data["max_rss_kb"] = max_rss_kb()
+        if self.peak_traced_bytes is not None:
+            data["peak_traced_bytes"] = self.peak_traced_bytes
+        return data
+
+
+class MetricsRegistry:
+    """Thread-safe running totals, e.g. for the server's /metrics.
+
+    Counters are flat names; add_profile() folds in a ParseProfile.to_dict()
+    from any process, summing times and counts and keeping maxima. observe()
+    records samples of a timing, reported as count, total, mean, maximum and
+    percentiles of the last TIMING_WINDOW samples.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Counter = Counter()
+        self.phases: Counter = Counter()
+        self.statement_types: Counter = Counter()
+        self.verbs: Counter = Counter()
+        self.maxima: Dict[str, float] = {}
+        self.timings: Dict[str, Dict[str, Any]] = {}
+        self.started = time.time()
+
+    def incr(self, name: str, n: float = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def observe_max(self, name: str, value: Optional[float]):
+        with self._lock:
+            self._set_max(name, value)
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = {"count": 0, "total": 0.0, "max": 0.0,
+                                               "recent": deque(maxlen=TIMING_WINDOW)}
+            timing["count"] += 1
+            timing["total"] += value
+            timing["max"] = max(timing["max"], value)
+            timing["recent"].append(value)
+
+    def _timing_summary(self, timing: Dict[str, Any]) -> Dict[str, float]:
+        recent = sorted(timing["recent"])
+        summary = {"count": timing["count"], "total": timing["total"],
+                   "mean": timing["total"] / timing["count"], "max": timing["max"]}
+        for pct in (50, 90, 99):
+            summary[f"p{pct}"] = recent[min(len(recent) - 1, len(recent) * pct // 100)]
+        return summary
+
+    def _set_max(self, name: str, value: Optional[float]):
+        if value is not None and (name not in self.maxima or value > self.maxima[name]):
+            self.maxima[name] = value
+
+    def add_profile(self, profile: Dict[str, Any]):
+        with self._lock:
+            self.counters["profiled_parses"] += 1
+            self.counters["profiled_seconds"] += profile["total_seconds"]
+            for name in ("lines", "data_entries", "tokens", "paragraphs", "statements"):
+                self.counters[name] += profile[name]
+            if profile.get("cache_hit"):
+                self.counters["parse_cache_hits"] += 1
+            self.phases.update(profile["phases"])
+            self.statement_types.update(profile["statement_types"])
+            self.verbs.update(profile["verbs"])
+            for name in ("max_depth", "max_rss_kb", "peak_traced_bytes"):
+                self._set_max(name, profile.get(name))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "uptime_seconds": time.time() - self.started,
+                "counters": dict(sorted(self.counters.items())),
+                "phases": dict(self.phases),
+                "statement_types": dict(self.statement_types.most_common()),
+                "verbs": dict(self.verbs.most_common(50)),
+                "max": dict(self.maxima),
+                "timings": {name: self._timing_summary(timing) for name, timing in sorted(self.timings.items())},
+            }
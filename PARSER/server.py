@@ -1,87 +1,983 @@
 import http.server
-import socketserver
+import argparse
+import gzip
+import hashlib
+import io
+import multiprocessing
 import os
-import subprocess
 import json
-import cgi
-import sys
+import math
+import signal
+import tarfile
+import threading
+import time
+import zipfile
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, TimeoutError as FutureTimeout, wait
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit, parse_qs
+
+from cobolparser import PARSER_VERSION, CobolParser, iterparse
+from json_stream import NdjsonWriter, dumps, write_events
+from multipart import MultipartError, MultipartReader, form_boundary
+from parse_cache import ParseCache, get_cache
+from profiling import MetricsRegistry, ParseProfile
+from symbol_index import DEFAULT_DB, SymbolIndex
 
 PORT = 8000
+CACHE_DIR = os.environ.get("COBOL_PARSE_CACHE", ".parse_cache")
+SYMBOL_DB = DEFAULT_DB
+# Parses run in this many worker processes, one at a time each; further
+# requests wait in a queue of at most MAX_QUEUE, past which they get 429.
+WORKERS = int(os.environ.get("COBOL_PARSE_WORKERS", "0")) or os.cpu_count() or 1
+MAX_QUEUE = int(os.environ.get("COBOL_MAX_QUEUE", "0")) or WORKERS * 4
+# Longest a request may spend queued plus parsing; clients can ask for less
+# with an X-Parse-Timeout header
+PARSE_TIMEOUT = float(os.environ.get("COBOL_PARSE_TIMEOUT", "120"))
+# On SIGTERM/SIGINT, requests already being handled get this long to finish
+DRAIN_TIMEOUT = float(os.environ.get("COBOL_DRAIN_TIMEOUT", "30"))
+UPLOAD_NAME = "upload.cbl"
+# "1" to profile every parse into /metrics, "memory" to trace peak memory too
+PROFILE = os.environ.get("COBOL_PROFILE", "").lower()
+PROFILING = PROFILE not in ("", "0")
+# Uploads larger than this are refused before any of the body is read
+MAX_UPLOAD_BYTES = int(os.environ.get("COBOL_MAX_UPLOAD_BYTES", str(32 * 1024 * 1024)))
+# Same for a whole /parse/batch request; each member is still held to MAX_UPLOAD_BYTES
+MAX_BATCH_BYTES = int(os.environ.get("COBOL_MAX_BATCH_BYTES", str(256 * 1024 * 1024)))
+# /parse/stream sends what it has at least this often
+STREAM_FLUSH_SECONDS = 0.1
+STREAM_FLUSH_BYTES = 64 * 1024
+# How often a /parse/stream request checks its worker is still alive
+STREAM_CHECK_SECONDS = 1.0
+# Connections being served at once; further ones wait in the listen backlog
+MAX_CONNECTIONS = int(os.environ.get("COBOL_MAX_CONNECTIONS", "64"))
+# Static files up to this size are kept in memory with their gzip form
+STATIC_CACHE_MAX = 1024 * 1024
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Recent /parse responses (all encodings) kept in memory, by content hash
+RESULT_CACHE_BYTES = int(os.environ.get("COBOL_RESULT_CACHE_BYTES", str(256 * 1024 * 1024)))
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+COMPRESSORS = {
+    "gzip": lambda body: gzip.compress(body, 6),
+    "deflate": lambda body: zlib.compress(body, 6),
+}
+try:
+    import brotli
+    COMPRESSORS = {"br": lambda body: brotli.compress(body, quality=5), **COMPRESSORS}
+except ImportError:
+    pass
+
+# Parsed once by each worker as it starts, so the first upload it gets does
+# not pay for imports and compiled patterns
+WARMUP_SOURCE = b"""\
+       IDENTIFICATION DIVISION.
+       PROGRAM-ID. WARMUP.
+       DATA DIVISION.
+       WORKING-STORAGE SECTION.
+       01  WS-COUNT                PIC 9(4) VALUE ZERO.
+       PROCEDURE DIVISION.
+       MAIN-PARA.
+           IF WS-COUNT > 0
+               MOVE ZERO TO WS-COUNT
+           END-IF
+           PERFORM UNTIL WS-COUNT > 1
+               ADD 1 TO WS-COUNT
+           END-PERFORM
+           STOP RUN.
+"""
+_static = {}
+_static_lock = threading.Lock()
+
+
+class ResultCache:
+    """In-memory LRU of /parse responses keyed by content hash. Each entry
+    holds the JSON body and any compressed forms made from it; the least
+    recently used entries go once the total passes `max_bytes`."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def get(self, key, encoding="identity"):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry.get(encoding)
+
+    def put(self, key, body, encoding="identity"):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            entry = self._entries.setdefault(key, {})
+            self._entries.move_to_end(key)
+            self._bytes += len(body) - len(entry.get(encoding, b""))
+            entry[encoding] = body
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= sum(len(b) for b in evicted.values())
+
+
+_results = ResultCache(RESULT_CACHE_BYTES)
+metrics = MetricsRegistry()
+# Paths counted separately in /metrics; anything else is "other"
+ROUTES = ("/visualizer.html", "/parse", "/parse/batch", "/parse/stream", "/symbols", "/metrics")
+
+
+def choose_encoding(accept, available=COMPRESSORS):
+    """The content coding in `available` the Accept-Encoding header rates
+    highest (ties go to the order of `available`), or None for identity."""
+    ratings = {}
+    for item in (accept or "").split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        ratings[coding.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = ratings.get(coding, ratings.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def result_etag(key):
+    return f'"{key[:32]}"'
+
+
+def parse_source(name, source, cache_dir, profile_mode=""):
+    """Runs in a pool worker: parse uploaded bytes into the JSON response
+    body. Returns (body, profile dict or None)."""
+    profile = ParseProfile(memory=profile_mode == "memory") if profile_mode else None
+    parser = CobolParser(name, source=source, cache=get_cache(cache_dir) if cache_dir else None, profile=profile)
+    parser.parse()
+    return dumps(parser.parsed_data).encode(), profile.to_dict() if profile is not None else None
+
+
+def finish_parse(result):
+    """Count a worker's (body, profile) in the metrics and return the body."""
+    body, profile = result
+    metrics.incr("parses")
+    if profile is not None:
+        metrics.add_profile(profile)
+    return body
+
+
+def stream_source(name, source, conn):
+    """Runs in a pool worker: send NDJSON records for `source` over `conn`
+    as iterparse produces them, then an empty message. Once the receiving
+    end is closed (client gone, deadline passed) the parse stops at the
+    next send, freeing the worker."""
+    out = io.StringIO()
+    writer = NdjsonWriter(out)
+    flushed = time.monotonic()
+    try:
+        try:
+            for event in iterparse(name, source=source):
+                write_events(writer, (event,))
+                if out.tell() >= STREAM_FLUSH_BYTES or time.monotonic() - flushed >= STREAM_FLUSH_SECONDS:
+                    conn.send_bytes(out.getvalue().encode())
+                    out.seek(0)
+                    out.truncate()
+                    flushed = time.monotonic()
+        except (BrokenPipeError, ConnectionResetError):
+            raise
+        except (Exception, SystemExit) as e:
+            out.write(json.dumps({"kind": "error", "error": f"{type(e).__name__}: {e}"}) + "\n")
+        if out.tell():
+            conn.send_bytes(out.getvalue().encode())
+        conn.send_bytes(b"")
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    finally:
+        conn.close()
+
+
+def warm_worker():
+    """Pool initializer: one small parse, so a fresh worker is ready for
+    real uploads."""
+    CobolParser("warmup.cbl", source=WARMUP_SOURCE).parse()
+
+
+class Overloaded(Exception):
+    """A request turned away by the parse queue: `status` is 429 when the
+    queue is full and 503 when the request cannot be served before its
+    deadline or the server is shutting down. `retry_after` is the expected
+    wait in seconds."""
+
+    def __init__(self, status, message, retry_after=0.0):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ParsePool:
+    """The parser worker processes and the queue of requests waiting for
+    them.
+
+    At most `workers` parses run at once, one per worker, so a request's
+    time splits into its wait in the queue and its parse, and both go to
+    /metrics. Requests are served in arrival order. A request is turned
+    away at once when `max_queue` are already waiting (429), or when its
+    place in the queue times the recent average parse time is past its
+    deadline (503); one whose deadline passes while queued gets 503 too.
+
+    A parse that outlives its request's deadline cannot be interrupted;
+    its worker counts as busy until it finishes.
+    """
+
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = deque()
+        # Moving average of recent parse times, for the expected wait
+        self._parse_seconds = 0.0
+
+    def executor(self):
+        with self._cond:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_worker)
+            return self._executor
+
+    def reset(self, executor):
+        """A worker died (e.g. out of memory); start fresh workers next time."""
+        with self._cond:
+            if self._executor is executor:
+                self._executor = None
+
+    def start(self):
+        """Start every worker now and wait until each has warmed up."""
+        executor = self.executor()
+        # Submitted together, so no worker is idle and each one starts
+        for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self, wait=True):
+        """Stop the workers once their parses finish, or, without `wait`,
+        kill them now."""
+        with self._cond:
+            executor, self._executor = self._executor, None
+        if not wait:
+            for child in multiprocessing.active_children():
+                child.terminate()
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self):
+        with self._cond:
+            return {"workers": self.workers, "running": self._running, "queued": len(self._waiting),
+                    "max_queue": self.max_queue, "average_parse_seconds": self._parse_seconds,
+                    "expected_wait_seconds": self._expected_wait()}
+
+    def _expected_wait(self):
+        if self._running < self.workers and not self._waiting:
+            return 0.0
+        return (len(self._waiting) // self.workers + 1) * self._parse_seconds
+
+    def _refusal(self, deadline):
+        wait = self._expected_wait()
+        if len(self._waiting) >= self.max_queue:
+            return Overloaded(429, f"Parse queue is full ({self.max_queue} waiting)", wait)
+        if deadline is not None and wait > deadline - time.monotonic():
+            return Overloaded(503, f"Parse queue cannot start this before its deadline (about {wait:.1f}s wait)", wait)
+        return None
+
+    def check(self, deadline=None):
+        """The Overloaded a request arriving now would get, or None."""
+        with self._cond:
+            return self._refusal(deadline)
+
+    def acquire(self, deadline, shed=True):
+        """Wait in the queue for a free worker until `deadline` (a
+        time.monotonic() value). Raises Overloaded if turned away (only
+        when `shed`) or if the deadline passes first."""
+        start = time.monotonic()
+        with self._cond:
+            refusal = self._refusal(deadline) if shed else None
+            if refusal is not None:
+                raise refusal
+            ticket = object()
+            self._waiting.append(ticket)
+            metrics.observe_max("queue_depth", len(self._waiting))
+            try:
+                while self._waiting[0] is not ticket or self._running >= self.workers:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        metrics.incr("queue_timeouts")
+                        raise Overloaded(503, "Deadline passed while waiting for a parse worker")
+                    self._cond.wait(remaining)
+            except BaseException:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+                raise
+            self._waiting.popleft()
+            self._running += 1
+            # The next in line may be able to go too
+            self._cond.notify_all()
+        metrics.observe("queue_wait_seconds", time.monotonic() - start)
+
+    def has_free_worker(self):
+        """True if a worker is free and nobody is queued for it."""
+        with self._cond:
+            return not self._waiting and self._running < self.workers
+
+    def try_acquire(self):
+        """Take a free worker if one is free and nobody is queued for it."""
+        with self._cond:
+            if self._waiting or self._running >= self.workers:
+                return False
+            self._running += 1
+            return True
+
+    def release(self, parse_seconds=None):
+        """Give back a worker taken by acquire(), with the time its parse
+        took if it ran one."""
+        if parse_seconds is not None:
+            metrics.observe("parse_seconds", parse_seconds)
+        with self._cond:
+            if parse_seconds is not None:
+                self._parse_seconds = parse_seconds if not self._parse_seconds else \
+                    0.8 * self._parse_seconds + 0.2 * parse_seconds
+            self._running -= 1
+            self._cond.notify_all()
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on a worker taken by acquire(); the worker is
+        released when the call finishes or is cancelled."""
+        executor = self.executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException as e:
+            if isinstance(e, BrokenProcessPool):
+                self.reset(executor)
+            self.release()
+            raise
+        future.add_done_callback(lambda f, start=time.monotonic(): self._finished(f, executor, start))
+        return future
+
+    def _finished(self, future, executor, start):
+        if future.cancelled():
+            return self.release()
+        if isinstance(future.exception(), BrokenProcessPool):
+            self.reset(executor)
+        self.release(time.monotonic() - start)
+
+    def run(self, deadline, fn, *args):
+        """fn(*args) on a worker once one is free; TimeoutError if it has
+        not finished by `deadline`, Overloaded if turned away."""
+        self.acquire(deadline)
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            # Not started yet only if the pool is behind; either way, stop waiting
+            future.cancel()
+            raise TimeoutError("deadline passed before the parse finished")
+
+
+_parse_pool = ParsePool(WORKERS, MAX_QUEUE)
+
+
+def run_parse(name, source, deadline):
+    """Parse `source` on the worker pool and return the JSON body. Raises
+    Overloaded if the queue turns it away and TimeoutError if it has not
+    finished by `deadline`."""
+    start = time.perf_counter()
+    try:
+        return finish_parse(_parse_pool.run(deadline, parse_source, name, source, CACHE_DIR,
+                                            PROFILE if PROFILING else ""))
+    except TimeoutError:
+        metrics.incr("parse_timeouts")
+        raise
+    except Overloaded:
+        raise
+    except Exception:
+        metrics.incr("parse_errors")
+        raise
+    finally:
+        metrics.incr("parse_wall_seconds", time.perf_counter() - start)
+
+
+def parse_many(members):
+    """Parse (name, source) pairs on the worker pool, yielding (name, body,
+    error) as each finishes. Members are pulled from the iterable only as
+    workers free up, so an upload can still be arriving while earlier
+    members parse. A member is read in full before a worker is taken for
+    it, so a slow upload holds no idle worker. Each member queues like a
+    /parse request but is never shed; Overloaded if one waits past
+    PARSE_TIMEOUT. If nothing finishes within PARSE_TIMEOUT the rest time
+    out."""
+    pool = _parse_pool
+    members = iter(members)
+    pending = {}
+    member = None
+    exhausted = False
+    try:
+        while True:
+            while not exhausted:
+                if member is None:
+                    # With parses running, read ahead only if a worker is free for it
+                    if pending and not pool.has_free_worker():
+                        break
+                    member = next(members, None)
+                    if member is None:
+                        exhausted = True
+                        break
+                # Queue for a worker only when there is nothing to wait on instead
+                if not pending:
+                    pool.acquire(time.monotonic() + PARSE_TIMEOUT, shed=False)
+                elif not pool.try_acquire():
+                    break
+                future = pool.submit(parse_source, member[0], member[1], CACHE_DIR, PROFILE if PROFILING else "")
+                pending[future] = member[0]
+                member = None
+            if not pending:
+                return
+            done, _ = wait(pending, timeout=PARSE_TIMEOUT, return_when=FIRST_COMPLETED)
+            if not done:
+                metrics.incr("parse_timeouts", len(pending))
+                for name in pending.values():
+                    yield name, None, TimeoutError(f"exceeded {PARSE_TIMEOUT}s")
+                return
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    body = finish_parse(future.result())
+                except Exception as e:
+                    metrics.incr("parse_errors")
+                    yield name, None, e
+                else:
+                    yield name, body, None
+    finally:
+        # Timed out or abandoned (client gone, bad upload): drop what has not started
+        for future in pending:
+            future.cancel()
+
+
+def archive_members(data):
+    """Iterator of (name, bytes) for each regular file in a zip or
+    (optionally compressed) tar archive, read one at a time. ValueError if
+    `data` is neither."""
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        infos = [(info.filename, info.file_size, info) for info in archive.infolist()
+                 if not info.is_dir() and not info.filename.startswith("__MACOSX/")]
+        read = archive.read
+    else:
+        try:
+            archive = tarfile.open(fileobj=io.BytesIO(data), mode="r:*")
+        except tarfile.TarError:
+            raise ValueError("expected a tar or zip archive")
+        infos = [(info.name, info.size, info) for info in archive if info.isfile()]
+        read = lambda info: archive.extractfile(info).read()
+
+    def members():
+        for name, size, info in infos:
+            if size > MAX_UPLOAD_BYTES:
+                raise ValueError(f"{name} exceeds {MAX_UPLOAD_BYTES} bytes")
+            yield name, read(info)
+    return members()
+
+
+def static_entry(path, ctype):
+    """(etag, body, gzipped body or None) for a small static file, re-read
+    when its mtime or size changes. None for files too large to cache."""
+    st = os.stat(path)
+    if st.st_size > STATIC_CACHE_MAX:
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    with _static_lock:
+        entry = _static.get(path)
+    if entry is None or entry[0] != key:
+        with open(path, 'rb') as f:
+            body = f.read()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+        gz = gzip.compress(body, 6) if len(body) > 1024 and ctype.startswith(COMPRESSIBLE) else None
+        entry = (key, etag, body, gz)
+        with _static_lock:
+            _static[path] = entry
+    return entry[1:]
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = [tag.strip() for tag in header.split(',')]
+    return any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+class CobolHTTPServer(http.server.ThreadingHTTPServer):
+    """One thread per connection, at most MAX_CONNECTIONS of them. Counts
+    the requests being handled so shutdown can wait for them."""
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._connections = threading.BoundedSemaphore(MAX_CONNECTIONS)
+        self._active = 0
+        self._idle = threading.Condition()
+        self.draining = False
+
+    def request_started(self):
+        """Count a request in; False once draining, when it must be refused."""
+        with self._idle:
+            if self.draining:
+                return False
+            self._active += 1
+            return True
+
+    def request_finished(self):
+        with self._idle:
+            self._active -= 1
+            if not self._active:
+                self._idle.notify_all()
+
+    def drain(self, timeout):
+        """Refuse further requests and wait up to `timeout` seconds for the
+        ones being handled. Returns how many are still running."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            self.draining = True
+            while self._active and self._idle.wait(max(0.0, deadline - time.monotonic())):
+                pass
+            return self._active
+
+    def process_request(self, request, client_address):
+        # Stop accepting while every slot is busy so the backlog pushes back
+        self._connections.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._connections.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._connections.release()
+
 
 class CobolRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Drop clients that stall mid-request instead of holding a thread
+    timeout = 30
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        # A keep-alive connection may send another request after shutdown began
+        self.counted = self.server.request_started()
+        if not self.counted:
+            self.close_connection = True
+            self.send_overloaded(Overloaded(503, "Server is shutting down"))
+        return self.counted
+
+    def handle_one_request(self):
+        self.counted = False
+        try:
+            super().handle_one_request()
+        finally:
+            if self.counted:
+                self.server.request_finished()
+
     def do_GET(self):
         if self.path == '/':
-            self.path = 'visualizer.html'
+            self.path = '/visualizer.html'
+        url = urlsplit(self.path)
+        if url.path == '/symbols':
+            return self.send_symbols(parse_qs(url.query))
+        if url.path == '/metrics':
+            return self.send_metrics()
+        path = self.translate_path(self.path)
+        if os.path.isfile(path) and self.send_static(path):
+            return
         return http.server.SimpleHTTPRequestHandler.do_GET(self)
 
+    def do_HEAD(self):
+        if self.path == '/':
+            self.path = '/visualizer.html'
+        path = self.translate_path(self.path)
+        if os.path.isfile(path) and self.send_static(path, head=True):
+            return
+        return http.server.SimpleHTTPRequestHandler.do_HEAD(self)
+
+    def send_static(self, path, head=False):
+        """Serve a cached static file with an ETag, gzip when accepted.
+        False if the file is too large to cache."""
+        try:
+            entry = static_entry(path, self.guess_type(path))
+        except OSError:
+            return False
+        if entry is None:
+            return False
+        etag, body, gz = entry
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return True
+        self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        if gz is not None:
+            self.send_header('Vary', 'Accept-Encoding')
+            if choose_encoding(self.headers.get('Accept-Encoding'), ('gzip',)):
+                self.send_header('Content-Encoding', 'gzip')
+                body = gz
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+        return True
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_metrics(self):
+        """GET /metrics: request and parse counters since startup, queue
+        wait and parse time summaries and the pool's current state. With
+        $COBOL_PROFILE set, also per-phase parse times, token and statement
+        counts and maxima summed over all profiled parses."""
+        data = metrics.snapshot()
+        data["profiling"] = PROFILE if PROFILING else None
+        data["workers"] = WORKERS
+        data["pool"] = _parse_pool.stats()
+        data["result_cache"] = _results.stats()
+        self.send_json(200, data)
+
+    def log_request(self, code='-', size='-'):
+        path = urlsplit(self.path).path
+        metrics.incr(f"http {path if path in ROUTES else 'other'} {code}")
+        super().log_request(code, size)
+
+    def send_symbols(self, query):
+        """GET /symbols?name=WS-EOF-SW[&kind=move_to][&limit=N] against the
+        index built by symbol_index.py."""
+        name = query.get('name', [''])[0]
+        if not name:
+            return self.send_json(400, {"error": "name is required"})
+        try:
+            limit = int(query['limit'][0]) if 'limit' in query else None
+        except ValueError:
+            return self.send_json(400, {"error": "limit must be an integer"})
+        try:
+            index = SymbolIndex(SYMBOL_DB, readonly=True)
+        except FileNotFoundError:
+            return self.send_json(404, {"error": f"no symbol index at {SYMBOL_DB}"})
+        with index:
+            hits = index.find(name, kind=query.get('kind', [None])[0], limit=limit)
+        self.send_json(200, hits)
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'POST, GET, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, If-None-Match')
+        self.end_headers()
+
+    def send_text(self, status, message):
+        self.send_response(status)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(message.encode())
+
+    def send_overloaded(self, refusal):
+        self.send_response(refusal.status)
+        self.send_header('Retry-After', str(max(1, math.ceil(refusal.retry_after))))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(str(refusal).encode())
+
+    def refuse_if_overloaded(self):
+        """Send 429/503 and return True if the parse queue would turn this
+        request away anyway; the body is left unread."""
+        refusal = _parse_pool.check()
+        if refusal is None:
+            return False
+        self.close_connection = True
+        self.send_overloaded(refusal)
+        return True
+
+    def request_deadline(self):
+        """time.monotonic() by which this request's parse must be done:
+        PARSE_TIMEOUT from now, or the X-Parse-Timeout header if shorter."""
+        timeout = PARSE_TIMEOUT
+        try:
+            timeout = min(timeout, float(self.headers.get('X-Parse-Timeout', '')))
+        except ValueError:
+            pass
+        return time.monotonic() + timeout
+
+    def content_length(self, limit):
+        """The request's Content-Length, or None after sending 411/413."""
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self.send_error(411, "Content-Length required")
+            return None
+        if length > limit:
+            # The body is never read, so the connection cannot be reused
+            self.close_connection = True
+            self.send_error(413, f"Upload exceeds {limit} bytes")
+            return None
+        return length
+
+    def read_upload(self):
+        """The `file` part of a multipart upload as bytes. Sends
+        the error response and returns None if the request is unusable."""
+        boundary = form_boundary(self.headers.get('Content-Type'))
+        if boundary is None:
+            self.send_error(400, "Invalid Content-Type")
+            return None
+        length = self.content_length(MAX_UPLOAD_BYTES)
+        if length is None:
+            return None
+        upload = None
+        for part in MultipartReader(self.rfile, boundary, length):
+            if part.name == 'file' and upload is None:
+                upload = part.read(MAX_UPLOAD_BYTES)
+        if upload is None:
+            self.send_error(400, "No file provided")
+        return upload
+
+    def batch_members(self):
+        """Iterator of (name, bytes) for a /parse/batch request: every file
+        part of a multipart body, or every file in a tar/zip body. Multipart
+        parts are read lazily. Sends the error response and returns None if
+        the request is unusable."""
+        length = self.content_length(MAX_BATCH_BYTES)
+        if length is None:
+            return None
+        boundary = form_boundary(self.headers.get('Content-Type'))
+        if boundary is not None:
+            reader = MultipartReader(self.rfile, boundary, length)
+            return ((part.filename, part.read(MAX_UPLOAD_BYTES)) for part in reader if part.filename)
+        try:
+            return archive_members(self.rfile.read(length))
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return None
+
+    def start_ndjson(self, etag=None):
+        # No Content-Length: the body ends when the connection closes
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        if etag:
+            self.send_result_headers(etag)
+        else:
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
 
+    def write_line(self, line):
+        self.wfile.write(line)
+        self.wfile.flush()
+
+    def send_batch(self):
+        """POST /parse/batch: one NDJSON line per member, in the order they
+        finish, with the same fields as batch.py --ndjson."""
+        if self.refuse_if_overloaded():
+            return
+        members = self.batch_members()
+        if members is None:
+            return
+        self.start_ndjson()
+        try:
+            for name, body, error in parse_many(members):
+                if error is None:
+                    line = b'{"path":' + json.dumps(name).encode() + b',"status":"ok","result":' + body + b'}\n'
+                else:
+                    status = "timeout" if isinstance(error, TimeoutError) else "error"
+                    line = json.dumps({"path": name, "status": status,
+                                       "error": f"{type(error).__name__}: {error}"}).encode() + b"\n"
+                self.write_line(line)
+        except (MultipartError, ValueError, Overloaded) as e:
+            self.write_line(json.dumps({"status": "error", "error": str(e)}).encode() + b"\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def send_stream(self):
+        """POST /parse/stream: the upload's metadata, divisions, data entries
+        and paragraphs as NDJSON records (see NdjsonWriter), sent while the
+        parse is still running on a pool worker, which is queued for and
+        shed like a /parse request."""
+        if self.refuse_if_overloaded():
+            return
+        upload = self.read_upload()
+        if upload is None:
+            return
+        etag = result_etag(ParseCache.key(upload, PARSER_VERSION))
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            return self.send_not_modified(etag)
+        deadline = self.request_deadline()
+        try:
+            _parse_pool.acquire(deadline)
+        except Overloaded as refusal:
+            return self.send_overloaded(refusal)
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        try:
+            future = _parse_pool.submit(stream_source, UPLOAD_NAME, upload, sender)
+        except Exception as e:
+            receiver.close()
+            sender.close()
+            return self.send_text(500, f"Parser execution failed: {type(e).__name__}: {e}")
+        self.start_ndjson(etag)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.write_line(b'{"kind":"error","error":"Parse exceeded its deadline"}\n')
+                    break
+                # `sender` stays open here until the worker has its copy, so
+                # a dead worker shows up as a finished future, not as EOF
+                if not receiver.poll(min(remaining, STREAM_CHECK_SECONDS)):
+                    if future.done() and not receiver.poll():
+                        self.write_line(b'{"kind":"error","error":"parser worker exited"}\n')
+                        break
+                    continue
+                data = receiver.recv_bytes()
+                if not data:
+                    break
+                self.write_line(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away
+            pass
+        finally:
+            # With the read end closed the worker's next send fails and it
+            # gives up the parse
+            receiver.close()
+            sender.close()
+            future.cancel()
+
     def do_POST(self):
-        if self.path == '/parse':
+        path = urlsplit(self.path).path
+        try:
+            if path == '/parse/batch':
+                return self.send_batch()
+            if path == '/parse/stream':
+                return self.send_stream()
+            if path != '/parse':
+                return self.send_error(404)
+            if self.refuse_if_overloaded():
+                return
+            upload = self.read_upload()
+        except MultipartError as e:
+            self.close_connection = True
             try:
-                # Parse the form data
-                ctype, pdict = cgi.parse_header(self.headers.get('content-type'))
-                if ctype == 'multipart/form-data':
-                    pdict['boundary'] = bytes(pdict['boundary'], "utf-8")
-                    fields = cgi.parse_multipart(self.rfile, pdict)
-                    
-                    if 'file' in fields:
-                        file_content = fields['file'][0]
-                        # Save to temp file
-                        with open("temp_upload.cbl", "wb") as f:
-                            f.write(file_content)
-                            
-                        # Run parser
-                        try:
-                            # Capture output
-                            subprocess.run([sys.executable, "cobolparser.py", "temp_upload.cbl"], check=True)
-                            
-                            if os.path.exists("output.json"):
-                                with open("output.json", "r") as f:
-                                    data = json.load(f)
-                                
-                                self.send_response(200)
-                                self.send_header('Content-Type', 'application/json')
-                                self.send_header('Access-Control-Allow-Origin', '*')
-                                self.end_headers()
-                                self.wfile.write(json.dumps(data).encode())
-                            else:
-                                raise Exception("Parser failed to generate output.json")
-                                
-                        except subprocess.CalledProcessError as e:
-                            self.send_response(500)
-                            self.send_header('Access-Control-Allow-Origin', '*')
-                            self.end_headers()
-                            self.wfile.write(f"Parser execution failed: {str(e)}".encode())
-                        except Exception as e:
-                            self.send_response(500)
-                            self.send_header('Access-Control-Allow-Origin', '*')
-                            self.end_headers()
-                            self.wfile.write(str(e).encode())
-                            
-                    else:
-                        self.send_error(400, "No file provided")
-                else:
-                    self.send_error(400, "Invalid Content-Type")
-            except Exception as e:
-                self.send_response(500)
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(f"Server Error: {str(e)}".encode())
+                return self.send_error(400, str(e))
+            except OSError:
+                # The client hung up mid-upload
+                return
+        if upload is None:
+            return
+        key = ParseCache.key(upload, PARSER_VERSION)
+        etag = result_etag(key)
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            return self.send_not_modified(etag)
+        encoding = choose_encoding(self.headers.get('Accept-Encoding'))
+        body = _results.get(key, encoding) if encoding else None
+        if body is None:
+            body = _results.get(key)
+            if body is None:
+                metrics.incr("result_cache_misses")
+                try:
+                    body = run_parse(UPLOAD_NAME, upload, self.request_deadline())
+                except Overloaded as refusal:
+                    return self.send_overloaded(refusal)
+                except TimeoutError:
+                    return self.send_text(504, "Parse exceeded its deadline")
+                except Exception as e:
+                    return self.send_text(500, f"Parser execution failed: {type(e).__name__}: {e}")
+                _results.put(key, body)
+            else:
+                metrics.incr("result_cache_hits")
+            if encoding and len(body) >= MIN_COMPRESS_BYTES:
+                body = COMPRESSORS[encoding](body)
+                _results.put(key, body, encoding)
+            else:
+                encoding = None
         else:
-            self.send_error(404)
+            metrics.incr("result_cache_hits")
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_result_headers(etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_result_headers(self, etag):
+        # The result depends only on the upload, which the ETag hashes
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers', 'ETag')
+
+    def send_not_modified(self, etag):
+        self.send_response(304)
+        self.send_result_headers(etag)
+        self.end_headers()
+
+
+def serve(httpd):
+    """serve_forever() until SIGTERM or SIGINT, then stop listening, give
+    the requests being handled up to DRAIN_TIMEOUT seconds to finish and
+    stop the workers."""
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever(), which is running on this thread
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    httpd.serve_forever()
+    httpd.server_close()
+    print("Shutting down: waiting for requests in progress...")
+    still_running = httpd.drain(DRAIN_TIMEOUT)
+    if still_running:
+        print(f"{still_running} requests still running after {DRAIN_TIMEOUT}s; stopping anyway")
+    _parse_pool.shutdown(wait=not still_running)
+
 
 if __name__ == "__main__":
-    Handler = CobolRequestHandler
-    with socketserver.TCPServer(("", PORT), Handler) as httpd:
-        print(f"Serving COBOL Visualizer at http://localhost:{PORT}")
+    arg_parser = argparse.ArgumentParser(description="Serve the COBOL visualizer and /parse API")
+    arg_parser.add_argument("--bind", default="", help="Address to listen on (default: all)")
+    arg_parser.add_argument("--port", type=int, default=PORT)
+    args = arg_parser.parse_args()
+    with CobolHTTPServer((args.bind, args.port), CobolRequestHandler) as httpd:
+        _parse_pool.start()
+        print(f"Serving COBOL Visualizer at http://localhost:{args.port} with {WORKERS} parse workers")
         print("Press Ctrl+C to stop.")
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            pass
+        serve(httpd)
@@ -0,0 +1,307 @@
+"""Look at the first block of a source before decoding any of it.
+
+    sniffed = sniff_file(path)        # reads at most PREFIX_BYTES
+    text = sniffed.decode(data)       # the whole source, "\\n" line endings
+
+Detects the codepage (UTF-8, Latin-1, or EBCDIC cp037/cp1047), the line
+endings (LF, CRLF, CR, EBCDIC NL, or none: fixed-length card images), the
+source format by the rule CobolParser.detect_format has always used, and
+whether a FIXED-format source fills its sequence (columns 1-6) and
+identification (73-80) areas. Bytes that are not text in any of these
+codepages mark the source as binary, so batch runs can skip it unread.
+
+Usage: python sniff.py FILE [FILE ...]
+"""
+import codecs
+import encodings.cp037
+import io
+import json
+import sys
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from normalizer import NONBLANK
+
+PREFIX_BYTES = 64 * 1024
+# Nonblank lines the format rule looks at
+FORMAT_SAMPLE_LINES = 20
+FIXED_INDICATORS = ('*', '/', '-', ' ', 'D')
+# Card images: the record length tried for sources without line endings
+RECORD_LENGTH = 80
+# At most this share of the prefix may be bytes outside a codepage's text
+MAX_FOREIGN = 0.05
+
+UTF8_BOM = b"\xef\xbb\xbf"
+UTF16_BOMS = (b"\xff\xfe", b"\xfe\xff")
+ASCII_TEXT = bytes(range(0x20, 0x7F)) + b"\t\n\r\f\v\x1a"
+# Control bytes that do not occur in text in any of the codepages (0x05 and
+# 0x15 are EBCDIC tab and newline)
+BINARY_BYTES = bytes(b for b in range(0x20) if b not in b"\t\n\v\f\r\x05\x15\x1a")
+# Space, digits, letters, COBOL punctuation and line ends in EBCDIC
+EBCDIC_TEXT = bytes(
+    [0x40, 0x4B, 0x4C, 0x4D, 0x4E, 0x5B, 0x5C, 0x5D, 0x5E, 0x60, 0x61, 0x6B, 0x6C, 0x6D, 0x6E, 0x6F,
+     0x7A, 0x7B, 0x7C, 0x7D, 0x7E, 0x7F, 0x15, 0x25, 0x0D, 0x05]
+    + list(range(0x81, 0x8A)) + list(range(0x91, 0x9A)) + list(range(0xA2, 0xAA))
+    + list(range(0xC1, 0xCA)) + list(range(0xD1, 0xDA)) + list(range(0xE2, 0xEA)) + list(range(0xF0, 0xFA))
+)
+EBCDIC_NL = 0x15
+EBCDIC_LF = 0x25
+# Byte pairs cp1047 assigns the other way round from cp037: ^/¬, [/Ý, ]/¨
+CP1047_SWAPS = ((0x5F, 0xB0), (0xAD, 0xBA), (0xBD, 0xBB))
+# Brackets and caret as cp1047 writes them, and as cp037 does
+CP1047_MARKS = b"\xad\xbd\x5f"
+CP037_MARKS = b"\xba\xbb\xb0"
+EBCDIC_CODEPAGES = ("cp037", "cp1047")
+NEWLINE_NAMES = {"\n": "LF", "\r\n": "CRLF", "\r": "CR", "\x85": "NL", "": "none"}
+
+
+def _cp1047_codec() -> codecs.CodecInfo:
+    """cp1047 (z/OS Unix files) is cp037 with three byte pairs swapped, and
+    Python does not ship it."""
+    table = list(encodings.cp037.decoding_table)
+    for a, b in CP1047_SWAPS:
+        table[a], table[b] = table[b], table[a]
+    decoding_table = "".join(table)
+    encoding_table = codecs.charmap_build(decoding_table)
+
+    class Codec(codecs.Codec):
+        def encode(self, input, errors="strict"):
+            return codecs.charmap_encode(input, errors, encoding_table)
+
+        def decode(self, input, errors="strict"):
+            return codecs.charmap_decode(input, errors, decoding_table)
+
+    class IncrementalEncoder(codecs.IncrementalEncoder):
+        def encode(self, input, final=False):
+            return codecs.charmap_encode(input, self.errors, encoding_table)[0]
+
+    class IncrementalDecoder(codecs.IncrementalDecoder):
+        def decode(self, input, final=False):
+            return codecs.charmap_decode(input, self.errors, decoding_table)[0]
+
+    class StreamWriter(Codec, codecs.StreamWriter):
+        pass
+
+    class StreamReader(Codec, codecs.StreamReader):
+        pass
+
+    return codecs.CodecInfo(name="cp1047", encode=Codec().encode, decode=Codec().decode,
+                            incrementalencoder=IncrementalEncoder, incrementaldecoder=IncrementalDecoder,
+                            streamreader=StreamReader, streamwriter=StreamWriter)
+
+
+_CP1047 = _cp1047_codec()
+codecs.register(lambda name: _CP1047 if name in ("cp1047", "ibm1047", "ibm_1047", "1047") else None)
+
+
+def classify_format(lines: List[str]) -> Optional[str]:
+    """FIXED or FREE from the first nonblank lines (with their newlines);
+    None if there are none."""
+    if not lines:
+        return None
+    fixed_indicators = 0
+    for line in lines:
+        if len(line) > 6:
+            seq_area = line[0:6]
+            if line[6] in FIXED_INDICATORS and (seq_area.isdigit() or seq_area.strip() == ""):
+                fixed_indicators += 1
+    return "FIXED" if fixed_indicators / len(lines) >= 0.8 else "FREE"
+
+
+class SourceSniff:
+    """What the first block of a source says about all of it.
+
+    `source_format` is FIXED or FREE, "" when the prefix was the whole
+    source and held no code, and None when the prefix was too short to
+    tell; CobolParser then scans the decoded source instead.
+    """
+
+    def __init__(self, encoding: str, newline: str, record_length: Optional[int] = None,
+                 is_text: bool = True, source_format: Optional[str] = None,
+                 sequence_numbers: bool = False, identification_area: bool = False):
+        self.encoding = encoding
+        self.newline = newline
+        self.record_length = record_length
+        self.is_text = is_text
+        self.source_format = source_format
+        self.sequence_numbers = sequence_numbers
+        self.identification_area = identification_area
+
+    @property
+    def ebcdic(self) -> bool:
+        return self.encoding in EBCDIC_CODEPAGES
+
+    def decode(self, data) -> str:
+        """Decode a whole source (bytes, memoryview or mmap), splitting card
+        images into lines and turning EBCDIC NL into "\\n". CR and CRLF are
+        left for SourceBuffer to normalize."""
+        text = str(data, self.encoding, "replace")
+        return self._lines(text)
+
+    def _lines(self, text: str) -> str:
+        if self.newline == "\x85":
+            text = text.replace("\x85", "\n")
+        if self.record_length:
+            size = self.record_length
+            text = "\n".join([text[i:i + size] for i in range(0, len(text), size)])
+        return text
+
+    def open_text(self, raw: BinaryIO) -> "SniffedReader":
+        """A text stream over the binary stream `raw`, decoded the same way."""
+        return SniffedReader(raw, self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "encoding": self.encoding,
+            "newline": NEWLINE_NAMES[self.newline],
+            "record_length": self.record_length,
+            "is_text": self.is_text,
+            "source_format": self.source_format or None,
+            "sequence_numbers": self.sequence_numbers,
+            "identification_area": self.identification_area,
+        }
+
+
+class SniffedReader:
+    """read(n) over a binary stream with universal newlines, plus the NL
+    and card image handling of SourceSniff.decode."""
+
+    def __init__(self, raw: BinaryIO, sniffed: SourceSniff):
+        self.sniffed = sniffed
+        self._text = io.TextIOWrapper(raw, encoding=sniffed.encoding, errors="replace", newline=None)
+        # Characters of the current card image already returned
+        self._column = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._text.close()
+
+    def read(self, size: int = -1) -> str:
+        text = self._text.read(size)
+        if self.sniffed.newline == "\x85":
+            text = text.replace("\x85", "\n")
+        length = self.sniffed.record_length
+        if not length:
+            return text
+        # Cut card images where they end, carrying the column across reads
+        out = []
+        pos = 0
+        while pos < len(text):
+            take = min(length - self._column, len(text) - pos)
+            out.append(text[pos:pos + take])
+            pos += take
+            self._column += take
+            if self._column == length:
+                out.append("\n")
+                self._column = 0
+        return "".join(out)
+
+
+def _guess_encoding(data: bytes, complete: bool) -> Optional[str]:
+    """The codepage `data` looks like, or None for binary data."""
+    if data.startswith(UTF8_BOM):
+        return "utf-8-sig"
+    if data[:2] in UTF16_BOMS:
+        return "utf-16"
+    if not data:
+        return "utf-8"
+    limit = MAX_FOREIGN * len(data)
+    if len(data) - len(data.translate(None, BINARY_BYTES)) > limit:
+        return None
+    foreign_ascii = len(data.translate(None, ASCII_TEXT))
+    if foreign_ascii == 0:
+        return "utf-8"
+    try:
+        data.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # A character cut off by the end of the prefix
+        if not complete and e.reason == "unexpected end of data":
+            return "utf-8"
+    foreign_ebcdic = len(data.translate(None, EBCDIC_TEXT))
+    if foreign_ebcdic <= limit and foreign_ebcdic < foreign_ascii:
+        if sum(data.count(b) for b in CP1047_MARKS) > sum(data.count(b) for b in CP037_MARKS):
+            return "cp1047"
+        return "cp037"
+    return "latin-1"
+
+
+def _guess_newline(data: bytes, ebcdic: bool) -> str:
+    if ebcdic:
+        if EBCDIC_NL in data:
+            return "\x85"
+        if EBCDIC_LF in data:
+            return "\n"
+    elif b"\n" in data:
+        return "\r\n" if data.count(b"\r\n") == data.count(b"\n") else "\n"
+    return "\r" if b"\r" in data else ""
+
+
+def _card_images(text: str) -> bool:
+    """Whether unterminated `text` splits into RECORD_LENGTH-character lines
+    that look like FIXED-format source."""
+    records = [text[i:i + RECORD_LENGTH] for i in range(0, len(text) - RECORD_LENGTH + 1, RECORD_LENGTH)]
+    if len(records) < 2:
+        return False
+    plausible = sum(1 for r in records if r[6] in FIXED_INDICATORS and (r[:6].isdigit() or not r[:6].strip()))
+    return plausible >= 0.8 * len(records)
+
+
+def sniff_bytes(data: bytes, complete: bool = False, encoding: Optional[str] = None) -> SourceSniff:
+    """Sniff the first bytes of a source; `complete` if they are all of it.
+    With `encoding`, the codepage is not guessed."""
+    is_text = True
+    if encoding is None:
+        encoding = _guess_encoding(data, complete)
+        if encoding is None:
+            is_text = False
+            encoding = "latin-1"
+    sniffed = SourceSniff(encoding, _guess_newline(data, encoding in EBCDIC_CODEPAGES), is_text=is_text)
+    text = str(data, encoding, "replace")
+    if not sniffed.newline and _card_images(text):
+        sniffed.record_length = RECORD_LENGTH
+    text = sniffed._lines(text).replace("\r\n", "\n").replace("\r", "\n")
+
+    lines = text.split("\n")
+    last = lines.pop()
+    sample = []
+    for line in lines:
+        if NONBLANK.search(line):
+            sample.append(line + "\n")
+            if len(sample) == FORMAT_SAMPLE_LINES:
+                break
+    if complete and NONBLANK.search(last) and len(sample) < FORMAT_SAMPLE_LINES:
+        sample.append(last)
+    if len(sample) == FORMAT_SAMPLE_LINES or complete:
+        sniffed.source_format = classify_format(sample) or ""
+    fixed_lines = [line for line in sample if len(line) > 6 and line[6] in FIXED_INDICATORS]
+    if fixed_lines:
+        sniffed.sequence_numbers = sum(1 for line in fixed_lines if line[:6].isdigit()) >= 0.8 * len(fixed_lines)
+        sniffed.identification_area = any(line[72:80].strip() for line in fixed_lines)
+    return sniffed
+
+
+def sniff_file(path: str, encoding: Optional[str] = None, prefix_bytes: int = PREFIX_BYTES) -> SourceSniff:
+    with open(path, "rb") as f:
+        data = f.read(prefix_bytes + 1)
+    return sniff_bytes(data[:prefix_bytes], complete=len(data) <= prefix_bytes, encoding=encoding)
+
+
+def main(argv: Optional[List[str]] = None):
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    for path in paths:
+        try:
+            print(json.dumps({"path": path, **sniff_file(path).to_dict()}))
+        except OSError as e:
+            print(f"Error: {path}: {e}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""Persistent symbol index over a COBOL code base.
+
+    python symbol_index.py build src/ --db symbols.db
+    python symbol_index.py find WS-EOF-SW --db symbols.db
+
+Records where data items are defined (DATA DIVISION entries, including
+level 88 conditions) and where they are used: MOVE sources and targets,
+IF/EVALUATE conditions, CALL arguments and other statements, plus
+paragraph definitions, PERFORM/GO TO targets and called programs. The
+index is one SQLite file. Each member is stored with the hash of its
+source and of the copybooks it was expanded with, so a rebuild only
+re-parses members where either changed.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from cobolparser import KEYWORDS, PARSER_VERSION, CobolParser, nested_blocks
+from copybook import get_library
+from graph import GO_TO, PERFORM, call_target, program_name, statement_references
+
+DEFAULT_DB = os.environ.get("COBOL_SYMBOL_INDEX", "symbols.db")
+# Bump when the schema or what gets recorded changes; older indexes are rebuilt
+INDEX_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    hash TEXT NOT NULL,
+    program TEXT,
+    indexed_at REAL,
+    copybooks TEXT,
+    copybook_digest TEXT
+);
+CREATE TABLE IF NOT EXISTS refs (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    scope TEXT,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS refs_name ON refs(name);
+CREATE INDEX IF NOT EXISTS refs_file ON refs(file_id);
+"""
+
+COBOL_WORD = re.compile(r'^[A-Z0-9][A-Z0-9-]*$')
+RESERVED_WORDS = frozenset(KEYWORDS) | frozenset((
+    "AFTER", "ALL", "ALSO", "AND", "ANY", "ARE", "AT", "BEFORE", "BY", "CONTENT", "CORRESPONDING", "CORR",
+    "DEPENDING", "DIVIDE", "END", "END-ADD", "END-COMPUTE", "END-DELETE", "END-DIVIDE", "END-MULTIPLY",
+    "END-REWRITE", "END-SEARCH", "END-START", "END-SUBTRACT", "END-WRITE", "EQUAL", "EQUALS", "ERROR",
+    "EXTEND", "FALSE", "FROM", "GIVING", "GREATER", "HIGH-VALUE", "HIGH-VALUES", "I-O", "IN", "INITIALIZE",
+    "INPUT", "INSPECT", "INTO", "INVALID", "IS", "KEY", "LESS", "LOW-VALUE", "LOW-VALUES", "MULTIPLY",
+    "NOT", "NULL", "NULLS", "OF", "OMITTED", "OR", "OTHER", "OUTPUT", "OVERFLOW", "PROGRAM", "QUOTE",
+    "QUOTES", "REFERENCE", "REMAINDER", "REPLACING", "ROUNDED", "SEARCH", "SIZE", "SPACE", "SPACES",
+    "STRING", "THAN", "THRU", "THROUGH", "TRUE", "UNSTRING", "UPON", "USING", "VALUE", "ZERO", "ZEROES",
+    "ZEROS",
+))
+# Words that end the targets of a MOVE the parser ran into the next verb
+MOVE_TARGET_STOP = frozenset(w for w in KEYWORDS if w not in ("TO", ".")) | frozenset(
+    w for w in RESERVED_WORDS if w.startswith("END-"))
+MAX_TEXT = 200
+
+
+def identifiers(words: List[str]) -> Iterator[str]:
+    """Data names among statement words: COBOL words that are neither
+    reserved, numeric nor literals."""
+    for word in words:
+        word = word.upper().rstrip(".,")
+        if word and word not in RESERVED_WORDS and COBOL_WORD.match(word) and not word.isdigit() \
+                and not word.replace("-", "").isdigit():
+            yield word
+
+
+def _definition_text(entry: Dict[str, Any]) -> str:
+    parts = [entry.get("level", ""), entry.get("name", "")]
+    if entry.get("picture"):
+        parts += ["PIC", entry["picture"]]
+    if entry.get("usage"):
+        parts.append(entry["usage"])
+    if entry.get("value"):
+        parts += ["VALUE", entry["value"]]
+    return " ".join(parts)
+
+
+def _statement_text(stmt: Dict[str, Any]) -> str:
+    kind = stmt.get("type")
+    if kind == "MOVE":
+        text = stmt.get("statement", "")
+    elif kind == "IF":
+        text = "IF " + stmt.get("condition", "")
+    elif kind == "EVALUATE":
+        text = "EVALUATE " + stmt.get("subject", "")
+    elif kind == "CALL":
+        text = f"CALL {stmt.get('target', '')} {stmt.get('arguments', '')}".rstrip()
+    elif kind == "PERFORM":
+        text = "PERFORM " + stmt.get("details", "")
+    elif kind == "GO TO":
+        text = "GO TO " + stmt.get("target", "")
+    else:
+        text = stmt.get("text", "")
+    return text[:MAX_TEXT]
+
+
+def _statement_refs(stmt: Dict[str, Any], paragraph: str, procedures: frozenset
+                    ) -> Iterator[Tuple[str, str, str, str]]:
+    kind = stmt.get("type")
+    text = _statement_text(stmt)
+    if kind == "MOVE":
+        words = stmt.get("statement", "").split()[1:]
+        upper = [w.upper() for w in words]
+        to = upper.index("TO") if "TO" in upper else len(words)
+        end = next((i for i in range(to + 1, len(words)) if upper[i] in MOVE_TARGET_STOP), len(words))
+        for name in identifiers(words[:to]):
+            yield name, "move_from", paragraph, text
+        for name in identifiers(words[to + 1:end]):
+            yield name, "move_to", paragraph, text
+    elif kind == "IF":
+        for name in identifiers(stmt.get("condition", "").split()):
+            yield name, "condition", paragraph, text
+    elif kind == "EVALUATE":
+        words = stmt.get("subject", "").split()
+        for case in stmt.get("cases", []):
+            words += case.get("condition", "").split()
+        for name in identifiers(words):
+            yield name, "condition", paragraph, text
+    elif kind == "CALL":
+        target = stmt.get("target", "")
+        program = call_target(target)
+        if program is not None:
+            yield program, "call", paragraph, text
+        else:
+            for name in identifiers([target]):
+                yield name, "call_target", paragraph, text
+        for name in identifiers(stmt.get("arguments", "").split()):
+            yield name, "call_argument", paragraph, text
+    elif kind == "PERFORM":
+        # Data items in VARYING/TIMES clauses, and UNTIL conditions
+        role = "reference"
+        for word in stmt.get("details", "").split():
+            upper = word.upper()
+            if upper == "UNTIL":
+                role = "condition"
+            elif upper == "PERFORM":
+                role = "reference"
+            elif upper not in procedures:
+                for name in identifiers([word]):
+                    yield name, role, paragraph, text
+    elif kind == "STATEMENT":
+        for name in identifiers(stmt.get("text", "").split()[1:]):
+            yield name, "reference", paragraph, text
+
+
+def extract_symbols(parsed_data: Dict[str, Any]) -> Iterator[Tuple[str, str, Optional[str], str]]:
+    """(name, kind, scope, text) for every definition and reference in one
+    parse result. `scope` is the DATA DIVISION section of a definition or
+    the paragraph of a reference."""
+    for entry in parsed_data.get("data_division", []):
+        name = entry.get("name", "").upper()
+        if name and name != "FILLER":
+            yield name, "definition", entry.get("section"), _definition_text(entry)
+    procedure = parsed_data.get("procedure_division", {})
+    procedures = frozenset(name.upper() for name in procedure)
+    for paragraph, statements in procedure.items():
+        yield paragraph.upper(), "paragraph", paragraph, paragraph
+        pending = [statements]
+        while pending:
+            for stmt in pending.pop():
+                yield from _statement_refs(stmt, paragraph, procedures)
+                pending.extend(nested_blocks(stmt))
+        for kind, target, thru in statement_references(statements):
+            if kind == PERFORM:
+                text = f"PERFORM {target} THRU {thru}" if thru else f"PERFORM {target}"
+                yield target.upper(), "perform", paragraph, text
+                if thru:
+                    yield thru.upper(), "perform", paragraph, text
+            elif kind == GO_TO:
+                yield target.upper(), "go_to", paragraph, f"GO TO {target}"
+
+
+def source_hash(source: bytes, copybook_paths: Optional[List[str]] = None) -> str:
+    digest = hashlib.sha256(f"{PARSER_VERSION}\0{INDEX_VERSION}\0".encode("utf-8"))
+    if copybook_paths is not None:
+        digest.update(f"{os.pathsep.join(copybook_paths)}\0".encode("utf-8"))
+    digest.update(source)
+    return digest.hexdigest()
+
+
+class SymbolIndex:
+    """SQLite-backed symbol index. Lookups use the index on `refs.name`."""
+
+    def __init__(self, db_path: str = DEFAULT_DB, readonly: bool = False):
+        self.db_path = db_path
+        if readonly:
+            if not os.path.exists(db_path):
+                raise FileNotFoundError(db_path)
+            self.db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.db = sqlite3.connect(db_path)
+            self._init_schema()
+        self.db.execute("PRAGMA foreign_keys = ON")
+
+    def _init_schema(self):
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, INDEX_VERSION):
+            self.db.executescript("DROP TABLE IF EXISTS refs; DROP TABLE IF EXISTS files;")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+        self.db.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def file_hashes(self) -> Dict[str, str]:
+        return dict(self.db.execute("SELECT path, hash FROM files"))
+
+    def _copybooks_unchanged(self, path: str, copybook_paths: Optional[List[str]]) -> bool:
+        """Whether the copybooks `path` was indexed with are still the same
+        files with the same contents (see CobolParser._copybooks_unchanged)."""
+        row = self.db.execute("SELECT copybooks, copybook_digest FROM files WHERE path = ?", (path,)).fetchone()
+        if copybook_paths is None or row is None or row[0] is None:
+            return True
+        resolved = json.loads(row[0])
+        library = get_library(copybook_paths)
+        # A copybook that was missing may have appeared since
+        if any(p is None and library.resolve(name) for name, p in resolved.items()):
+            return False
+        return row[1] is not None and row[1] == CobolParser._copybook_digest(resolved)
+
+    def store(self, path: str, digest: str, parsed_data: Dict[str, Any]):
+        """Replace everything recorded for `path` with `parsed_data`'s symbols."""
+        path = os.path.abspath(path)
+        resolved = parsed_data["metadata"].get("copybooks")
+        copybooks = json.dumps(resolved) if resolved is not None else None
+        copybook_digest = CobolParser._copybook_digest(resolved) if resolved is not None else None
+        with self.db:
+            self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+            cur = self.db.execute("INSERT INTO files (path, hash, program, indexed_at, copybooks, copybook_digest) "
+                                  "VALUES (?, ?, ?, ?, ?, ?)",
+                                  (path, digest, program_name(parsed_data), time.time(), copybooks, copybook_digest))
+            file_id = cur.lastrowid
+            self.db.executemany("INSERT INTO refs (file_id, name, kind, scope, text) VALUES (?, ?, ?, ?, ?)",
+                                ((file_id,) + row for row in extract_symbols(parsed_data)))
+
+    def remove(self, paths: List[str]):
+        with self.db:
+            self.db.executemany("DELETE FROM files WHERE path = ?", ((os.path.abspath(p),) for p in paths))
+
+    def update(self, paths: List[str], workers: Optional[int] = None, cache_dir: Optional[str] = None,
+               copybook_paths: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Index `paths`, re-parsing only members whose source hash or
+        copybooks changed."""
+        from batch import parse_one
+
+        start = time.perf_counter()
+        known = self.file_hashes()
+        changed: List[Tuple[str, str]] = []
+        for path in paths:
+            with open(path, "rb") as f:
+                digest = source_hash(f.read(), copybook_paths)
+            abspath = os.path.abspath(path)
+            if known.get(abspath) != digest or not self._copybooks_unchanged(abspath, copybook_paths):
+                changed.append((path, digest))
+        failures = []
+        skipped: List[Tuple[str, str]] = []
+        indexed = 0
+        if changed:
+            digests = dict(changed)
+            jobs = [p for p, _ in changed]
+            args = ([None] * len(jobs), [None] * len(jobs), [cache_dir] * len(jobs), [None] * len(jobs),
+                    [copybook_paths] * len(jobs))
+            if workers == 1 or len(jobs) == 1:
+                reports = map(parse_one, jobs, *args)
+                indexed = self._store_reports(reports, digests, failures, skipped)
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    indexed = self._store_reports(pool.map(parse_one, jobs, *args, chunksize=8), digests,
+                                                  failures, skipped)
+        return {
+            "files": len(paths),
+            "indexed": indexed,
+            "skipped": skipped,
+            "unchanged": len(paths) - len(changed),
+            "failures": failures,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def _store_reports(self, reports, digests: Dict[str, str], failures: List[Tuple[str, str]],
+                       skipped: List[Tuple[str, str]]) -> int:
+        """Store the ok reports; returns how many. Skipped members (binary
+        files, other formats) are neither indexed nor failures."""
+        stored = 0
+        for report in reports:
+            if report["status"] == "ok":
+                self.store(report["path"], digests[report["path"]], json.loads(report["result"]))
+                stored += 1
+            elif report["status"] == "skipped":
+                skipped.append((report["path"], report["reason"]))
+            else:
+                failures.append((report["path"], report["error"]))
+        return stored
+
+    def prune(self) -> int:
+        """Drop members whose files no longer exist."""
+        gone = [path for path, in self.db.execute("SELECT path FROM files") if not os.path.exists(path)]
+        self.remove(gone)
+        return len(gone)
+
+    def find(self, name: str, kind: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Definitions and references of `name`; `*` and `?` act as
+        wildcards (e.g. WS-EOF*)."""
+        name = name.upper()
+        op = "GLOB" if any(c in name for c in "*?[") else "="
+        sql = (f"SELECT refs.name, refs.kind, refs.scope, refs.text, files.path, files.program "
+               f"FROM refs JOIN files ON files.id = refs.file_id WHERE refs.name {op} ?")
+        params: List[Any] = [name]
+        if kind:
+            sql += " AND refs.kind = ?"
+            params.append(kind)
+        sql += " ORDER BY files.path, refs.rowid"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [
+            {"name": n, "kind": k, "scope": scope, "text": text, "path": path, "program": program}
+            for n, k, scope, text, path, program in self.db.execute(sql, params)
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        files, = self.db.execute("SELECT COUNT(*) FROM files").fetchone()
+        refs, = self.db.execute("SELECT COUNT(*) FROM refs").fetchone()
+        return {"files": files, "refs": refs}
+
+
+def main(argv: Optional[List[str]] = None):
+    from batch import DEFAULT_INCLUDE, collect_sources
+    from copybook import search_paths_from_env
+
+    ap = argparse.ArgumentParser(description="Build and query a symbol index of COBOL sources.")
+    ap.add_argument("--db", default=DEFAULT_DB, help=f"index file (default: $COBOL_SYMBOL_INDEX or {DEFAULT_DB})")
+    sub = ap.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="index (or refresh) sources; unchanged files are skipped")
+    build.add_argument("sources", nargs="+", help="files, directories or glob patterns")
+    build.add_argument("--include", action="append", default=None,
+                       help=f"filename pattern for directory inputs (default: {' '.join(DEFAULT_INCLUDE)})")
+    build.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    build.add_argument("--cache-dir", default=os.environ.get("COBOL_PARSE_CACHE"),
+                       help="reuse parse results from this directory (default: $COBOL_PARSE_CACHE)")
+    build.add_argument("-I", "--copybook-path", action="append", default=None,
+                       help="expand COPY statements from copybooks in this directory; repeatable (default: $COBCPY)")
+    build.add_argument("--prune", action="store_true", help="drop indexed files that no longer exist")
+    find = sub.add_parser("find", help="list definitions and references of a name")
+    find.add_argument("name", help="data item, paragraph or program name; * and ? are wildcards")
+    find.add_argument("--kind", help="only this kind (definition, move_from, move_to, condition, call, ...)")
+    find.add_argument("--limit", type=int, default=None)
+    find.add_argument("--json", action="store_true", help="print JSON instead of one line per hit")
+    args = ap.parse_args(argv)
+
+    if args.command == "build":
+        paths = collect_sources(args.sources, args.include or DEFAULT_INCLUDE)
+        if not paths:
+            print("No input files found.", file=sys.stderr)
+            sys.exit(1)
+        with SymbolIndex(args.db) as index:
+            result = index.update(paths, workers=args.workers, cache_dir=args.cache_dir,
+                                  copybook_paths=args.copybook_path or search_paths_from_env())
+            pruned = index.prune() if args.prune else 0
+            totals = index.stats()
+        print(f"Indexed {result['indexed']} of {result['files']} files in {result['seconds']:.2f}s "
+              f"({result['unchanged']} unchanged, {len(result['skipped'])} skipped, {pruned} pruned); "
+              f"{totals['files']} files, {totals['refs']} symbols in {args.db}")
+        for path, error in result["failures"]:
+            print(f"FAILED {path}: {error}", file=sys.stderr)
+        if result["failures"]:
+            sys.exit(2)
+        return
+
+    try:
+        index = SymbolIndex(args.db, readonly=True)
+    except FileNotFoundError:
+        print(f"Error: No symbol index at {args.db}; run `symbol_index.py build` first")
+        sys.exit(1)
+    with index:
+        hits = index.find(args.name, kind=args.kind, limit=args.limit)
+    if args.json:
+        print(json.dumps(hits, indent=4))
+        return
+    for hit in hits:
+        print(f"{hit['path']}  {hit['program']}  {hit['kind']:<13} {hit['scope'] or '':<24} {hit['text']}")
+    if not hits:
+        print(f"No symbols match {args.name}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
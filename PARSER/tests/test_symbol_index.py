@@ -0,0 +1,49 @@
+import os
+import shutil
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from symbol_index import SymbolIndex  # noqa: E402
+
+
+def test_build_over_mixed_tree_skips_binary_members(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    shutil.copy(os.path.join(os.path.dirname(HERE), "example.cbl"), src / "example.cbl")
+    (src / "blob.cbl").write_bytes(bytes(range(256)) * 16)
+    paths = [str(src / "example.cbl"), str(src / "blob.cbl")]
+
+    with SymbolIndex(str(tmp_path / "symbols.db")) as index:
+        result = index.update(paths, workers=1)
+        assert result["indexed"] == 1
+        assert result["failures"] == []
+        assert [path for path, _ in result["skipped"]] == [str(src / "blob.cbl")]
+        assert index.stats()["files"] == 1
+        assert index.find("CUSTPROC")
+
+
+def test_rebuild_reindexes_member_when_only_copybook_changed(tmp_path):
+    books = tmp_path / "copy"
+    books.mkdir()
+    (books / "REC.cpy").write_text("       01  CUST-REC.\n           05  CUST-ID   PIC X(4).\n")
+    program = tmp_path / "prog.cbl"
+    program.write_text(
+        "       IDENTIFICATION DIVISION.\n"
+        "       PROGRAM-ID. PROG.\n"
+        "       DATA DIVISION.\n"
+        "       WORKING-STORAGE SECTION.\n"
+        "       COPY REC.\n"
+        "       PROCEDURE DIVISION.\n"
+        "       MAIN-PARA.\n"
+        "           STOP RUN.\n"
+    )
+
+    with SymbolIndex(str(tmp_path / "symbols.db")) as index:
+        assert index.update([str(program)], workers=1, copybook_paths=[str(books)])["indexed"] == 1
+        assert index.update([str(program)], workers=1, copybook_paths=[str(books)])["unchanged"] == 1
+        (books / "REC.cpy").write_text("       01  CUST-REC.\n           05  CUST-KEY  PIC X(4).\n")
+        assert index.update([str(program)], workers=1, copybook_paths=[str(books)])["indexed"] == 1
+        assert index.find("CUST-KEY")
+        assert not index.find("CUST-ID")